@@ -1,12 +1,64 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
+import os
+import time
 import quantum # quantum.py
+from incremental import IncrementalOptimizer
+import sweep # sweep.py
+from cache import ResultCache, file_bytes, input_key
+from profiling import profile_frame, profile_json
+from jobs import JobManager
+from ingest import EMPLOYEE_SCHEMA, GROUP_SCHEMA, MEMBER_SCHEMA, InputError
+from dept_index import DEFAULT_INDEX_DIR, INDEX_DIR_ENV
+
+# 既存社員の部署インデックスをディスクにも保存する（環境変数で指定があればそちら）
+os.environ.setdefault(INDEX_DIR_ENV, DEFAULT_INDEX_DIR)
 
 # セッションステートの初期化
 for key in ("download_template", "editor", "download_edit"):
     st.session_state.setdefault(key, False)
 
+# ソルバーの選択肢
+SOLVER_LABELS = {
+    "fixstars": "Fixstars Amplify AE",
+    "local": "ローカル（シミュレーテッドアニーリング）",
+    "exact": "厳密解（最小費用流）",
+}
+
+# 処理段階の表示名
+STAGE_LABELS = {
+    "load":   "データ読み込み",
+    "score":  "スコア計算",
+    "build":  "モデル構築",
+    "solve":  "求解",
+    "decode": "結果の復号",
+    "report": "レポート作成",
+}
+
+# 部署別の表：セル数がこれを超える表はページに分けるか要約（上位の組・ヒートマップ）で表示する
+MAX_TABLE_CELLS = 5000
+TOP_PAIRS = 50
+
+# CSV テンプレート（種類 → (表示名, ファイル名)）。列は ingest のスキーマの順
+TEMPLATE_FILES = {
+    "group":    ("部署データ",     "department_template.csv"),
+    "member":   ("既存社員データ", "member_template.csv"),
+    "employee": ("新卒社員データ", "employee_template.csv"),
+}
+
+# サンプル CSV とテンプレートはプロセス内で 1 回だけ作り、全セッション・再実行で共有する
+# （共有する表は変更しないこと。編集は data_editor が返す新しい表で行う）
+@st.cache_resource
+def load_sample(name):
+    return pd.read_csv(f"sample/{name}テンプレート.csv")
+
+@st.cache_resource
+def template_csv(kind):
+    schema = {"group": GROUP_SCHEMA, "member": MEMBER_SCHEMA, "employee": EMPLOYEE_SCHEMA}[kind]
+    return pd.DataFrame(columns=[role for role, _ in schema]).to_csv(index=False).encode("utf-8-sig")
+
 # 表示ボタンと閉じるボタンの設定
 def set_state(key: str, value: bool):
     st.session_state[key] = value
@@ -14,7 +66,11 @@ def set_state(key: str, value: bool):
 def main():
     st.title("上司と部下のマッチング")
     st.write("---")
-    token = st.secrets["FIXSTARS_API_KEY"]
+    # ローカルソルバーだけで使う場合はトークン未設定でもよい
+    try:
+        token = st.secrets["FIXSTARS_API_KEY"]
+    except (KeyError, FileNotFoundError):
+        token = None
 
     # ── 共通パラメータ入力 ──
     st.markdown("## 詳細設定")
@@ -30,8 +86,29 @@ def main():
     weight_skill = st.slider("スキル", 0,100,50, key="skill")
     weight_pref  = st.slider("社員の希望",  0,100,50, key="pref")
 
+    # ── ソルバー設定 ──
+    with st.expander("ソルバー設定"):
+        st.radio(
+            "ソルバー", list(SOLVER_LABELS),
+            format_func=SOLVER_LABELS.get,
+            horizontal=True, key="solver"
+        )
+        st.number_input("タイムアウト [ms]", 100, 60000, 1000, step=100, key="timeout")
+        st.number_input("サンプル数", 1, 100, 1, key="num_reads")
+        st.number_input("乱数シード（ローカルのみ）", 0, 2**31 - 1, 0, key="seed")
+        st.number_input("候補部署数（各新卒の上位 k 部署＋希望部署だけに変数を作る。0 = 全部署）",
+                        0, 1000, 0, key="top_k")
+        st.number_input("分割数（部署をクラスタに分けて並行して解く。0 = 分割しない）",
+                        0, 64, 0, key="decompose")
+        st.number_input("新卒同士の相性（同じ部署になる新卒どうしのメンバー相性を各新卒の上位 k 人まで加える。"
+                        "0 = 使わない。厳密解では使えません）", 0, 1000, 0, key="pair_k")
+        st.number_input("比較する案の数（サンプルの中から実行可能で互いに異なる上位の案を残す。"
+                        "サンプル数も増やしてください。1 = 最良のみ）", 1, 20, 1, key="pool")
+        st.checkbox("厳密解と比較して最適性ギャップを表示", key="compare_exact")
+        st.radio("段階ごとの計測", ["しない", "時間のみ", "時間とメモリ"], horizontal=True, key="profile")
+
     # タブで画面切り替え
-    tab1, tab2 = st.tabs(["ファイルで実行", "サンプルで実行"])
+    tab1, tab2, tab3 = st.tabs(["ファイルで実行", "サンプルで実行", "重みスイープ"])
 
     # ── Tab1: 通常アップロード or サンプル実行 ──
     with tab1:
@@ -48,48 +125,13 @@ def main():
                       key="hide_template")
         
         if st.session_state.download_template:
-            # 部署テンプレート
-            dept_cols = [
-                "部署ID", "部署", "スキル１", "スキル２", "スキル３", "定員人数"
-            ]
-            df_dept = pd.DataFrame(columns=dept_cols)
-            csv_dept = df_dept.to_csv(index=False).encode("utf-8-sig")
-            st.download_button(
-                label="部署データのテンプレートをダウンロード",
-                data=csv_dept,
-                file_name="department_template.csv",
-                mime="text/csv"
-            )
-
-            # 既存社員テンプレート
-            mem_cols = [
-                "社員番号", "名前", "部署", "リーダー",
-                "開放性", "誠実性", "外向性", "協調性", "神経症傾向", 
-                "スキル１", "スキル２", "スキル３"
-            ]
-            df_mem = pd.DataFrame(columns=mem_cols)
-            csv_mem = df_mem.to_csv(index=False).encode("utf-8-sig")
-            st.download_button(
-                label="既存社員データのテンプレートをダウンロード",
-                data=csv_mem,
-                file_name="member_template.csv",
-                mime="text/csv"
-            )
-
-            # 新卒社員テンプレート
-            emp_cols = [
-                "社員番号", "名前", "開放性", "誠実性", "外向性", "協調性",
-                "神経症傾向", "スキル１", "スキル２", "スキル３",
-                "第一希望", "第二希望", "第三希望"
-            ]
-            df_emp = pd.DataFrame(columns=emp_cols)
-            csv_emp = df_emp.to_csv(index=False).encode("utf-8-sig")
-            st.download_button(
-                label="新卒社員データのテンプレートをダウンロード",
-                data=csv_emp,
-                file_name="employee_template.csv",
-                mime="text/csv"
-            )
+            for kind, (label, file_name) in TEMPLATE_FILES.items():
+                st.download_button(
+                    label=f"{label}のテンプレートをダウンロード",
+                    data=template_csv(kind),
+                    file_name=file_name,
+                    mime="text/csv"
+                )
 
         st.write("---")
 
@@ -123,8 +165,11 @@ def main():
                     st.session_state.member,
                     st.session_state.char,
                     st.session_state.skill,
-                    st.session_state.pref
+                    st.session_state.pref,
+                    tab="file",
+                    **solver_options()
                 )
+        show_job("file")
         st.write("---")
 
     # ── Tab2: サンプル編集＆実行 ──
@@ -134,25 +179,19 @@ def main():
             st.session_state[key] = None
 
     with tab2:
-        # オリジナル or セッション保存版
-        if st.session_state.saved_dept is not None:
-            df_dept = st.session_state.saved_dept
-        else:
-            df_dept = pd.read_csv("sample/部署テンプレート.csv")
+        # オリジナル（セッション間で共有・読み取り専用） or セッション保存版
+        df_dept = st.session_state.saved_dept
+        if df_dept is None:
+            df_dept = load_sample("部署")
+        df_mem = st.session_state.saved_mem
+        if df_mem is None:
+            df_mem = load_sample("既存社員")
+        df_emp = st.session_state.saved_emp
+        if df_emp is None:
+            df_emp = load_sample("新卒社員")
 
-        if st.session_state.saved_mem is not None:
-            df_mem = st.session_state.saved_mem
-        else:
-            df_mem = pd.read_csv("sample/既存社員テンプレート.csv")
-
-        if st.session_state.saved_emp is not None:
-            df_emp = st.session_state.saved_emp
-        else:
-            df_emp = pd.read_csv("sample/新卒社員テンプレート.csv")
-
-        edited_dept = df_dept.copy()
-        edited_mem  = df_mem.copy()
-        edited_emp  = df_emp.copy()
+        # 編集しなければそのまま（data_editor は編集結果を新しい表で返す）
+        edited_dept, edited_mem, edited_emp = df_dept, df_mem, df_emp
 
         # 編集を行う
         col1, col2 = st.columns(2)
@@ -205,56 +244,368 @@ def main():
 
 
         # サンプルの実行
+        st.checkbox("差分で再最適化（前回の実行から変更された行の周辺だけを解き直す）",
+                    value=True, key="incremental")
         if st.button("最適化を実行", key="run_edt"):
-            # DataFrame → CSV text → StringIO
-            def to_buf(df):
-                buf = io.StringIO()
-                df.to_csv(buf, index=False)
-                buf.seek(0)
-                return buf
-            buf_dept = to_buf(st.session_state.saved_dept if st.session_state.saved_dept is not None else df_dept)
-            buf_mem  = to_buf(st.session_state.saved_mem  if st.session_state.saved_mem  is not None else df_mem)
-            buf_emp  = to_buf(st.session_state.saved_emp  if st.session_state.saved_emp  is not None else df_emp)
+            # DataFrame のまま渡す（CSV テキストを経由しない）
             run_opt(
                 token,
-                buf_dept, buf_mem, buf_emp,
+                df_dept, df_mem, df_emp,
                 st.session_state.leader,
                 st.session_state.member,
                 st.session_state.char,
                 st.session_state.skill,
-                st.session_state.pref
+                st.session_state.pref,
+                tab="sample",
+                incremental=get_incremental() if st.session_state.incremental else None,
+                **solver_options()
             )
+        show_job("sample")
         st.write("---")
 
-def run_opt(token, group_file, member_file, employee_file,
-            well_suited_leader, well_suited_member,
-            weight_char, weight_skill, weight_pref):
-    """quantum.optimize を呼び出して結果表示"""
+    # ── Tab3: 重みスイープ ──
+    with tab3:
+        st.markdown("性格・スキル・希望の重みと相性モードの組み合わせをまとめて解き、パレート最適な割り当てを表示します。")
+        source = st.radio("データ", ["アップロードしたファイル", "サンプル"], horizontal=True, key="sweep_source")
+        how = st.radio("重みの選び方", ["格子", "ランダム"], horizontal=True, key="sweep_how")
+        if how == "格子":
+            levels = st.multiselect("各重みの値", [0, 25, 50, 75, 100], default=[0, 50, 100], key="sweep_levels")
+            weights = sweep.weight_grid(sorted(levels))
+        else:
+            n = st.number_input("シナリオ数", 1, 500, 20, key="sweep_n")
+            weights = sweep.random_weights(n, seed=st.session_state.seed)
+        modes = st.multiselect(
+            "相性モード（リーダー / メンバー）",
+            [(l, m) for l in sweep.MODES for m in sweep.MODES],
+            default=[(st.session_state.leader, st.session_state.member)],
+            format_func=lambda m: f"{m[0]} / {m[1]}",
+            key="sweep_modes",
+        )
+        st.caption(f"{len(weights) * len(modes)} シナリオ（ソルバー: {SOLVER_LABELS[st.session_state.solver]}）")
+
+        if st.button("スイープを実行", key="run_sweep"):
+            if source == "サンプル":
+                files = [df_dept, df_mem, df_emp]
+            else:
+                files = [group_file, member_file, employee_file]
+            if any(f is None for f in files):
+                st.warning("全てのCSVファイルをアップロードしてください。")
+            elif not weights or not modes:
+                st.warning("重みと相性モードを選択してください。")
+            else:
+                run_sweep(token, files, weights, modes)
+        show_job("sweep", show_sweep_result)
+        st.write("---")
+
+# 実行中に入力が変わっても影響しないよう内容を固定する（表はコピー、ファイルはバイト列）
+def freeze(f):
+    if isinstance(f, pd.DataFrame):
+        return f.copy()
+    return io.BytesIO(file_bytes(f))
+
+# 結果キャッシュ（セッション間で共有）
+@st.cache_resource
+def get_result_cache():
     try:
-        assign_df, dept_comp_all, dept_skill, ratio_fig = quantum.optimize(
-            token,
-            group_file, member_file, employee_file,
+        return ResultCache()
+    except OSError:  # .cache に書けない・同名のファイルがあるなど。メモリだけに持つ
+        return ResultCache(directory=None)
+
+# バックグラウンド実行（セッション間で共有）
+# OPT_MAX_WORKERS: 同時に実行するジョブ数, OPT_MAX_SOLVES: 同時に実行するソルバー呼び出し数
+@st.cache_resource
+def get_job_manager():
+    return JobManager(
+        max_workers=int(os.environ.get("OPT_MAX_WORKERS", 4)),
+        max_solves=int(os.environ.get("OPT_MAX_SOLVES", 2)),
+    )
+
+# サンプルタブの差分再最適化（前回の実行をセッションごとに保持）
+def get_incremental():
+    if "incremental_optimizer" not in st.session_state:
+        st.session_state.incremental_optimizer = IncrementalOptimizer()
+    return st.session_state.incremental_optimizer
+
+def solver_options():
+    """セッションのソルバー設定を optimize のキーワード引数にまとめる"""
+    return {
+        "solver":    st.session_state.solver,
+        "timeout":   st.session_state.timeout,
+        "num_reads": st.session_state.num_reads,
+        "seed":      st.session_state.seed,
+        "compare_exact": st.session_state.compare_exact,
+        "top_k":     st.session_state.top_k or None,
+        "decompose": st.session_state.decompose or None,
+        "pair_k":    st.session_state.pair_k or None,
+        "pool":      st.session_state.pool if st.session_state.pool > 1 else None,
+        "profile":   {"時間のみ": "time", "時間とメモリ": True}.get(st.session_state.profile, False),
+    }
+
+def optimize_cached(key, token, files, params, progress=None, runner=quantum.optimize):
+    """
+    キャッシュを通して quantum.optimize を実行（ワーカースレッドで呼ばれる）。
+    key が None（差分再最適化）ならキャッシュを使わずに runner を呼ぶ
+    （差分再最適化は呼ぶたびに前回の状態を更新するので、キャッシュから返すと状態がずれる）。
+    """
+    cache = get_result_cache() if key is not None else None
+    if cache is not None:
+        try:
+            found = cache.get(key)
+        except OSError:  # ディスク層が読めない。計算し直す
+            found = None
+        if found is not None:
+            value, elapsed, source = found
+            return value, {"hit": True, "source": source, "elapsed": elapsed}
+    start = time.perf_counter()
+    value = runner(token, *files, progress=progress, **params)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        try:
+            cache.put(key, value, elapsed)
+        except OSError:  # ディスクに書けなくてもメモリには残る
+            pass
+    return value, {"hit": False, "source": None, "elapsed": elapsed}
+
+def run_opt(token, group_file, member_file, employee_file,
             well_suited_leader, well_suited_member,
-            weight_char, weight_skill, weight_pref
-        )
+            weight_char, weight_skill, weight_pref,
+            solver="fixstars", timeout=1000, num_reads=1, seed=None,
+            compare_exact=False, top_k=None, decompose=None, pair_k=None, pool=None, profile=False,
+            tab="file", incremental=None):
+    """
+    quantum.optimize をバックグラウンドジョブとして投入。
+    incremental に IncrementalOptimizer を渡すと前回の実行との差分だけを解き直す。
+    """
+    if solver == "fixstars" and not token:
+        st.error("FIXSTARS_API_KEY が設定されていません。ローカルソルバーを選択してください。")
+        return
+    params = dict(
+        well_suited_leader=well_suited_leader, well_suited_member=well_suited_member,
+        weight_char=weight_char, weight_skill=weight_skill, weight_pref=weight_pref,
+        solver=solver, timeout=timeout, num_reads=num_reads, seed=seed,
+        compare_exact=compare_exact, top_k=top_k, decompose=decompose, pair_k=pair_k, pool=pool,
+        profile=profile,
+    )
+    if pool:
+        incremental = None  # 解のプールは全体を解いたサンプルからだけ作る
+    else:
+        params.pop("pool")  # 差分再最適化（IncrementalOptimizer.run）には pool の引数がない
+    # 差分再最適化は結果キャッシュを使わない
+    key = None if incremental is not None else input_key(group_file, member_file, employee_file, **params)
+    files = [freeze(f) for f in (group_file, member_file, employee_file)]
+
+    manager = get_job_manager()
+    if solver != "exact":
+        params["solver"] = manager.limit_solver(solver)
+    # 同じセッションで前のジョブが動いていれば取り消す
+    prev = st.session_state.get("job")
+    if prev is not None:
+        manager.cancel(prev["id"])
+    runner = quantum.optimize if incremental is None else incremental.run
+    job_id = manager.submit(optimize_cached, key, token, files, params, runner=runner)
+    st.session_state.job = {"id": job_id, "tab": tab}
+
+def run_sweep(token, files, weights, modes):
+    """重みスイープをバックグラウンドジョブとして投入"""
+    opts = solver_options()
+    if opts["solver"] == "fixstars" and not token:
+        st.error("FIXSTARS_API_KEY が設定されていません。ローカルソルバーを選択してください。")
+        return
+    opts.pop("compare_exact")
+    opts.pop("profile")
+    opts.pop("pair_k")  # スイープは 1 次のスコアのみ
+    opts.pop("pool")
+    files = [freeze(f) for f in files]
+    manager = get_job_manager()
+    prev = st.session_state.get("job")
+    if prev is not None:
+        manager.cancel(prev["id"])
+    job_id = manager.submit(
+        sweep.sweep, *files, weights, modes=modes, token=token,
+        max_workers=int(os.environ.get("OPT_MAX_SOLVES", 2)), **opts
+    )
+    st.session_state.job = {"id": job_id, "tab": "sweep"}
+
+def show_job(tab, render=None):
+    """このタブで投入したジョブの進捗または結果を表示"""
+    job = st.session_state.get("job")
+    if job is None or job["tab"] != tab:
+        return
+    status = get_job_manager().status(job["id"])
+    if status is None:
+        return
+    if status["state"] in ("queued", "running"):
+        job_progress(job["id"])
+    else:
+        (render or show_result)(status)
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id):
+    """実行中のジョブをポーリングして進捗を表示（画面全体はブロックしない）"""
+    manager = get_job_manager()
+    status = manager.status(job_id)
+    if status is None or status["state"] not in ("queued", "running"):
+        st.rerun()  # 終了したらページ全体を描画し直して結果を表示
+    if status["state"] == "queued":
+        text = "実行待ち…"
+    else:
+        text = f"{STAGE_LABELS.get(status['stage'], '準備中')}… （{status['elapsed']:.0f} 秒経過）"
+    st.progress(status["progress"], text=text)
+    st.button("キャンセル", key=f"cancel_{job_id}",
+              on_click=manager.cancel, args=(job_id,))
+
+def show_result(status):
+    """終了したジョブの結果表示"""
+    if status["state"] == "cancelled":
+        st.warning("最適化をキャンセルしました")
+        return
+    if status["state"] == "failed":
+        if isinstance(status["error"], InputError):
+            st.error(f"入力データに問題があります: {status['error']}")
+        else:
+            st.error(f"量子アニーリング実行中にエラーが発生しました: {status['error']}")
+        return
 
-        st.success("最適化完了")
-        st.dataframe(assign_df)
+    (assign_df, dept_comp_all, dept_skill, ratio_fig), info = status["result"]
 
-        st.markdown("### 希望達成率")
-        st.plotly_chart(ratio_fig, use_container_width=True)
+    st.success("最適化完了")
+    if info["hit"]:
+        src = "メモリ" if info["source"] == "memory" else "ディスク"
+        st.caption(f"キャッシュヒット（{src}）: 約 {info['elapsed']:.1f} 秒短縮")
+    else:
+        st.caption(f"キャッシュミス: 計算時間 {info['elapsed']:.1f} 秒")
+    # 差分再最適化の規模
+    inc = assign_df.attrs.get("incremental")
+    if inc is not None:
+        if inc["mode"] == "incremental":
+            st.caption(f"差分再最適化: 変更 {inc['changed_hires']} 人・削除 {inc['removed_hires']} 人・部署変更 {inc['changed_groups']} 件 "
+                       f"→ {inc['free_hires']} 人を {inc['free_groups']} 部署の中で解き直し（他は前回のまま）")
+        else:
+            st.caption(f"全体を最適化（{inc['reason']}）")
+    # 分割求解の規模
+    dec = assign_df.attrs.get("decomposition")
+    if dec is not None:
+        st.caption(f"分割求解: {dec['clusters']} クラスタ（新卒 {'・'.join(map(str, dec['cluster_hires']))} 人）"
+                   f"・解けなかったクラスタ {dec['failed_clusters']} 件・修復で配置 {dec['repaired_hires']} 人・"
+                   f"移動 {dec['moved_hires']} 人")
+    # QUBO ソルバーの制約違反（修復して実行可能にした）
+    pen = assign_df.attrs.get("penalty")
+    if pen is not None and pen["repaired_samples"]:
+        st.caption(f"制約ペナルティ {pen['penalty']:,.0f}・制約を破った新卒 {pen['violation_rate']:.0%} → "
+                   f"{pen['repaired_samples']} サンプルを修復して実行可能な割り当てにしました")
+    st.dataframe(assign_df)
+
+    # 厳密解との比較
+    if assign_df.attrs.get("optimality_gap") is not None:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("スコア合計", f"{assign_df.attrs['objective']:,.0f}")
+        col2.metric("最適値", f"{assign_df.attrs['optimal_objective']:,.0f}")
+        col3.metric("最適性ギャップ", f"{assign_df.attrs['optimality_gap']:.1%}")
+    # 新卒同士の相性（スコア合計・最適値には含まない）
+    if assign_df.attrs.get("hire_pairs") is not None:
+        st.caption(f"新卒同士の相性: {assign_df.attrs['hire_pairs']} 組を考慮し、同じ部署になった組の相性の合計は "
+                   f"{assign_df.attrs['pair_objective']:,.0f}（スコア合計には含まない）")
+
+    # 解のプール：再実行せずに案を比べる
+    pool = assign_df.attrs.get("pool")
+    if pool is not None:
+        st.markdown(f"### 案の比較（サンプル {assign_df.attrs['pool_samples']} 個から {len(pool)} 案）")
+        st.dataframe(pool.style.format({c: "{:.0%}" for c in ("第一希望", "第二希望", "第三希望", "希望一致率")}
+                                       | {"スコア合計": "{:,.0f}"}))
+        if "修復" in pool:
+            st.caption("所属違反・定員超過はソルバーのサンプル（修復前）の値です。"
+                       "「修復」の案は制約を満たすように直した割り当てを表示しています")
+        assignments = assign_df.attrs["pool_assignments"]
+        differs = assignments.nunique(axis=1) > 1
+        only_diff = st.checkbox("案によって配属が異なる新卒だけ表示", value=True, key=f"pool_diff_{status['id']}")
+        st.dataframe(assignments[differs] if only_diff else assignments)
+
+    # 段階ごとの計測結果
+    profile = assign_df.attrs.get("profile")
+    if profile is not None:
+        with st.expander(f"処理時間・メモリ（合計 {profile['total_seconds']:.2f} 秒）"):
+            st.dataframe(profile_frame(profile))
+            st.download_button("JSON をダウンロード", profile_json(profile, indent=2),
+                               file_name="profile.json", mime="application/json")
+
+    st.markdown("### 希望達成率")
+    st.plotly_chart(ratio_fig, use_container_width=True)
+
+    st.markdown("### 部署別 相性とスキル要件")
+    # 相性行列は選択した部署の分だけ計算・描画する
+    sizes = dept_comp_all.sizes()
+    grp = st.selectbox("部署", list(dept_skill), format_func=lambda g: f"{g}（{sizes.get(g, 0)} 人）",
+                       key=f"dept_{status['id']}")
+    if grp is not None:
+        st.markdown("相性")
+        show_compatibility(dept_comp_all[grp], key=f"{status['id']}_{grp}")
+        st.markdown("スキル要件")
+        skill = dept_skill[grp]
+        page = paginate(skill, key=f"skill_{status['id']}_{grp}")
+        if page.index[0] != skill.index[0]:
+            page = pd.concat([skill.iloc[:1], page])  # どのページにも「必要スキル」行を付ける
+        st.dataframe(page.style.apply(skill_colors, axis=None))
+
+def paginate(df, key):
+    """
+    セル数が MAX_TABLE_CELLS を超える表は行をページに分け、選んだページだけを返す。
+    1 ページの行数はセル数が MAX_TABLE_CELLS に収まるように決める。
+    """
+    if df.size <= MAX_TABLE_CELLS:
+        return df
+    per_page = max(1, MAX_TABLE_CELLS // max(df.shape[1], 1))
+    n_pages = -(-len(df) // per_page)
+    page = st.number_input(f"ページ（全 {n_pages} ページ・{per_page} 行ずつ）", 1, n_pages, 1, key=f"page_{key}")
+    return df.iloc[(page - 1) * per_page:page * per_page]
+
+def show_compatibility(mat, key):
+    """部署の相性行列。大きい部署は上位の組・ヒートマップ・ページ送りの表から選んで表示する"""
+    if mat.size <= MAX_TABLE_CELLS:
+        st.dataframe(mat.style.apply(comp_colors, axis=None).format(precision=0, na_rep=""))
+        return
+    view = st.radio("表示", ["上位の組", "ヒートマップ", "表（ページ送り）"], horizontal=True, key=f"view_{key}")
+    if view == "上位の組":
+        st.dataframe(top_pairs(mat, TOP_PAIRS), hide_index=True)
+    elif view == "ヒートマップ":
+        import plotly.express as px  # 図を作るときだけ読み込む
+        # 画像（PNG）として埋め込むので、人数が多くてもページの重さは行列の値の数によらない
+        fig = px.imshow(mat.to_numpy(), zmin=0, zmax=5, color_continuous_scale="Greens", binary_string=True)
+        fig.update_layout(xaxis_showticklabels=False, yaxis_showticklabels=False)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        page = paginate(mat, key=f"comp_{key}")
+        st.dataframe(page.style.apply(comp_colors, axis=None).format(precision=0, na_rep=""))
 
-        st.markdown("### 部署別 相性とスキル要件")
-        for (grp, mat), (_, df) in zip(dept_comp_all.items(), dept_skill.items()):
-            with st.popover(f"{grp}", use_container_width=True):
-                st.markdown("相性")
-                styled_mat = mat.style.applymap(color_map)  # ここでスタイル付与
-                st.dataframe(styled_mat)
-                st.markdown("スキル要件")
-                styled_skill_map = style_skill_df(df) # ここでスタイル付与
-                st.dataframe(styled_skill_map)
-    except Exception as e:
-        st.error(f"量子アニーリング実行中にエラーが発生しました: {e}")
+def top_pairs(mat, n):
+    """相性の高い組（同じ組は 1 回）を上位 n 組"""
+    a, b = np.triu_indices(len(mat), 1)
+    values = mat.to_numpy()[a, b]
+    top = np.argsort(-values, kind="stable")[:n]
+    return pd.DataFrame({
+        "名前1": mat.index.to_numpy()[a[top]],
+        "名前2": mat.columns.to_numpy()[b[top]],
+        "相性": values[top].astype(int),
+    })
+
+def show_sweep_result(status):
+    """重みスイープの結果表示（パレート最適なシナリオの表と散布図）"""
+    if status["state"] == "cancelled":
+        st.warning("スイープをキャンセルしました")
+        return
+    if status["state"] == "failed":
+        if isinstance(status["error"], InputError):
+            st.error(f"入力データに問題があります: {status['error']}")
+        else:
+            st.error(f"スイープ実行中にエラーが発生しました: {status['error']}")
+        return
+
+    df = status["result"]
+    st.success(f"スイープ完了（{len(df)} シナリオ, 合計 {df['時間[s]'].sum():.1f} 秒）")
+    st.markdown("### パレート最適なシナリオ")
+    st.dataframe(df[df["パレート最適"]].drop(columns=["割り当て", "パレート最適"]))
+    st.plotly_chart(sweep.pareto_figure(df), use_container_width=True)
+    with st.expander("全シナリオ"):
+        st.dataframe(df.drop(columns=["割り当て"]))
 
 # 注意事項を表示
 def show_warning(label):
@@ -282,50 +633,32 @@ def show_warning(label):
     }
     st.markdown(description[label])
 
-# 性格相性の色付け
-def color_map(val):
-    try:
-        val = int(val)  # 文字列でも数値化
-        if val == 0 or val == 1:
-            return 'background-color: #FFCCCC'
-        elif 2 <= val <= 5:
-            # 緑色濃淡計算（2〜5の範囲でグラデーション）
-            scale = (val - 2) / (5 - 2)  # 0.0 ～ 1.0
-            base = 230  # 最も薄い緑
-            range_ = 80  # 濃さの変化幅
-            green_value = int(base - scale * range_)  # 230 → 150
-            color_code = f'background-color: rgb({green_value}, 255, {green_value})'
-            return color_code
-        else:
-            return ''
-    except:
-        return ''  # 数値変換できなければ無色
-    
-# スキル要件の色付け
-def skill_color_map(val, col_idx, required):
-    try:
-        val = int(val)
-        req = int(required[col_idx])
-        if req == 1:
-            if val == 1:
-                return 'background-color: #A8E6A1'  # 緑
-            elif val == 0:
-                return 'background-color: #F5B7B1'  # 赤
-        return ''
-    except:
-        return ''
-
-def style_skill_df(df):
-    required = df.iloc[0].tolist()  # スキル要件行
-    def apply_color(val, row_idx, col_idx):
-        if row_idx == 0:
-            return ''
-        return skill_color_map(val, col_idx, required)
-
-    return df.style.apply(lambda row: [
-        apply_color(val, row.name, col_idx)
-        for col_idx, val in enumerate(row)
-    ], axis=1)
+# 性格相性の色付け：0・1 は赤、2〜5 は緑の濃淡（230 → 150）、それ以外（対角の NaN など）は無色
+COMP_COLORS = np.array(
+    ["background-color: #FFCCCC"] * 2
+    + [f"background-color: rgb({g}, 255, {g})" for g in (int(230 - (v - 2) / 3 * 80) for v in range(2, 6))]
+    + [""],
+    dtype=object,
+)
+
+def comp_colors(mat):
+    """相性行列の各セルの CSS（Styler.apply(axis=None) 用。表全体を 1 回の配列演算で決める）"""
+    v = mat.to_numpy(dtype=float)
+    idx = np.where(np.isfinite(v) & (v >= 0) & (v < 6), np.trunc(np.nan_to_num(v)), -1).astype(int)
+    return pd.DataFrame(COMP_COLORS[idx], index=mat.index, columns=mat.columns)
+
+# スキル要件の色付け：必要なスキルを持つ新卒は緑、持たない新卒は赤（1 行目の「必要スキル」は無色）
+def skill_colors(df):
+    """スキル表の各セルの CSS（Styler.apply(axis=None) 用）"""
+    css = np.full(df.shape, "", dtype=object)
+    is_req = df.iloc[:, 0].astype(str).eq("必要スキル").to_numpy()
+    if is_req.any():
+        skills = df.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").to_numpy()
+        required = skills[is_req.argmax()] == 1
+        rows = ~is_req
+        css[:, 1:][rows[:, None] & required[None, :] & (skills == 1)] = "background-color: #A8E6A1"
+        css[:, 1:][rows[:, None] & required[None, :] & (skills == 0)] = "background-color: #F5B7B1"
+    return pd.DataFrame(css, index=df.index, columns=df.columns)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,350 @@
+# batch.py
+#
+# 画面を使わない一括実行（夜間バッチなど）
+#   python batch.py scenarios/ --out results/ --workers 2 --solver exact
+#   python batch.py manifest.json --out results/ --format json
+#
+# 入力は次のどれか（複数指定可）
+#   - シナリオのディレクトリ：部署・既存社員・新卒社員の 3 ファイルを含む
+#     （synthetic.py の「部署.csv」… または sample/ の「部署テンプレート.csv」… の名前）
+#   - シナリオのディレクトリを並べた親ディレクトリ
+#   - マニフェスト（JSON）:
+#       {"defaults": {"solver": "exact", "weight_pref": 80},
+#        "scenarios": [{"name": "春", "dir": "spring"},
+#                      {"name": "秋", "group": "a.csv", "member": "b.csv", "employee": "c.csv",
+#                       "weight_char": 20}]}
+#     パスはマニフェストからの相対パス。defaults とシナリオのキーは quantum.optimize の引数名。
+#
+# シナリオごとに --out/<名前>/ に割り当て・部署別の相性とスキル表・希望達成数・段階別の時間を書き出し、
+# --out/summary.json に全シナリオの結果をまとめる。Plotly の図や Styler は作らない。
+# --stream なら部署別の表は 1 部署ずつ作ってファイルに追記する（新卒・部署が多いとき用）。
+# Fixstars のトークンは環境変数 FIXSTARS_API_KEY から読む。
+# 既存社員の部署インデックスは環境変数 DEPT_INDEX_DIR（未設定なら .cache/dept_index/）に保存する。
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import quantum
+from dept_index import DEFAULT_INDEX_DIR, INDEX_DIR_ENV
+from profiling import profile_json
+
+# シナリオのディレクトリで探すファイル名（部署, 既存社員, 新卒社員）
+INPUT_NAMES = (
+    ("部署.csv", "既存社員.csv", "新卒社員.csv"),
+    ("部署テンプレート.csv", "既存社員テンプレート.csv", "新卒社員テンプレート.csv"),
+)
+
+# マニフェスト・コマンドラインで省略したときの設定
+DEFAULT_PARAMS = {
+    "well_suited_leader": "多様性重視",
+    "well_suited_member": "多様性重視",
+    "weight_char": 50,
+    "weight_skill": 50,
+    "weight_pref": 50,
+    "solver": "exact",
+}
+
+FORMATS = ("parquet", "json")
+COMPATIBILITY_COLUMNS = ["部署", "名前1", "名前2", "相性"]
+TOKEN_ENV = "FIXSTARS_API_KEY"
+
+
+def _scenario_files(directory):
+    """ディレクトリ内の 3 ファイルのパス（見つからなければ None）"""
+    for names in INPUT_NAMES:
+        paths = [os.path.join(directory, name) for name in names]
+        if all(os.path.exists(p) for p in paths):
+            return paths
+    return None
+
+
+def _read_manifest(path):
+    with open(path, encoding="utf-8") as fp:
+        manifest = json.load(fp)
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = manifest.get("defaults", {})
+    scenarios = []
+    for k, entry in enumerate(manifest.get("scenarios", [])):
+        entry = dict(entry)
+        name = str(entry.pop("name", f"scenario{k + 1}"))
+        if "dir" in entry:
+            directory = os.path.join(base, entry.pop("dir"))
+            files = _scenario_files(directory)
+            if files is None:
+                raise ValueError(f"{path}: シナリオ「{name}」のディレクトリに入力ファイルがありません: {directory}")
+        else:
+            try:
+                files = [os.path.join(base, entry.pop(key)) for key in ("group", "member", "employee")]
+            except KeyError as e:
+                raise ValueError(f"{path}: シナリオ「{name}」に {e.args[0]} または dir がありません") from None
+        scenarios.append({"name": name, "files": files, "params": {**defaults, **entry}})
+    return scenarios
+
+
+def load_scenarios(paths):
+    """
+    ディレクトリ・マニフェストのリストからシナリオのリストを作る。
+    シナリオは {"name", "files": [部署, 既存社員, 新卒社員], "params": {...}}。
+    """
+    scenarios = []
+    for path in paths:
+        if os.path.isfile(path):
+            scenarios += _read_manifest(path)
+            continue
+        files = _scenario_files(path)
+        if files is not None:
+            scenarios.append({"name": os.path.basename(os.path.normpath(path)), "files": files, "params": {}})
+            continue
+        subdirs = sorted(d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)))
+        found = [(d, _scenario_files(os.path.join(path, d))) for d in subdirs]
+        found = [{"name": d, "files": f, "params": {}} for d, f in found if f is not None]
+        if not found:
+            raise ValueError(f"{path}: シナリオの入力ファイルが見つかりません")
+        scenarios += found
+
+    names = [s["name"] for s in scenarios]
+    dup = sorted({n for n in names if names.count(n) > 1})
+    if dup:
+        raise ValueError(f"シナリオ名が重複しています: {', '.join(dup)}")
+    return scenarios
+
+
+def compatibility_rows(grp, mat):
+    """1 部署の相性行列を (部署, 名前1, 名前2, 相性) の縦長の表にする（同じ組は 1 回）"""
+    a, b = np.triu_indices(len(mat), 1)
+    return pd.DataFrame({
+        "部署": grp,
+        "名前1": mat.index.to_numpy()[a],
+        "名前2": mat.columns.to_numpy()[b],
+        "相性": mat.to_numpy()[a, b],
+    }, columns=COMPATIBILITY_COLUMNS)
+
+
+def skill_rows(grp, df):
+    """1 部署のスキル表の先頭に部署の列を付ける（次の列は「必要スキル」または新卒の名前）"""
+    df = df.rename(columns={"": "名前"})
+    df.insert(0, "部署", grp)
+    return df
+
+
+def compatibility_table(dept_comp_all):
+    """部署ごとの相性行列を 1 つの縦長の表にする"""
+    parts = [compatibility_rows(grp, dept_comp_all[grp]) for grp in dept_comp_all]
+    if not parts:
+        return pd.DataFrame(columns=COMPATIBILITY_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def skill_table(dept_skill):
+    """部署ごとのスキル表を 1 つの表にする"""
+    return pd.concat([skill_rows(grp, dept_skill[grp]) for grp in dept_skill], ignore_index=True)
+
+
+def preference_table(counts):
+    """希望ごとの人数と割合"""
+    df = pd.DataFrame({"選択": list(counts), "人数": list(counts.values())})
+    total = df["人数"].sum()
+    df["割合"] = df["人数"] / total if total else 0.0
+    return df
+
+
+def write_table(df, path, fmt):
+    """表を Parquet または JSON（レコードの配列）で書き出し、書いたパスを返す"""
+    path = f"{path}.{fmt}"
+    df = df.copy(deep=False)
+    df.attrs = {}  # 解のプールなどの付随情報はファイルのメタデータに入れない（summary.json に書く）
+    if fmt == "parquet":
+        df.to_parquet(path)
+    else:
+        df.to_json(path, orient="records", force_ascii=False, indent=2)
+    return path
+
+
+class TableStream:
+    """
+    部署ごとの表を届いた順に 1 つのファイルへ追記する（全部署分をメモリに持たない）。
+    Parquet は部署ごとに行グループを書き、JSON はレコードの配列を少しずつ書く。
+    """
+
+    def __init__(self, path, fmt):
+        self.path = f"{path}.{fmt}"
+        self.fmt = fmt
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._fp = None
+
+    def write(self, df):
+        if len(df) == 0:
+            return
+        if self.fmt == "parquet":
+            import pyarrow as pa  # Parquet を書くときだけ読み込む
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(table.cast(self._schema))
+        else:
+            if self._fp is None:
+                self._fp = open(self.path, "w", encoding="utf-8")
+                self._fp.write("[\n")
+            else:
+                self._fp.write(",\n")
+            self._fp.write(df.to_json(orient="records", force_ascii=False, lines=True).strip().replace("\n", ",\n"))
+        self.rows += len(df)
+
+    def close(self, columns):
+        """閉じて書いたパスを返す（1 行も書かなければ columns の空の表を書く）"""
+        if self._writer is not None:
+            self._writer.close()
+        elif self._fp is not None:
+            self._fp.write("\n]\n")
+            self._fp.close()
+        else:
+            write_table(pd.DataFrame(columns=columns), self.path[:-len(self.fmt) - 1], self.fmt)
+        return self.path
+
+
+def stream_tables(dept_comp_all, dept_skill, directory, fmt):
+    """部署ごとの相性・スキル表を 1 部署ずつ作って追記し、{表の名前: パス} を返す"""
+    compat = TableStream(os.path.join(directory, "compatibility"), fmt)
+    skill = TableStream(os.path.join(directory, "skill"), fmt)
+    skill_columns = None
+    for grp, mat, df in quantum.stream_report(dept_comp_all, dept_skill):
+        compat.write(compatibility_rows(grp, mat))
+        rows = skill_rows(grp, df)
+        skill_columns = list(rows.columns)
+        skill.write(rows)
+    return {"compatibility": compat.close(COMPATIBILITY_COLUMNS), "skill": skill.close(skill_columns)}
+
+
+def run_scenario(scenario, out_dir, fmt="parquet", profile="time", stream=False):
+    """1 シナリオを解いて out_dir/<名前>/ に書き出し、結果の要約（dict）を返す（例外は要約に入れる）"""
+    name = scenario["name"]
+    directory = os.path.join(out_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    params = {**DEFAULT_PARAMS, **scenario["params"]}
+    summary = {"name": name, "files": scenario["files"], "params": params, "output": directory}
+    start = time.perf_counter()
+    try:
+        assign_df, dept_comp_all, dept_skill, _ = quantum.optimize(
+            os.environ.get(TOKEN_ENV), *scenario["files"], figure=False, profile=profile, **params,
+        )
+    except Exception as e:  # 1 シナリオの失敗で全体を止めない
+        summary.update(status="error", error=f"{type(e).__name__}: {e}",
+                       elapsed=time.perf_counter() - start)
+        profile_json(summary, os.path.join(directory, "summary.json"), indent=2)
+        return summary
+
+    attrs = dict(assign_df.attrs)
+    tables = {
+        "assignment": assign_df,
+        "preference": preference_table(attrs.pop("preference_counts")),
+    }
+    if "pool" in attrs:
+        tables["pool"] = attrs.pop("pool").rename_axis("案").reset_index()
+        tables["pool_assignments"] = attrs.pop("pool_assignments").reset_index()
+    outputs = {key: write_table(df, os.path.join(directory, key), fmt) for key, df in tables.items()}
+    if stream:
+        outputs.update(stream_tables(dept_comp_all, dept_skill, directory, fmt))
+    else:
+        outputs["compatibility"] = write_table(compatibility_table(dept_comp_all),
+                                               os.path.join(directory, "compatibility"), fmt)
+        outputs["skill"] = write_table(skill_table(dept_skill), os.path.join(directory, "skill"), fmt)
+
+    summary.update(status="ok", elapsed=time.perf_counter() - start, outputs=outputs, **attrs)
+    profile_json(summary, os.path.join(directory, "summary.json"), indent=2)
+    return summary
+
+
+def _run_task(task):
+    return run_scenario(*task)
+
+
+def run_batch(scenarios, out_dir, max_workers=2, fmt="parquet", profile="time", overrides=None, progress=None,
+              stream=False):
+    """
+    シナリオをプロセスプールで並列に（同時に max_workers 個まで）解き、要約の DataFrame を返す。
+    overrides はすべてのシナリオの設定を上書きする（コマンドラインの指定）。
+    stream=True なら部署ごとの相性・スキル表を 1 部署ずつ作って追記する（大規模なシナリオ向け）。
+    要約は out_dir/summary.json にも書き出す。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"出力形式は {' / '.join(FORMATS)} のどれかです: {fmt!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    if overrides:
+        scenarios = [{**s, "params": {**s["params"], **overrides}} for s in scenarios]
+    tasks = [(s, out_dir, fmt, profile, stream) for s in scenarios]
+
+    summaries = []
+    if max_workers == 1:
+        results = map(_run_task, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=max_workers)
+        results = pool.map(_run_task, tasks)
+    try:
+        for summary in results:
+            summaries.append(summary)
+            if progress is not None:
+                progress(summary)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    profile_json(summaries, os.path.join(out_dir, "summary.json"), indent=2)
+    columns = ["name", "status", "elapsed", "objective", "optimality_gap", "error"]
+    df = pd.DataFrame(summaries)
+    return df[[c for c in columns if c in df]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="シナリオ（部署・既存社員・新卒社員 CSV）を一括で最適化する")
+    parser.add_argument("inputs", nargs="+", help="シナリオのディレクトリ・その親ディレクトリ・マニフェスト（JSON）")
+    parser.add_argument("--out", required=True, help="出力先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=2, help="同時に解くシナリオ数の上限")
+    parser.add_argument("--format", choices=FORMATS, default="parquet", help="表の出力形式")
+    parser.add_argument("--memory", action="store_true", help="段階ごとのメモリも計測する（遅くなる）")
+    parser.add_argument("--stream", action="store_true",
+                        help="部署ごとの相性・スキル表を 1 部署ずつ書き出す（全部署分をメモリに持たない）")
+    # 指定したものだけ全シナリオの設定を上書きする
+    parser.add_argument("--solver", choices=["exact", "local", "fixstars"])
+    parser.add_argument("--timeout", type=int)
+    parser.add_argument("--num-reads", type=int)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--top-k", type=int)
+    parser.add_argument("--decompose", type=int)
+    parser.add_argument("--compare-exact", action="store_true", default=None)
+    args = parser.parse_args(argv)
+
+    overrides = {key: getattr(args, key) for key in
+                 ("solver", "timeout", "num_reads", "seed", "top_k", "decompose", "compare_exact")
+                 if getattr(args, key) is not None}
+    scenarios = load_scenarios(args.inputs)
+    # ワーカープロセスにも引き継ぐ
+    os.environ.setdefault(INDEX_DIR_ENV, DEFAULT_INDEX_DIR)
+
+    def report(summary):
+        if summary["status"] == "ok":
+            print(f"{summary['name']}: {summary['elapsed']:.2f} 秒, スコア合計 {summary['objective']:,.0f}", flush=True)
+        else:
+            print(f"{summary['name']}: 失敗 {summary['error']}", flush=True)
+
+    df = run_batch(scenarios, args.out, args.workers, args.format,
+                   profile=True if args.memory else "time", overrides=overrides, progress=report,
+                   stream=args.stream)
+    failed = int((df["status"] != "ok").sum())
+    print(f"{len(df)} シナリオ（失敗 {failed}）→ {os.path.join(args.out, 'summary.json')}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,408 @@
+# benchmark.py
+#
+# QUBO モデル構築時間のベンチマーク
+#   python benchmark.py                      # 既定サイズ (100×10 〜 10000×500)
+#   10000×500 の密モデルは構築だけで約 9 分・最大 3.3 GiB かかる（大半は amplify の制約ペナルティ生成で、
+#   --legacy との差は小さい。5000×200 で 37.6 秒 対 44.2 秒）。
+#   python benchmark.py --sizes 1000x50 2000x100 --legacy
+#   python benchmark.py --sizes 200x20 --top-k 3 --solve   # 密モデルと変数削減モデルの比較
+#
+# パイプライン全体（合成データ → quantum.optimize）の段階別ベンチマーク
+#   python benchmark.py --pipeline --sizes 1000x50 10000x200 --skew 1.0
+# 結果は --record のファイル（JSON Lines、既定は .cache/benchmark_results.jsonl）に追記し、
+# 別のコミットでの前回結果と比較する。
+#
+# 分割求解（decompose.py）と全体を一度に解いた場合の比較（時間・厳密解とのギャップ）
+#   python benchmark.py --decompose 2 4 8 --sizes 5000x200 --solver exact --skew 1.0
+#
+# 新卒同士の相性（2 次項）の組数を変えたときのモデル規模・構築時間・求解時間
+#   python benchmark.py --pairs 0 1 3 10 --sizes 200x10 1000x20 --solve
+#
+# アプリの起動時間（app.py が読み込むモジュールの import を新しいプロセスで計測）
+#   python benchmark.py --startup --repeat 5
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from amplify import (
+    VariableGenerator,
+    Poly,
+    Model,
+    ConstraintList,
+    equal_to,
+    less_equal,
+    sum as amplify_sum,
+)
+
+import quantum
+import solvers
+import synthetic
+
+DEFAULT_SIZES = ["100x10", "1000x50", "2000x100", "5000x200", "10000x500"]
+# --pipeline の結果の記録先（リポジトリには含めない）
+DEFAULT_RECORD = os.path.join(".cache", "benchmark_results.jsonl")
+
+
+def build_model_legacy(x, base_score, capacity, P):
+    """旧実装（要素ごとの Poly 演算）。比較用"""
+    n_new, n_groups = base_score.shape
+    obj = Poly(0.0)
+    for i in range(n_new):
+        for g in range(n_groups):
+            w = base_score[i, g]
+            if w:
+                obj -= w * x[i][g]
+    cons = []
+    for i in range(n_new):
+        cons.append(equal_to(amplify_sum(x[i, :]), 1) * P)
+    for g in range(n_groups):
+        cons.append(less_equal(amplify_sum(x[:, g]), capacity[g]) * P)
+    return Model(obj, ConstraintList(cons))
+
+
+def random_instance(n_new, n_groups, seed=0):
+    """ランダムなスコア行列と、全員が収まる定員を生成"""
+    rng = np.random.default_rng(seed)
+    base_score = rng.integers(0, 1000, size=(n_new, n_groups)).astype(float)
+    capacity = np.full(n_groups, -(-n_new // n_groups) + 1)
+    return base_score, capacity
+
+
+def random_prefs(n_new, n_groups, seed=0):
+    """第一〜第三希望（部署 ID は 1 始まり）"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, n_groups + 1, size=(n_new, 3))
+
+
+def bench_build(builder, n_new, n_groups, seed=0):
+    base_score, capacity = random_instance(n_new, n_groups, seed)
+    x = VariableGenerator().array("Binary", shape=(n_new, n_groups))
+    start = time.perf_counter()
+    model = builder(x, base_score, capacity, 1501)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(model.constraints)
+
+
+def bench_prune(n_new, n_groups, top_k, seed=0, solve=False, timeout=1000):
+    """密モデルと上位 k 部署に絞ったモデルの規模・構築時間・求解時間・品質を比較"""
+    base_score, capacity = random_instance(n_new, n_groups, seed)
+    prefs = random_prefs(n_new, n_groups, seed)
+    group_ids = np.arange(1, n_groups + 1)
+    optimal = (solvers.min_cost_assignment(base_score, capacity) * base_score).sum()
+
+    # 候補を絞ったことによる最適値の損失（ソルバーに依存しない品質比較）
+    r, c = quantum.candidate_pairs(base_score, prefs, group_ids, capacity, top_k)
+    pruned_score = np.full_like(base_score, -1e12)
+    pruned_score[r, c] = base_score[r, c]
+    pruned_sol = solvers.min_cost_assignment(pruned_score, capacity)
+    pruned_loss = (optimal - (pruned_sol * base_score).sum()) / optimal
+    if (pruned_sol * pruned_score).min() < 0:
+        pruned_loss = float("nan")  # 候補内では実行不能
+
+    rows = {}
+    for label in ("dense", f"top{top_k}"):
+        gen = VariableGenerator()
+        start = time.perf_counter()
+        if label == "dense":
+            x = gen.array("Binary", shape=(n_new, n_groups))
+            model = quantum.build_model(x, base_score, capacity, 1501)
+        else:
+            x = gen.array("Binary", len(r))
+            model = quantum.build_sparse_model(x, r, c, base_score, capacity, 1501)
+        build = time.perf_counter() - start
+
+        row = {"vars": x.size, "constraints": len(model.constraints), "build": build,
+               "loss": 0.0 if label == "dense" else pruned_loss}
+        if solve:
+            result = solvers.local_solve(model, x, timeout=timeout, num_reads=4, seed=seed)
+            row["solve"] = result.execution_time
+            best = result.best()
+            if best is None:
+                row["gap"] = float("nan")  # 実行可能解なし
+            else:
+                if label != "dense":
+                    dense = np.zeros((n_new, n_groups), dtype=int)
+                    dense[r, c] = best
+                    best = dense
+                row["gap"] = (optimal - (best * base_score).sum()) / optimal
+        rows[label] = row
+    return rows
+
+
+def git_revision():
+    """現在のコミット（未コミットの変更があれば末尾に "+"。git が使えなければ None）"""
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return head + ("+" if dirty else "")
+
+
+def bench_pipeline(n_new, n_groups, solver="exact", skew=0.0, top_k=None,
+                   timeout=1000, seed=0, repeat=1):
+    """
+    合成データを CSV に書き出して quantum.optimize を実行し、段階ごとの時間を計測する。
+    repeat 回実行して段階ごと・全体それぞれの最小値をとる。
+    """
+    record = {"size": f"{n_new}x{n_groups}", "solver": solver, "skew": skew, "top_k": top_k}
+    with tempfile.TemporaryDirectory() as directory:
+        paths = synthetic.write_csvs(directory, n_new, n_groups, skew=skew, seed=seed)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                assign_df, *_ = quantum.optimize(
+                    None, *paths, "多様性重視", "多様性重視", 50, 50, 50,
+                    solver=solver, timeout=timeout, seed=seed, top_k=top_k, profile="time",
+                )
+            except RuntimeError as e:  # 実行可能解なし
+                record["error"] = str(e)
+                return record
+            total = time.perf_counter() - start
+
+            profile = assign_df.attrs["profile"]
+            stages = record.setdefault("stages", {})
+            for s in profile["stages"]:
+                stages[s["stage"]] = min(stages.get(s["stage"], np.inf), s["seconds"])
+                for key in ("variables", "constraints"):
+                    if key in s:
+                        record[key] = s[key]
+            record["total"] = min(record.get("total", np.inf), total)
+            record["objective"] = assign_df.attrs["objective"]
+    return record
+
+
+def bench_decompose(n_new, n_groups, clusters, solver="exact", skew=0.0, top_k=None,
+                    timeout=1000, seed=0):
+    """
+    合成データのスコア行列を、全体を一度に（分割数 1）と分割数 clusters でそれぞれ解き、
+    求解時間と厳密解に対するギャップ・修復段階で動かした人数を返す。
+    """
+    inputs = quantum.read_inputs(*synthetic.generate(n_new, n_groups, skew=skew, seed=seed))
+    components = quantum.score_components(inputs, "多様性重視", "多様性重視")
+    base_score = quantum.combine_scores(components, 50, 50, 50)
+    capacity = inputs["capacity"]
+    optimal = (solvers.min_cost_assignment(base_score, capacity) * base_score).sum()
+
+    rows = {}
+    for k in (1, *clusters):
+        details = {}
+        start = time.perf_counter()
+        try:
+            sol = quantum.solve_assignment(
+                base_score, capacity, 1501, solver=solver, timeout=timeout, seed=seed, top_k=top_k,
+                prefs_raw=inputs["prefs_raw"], group_ids=inputs["group_ids"],
+                decompose=k, details=details,
+            )
+        except RuntimeError:  # 実行可能解なし
+            rows[k] = {"solve": time.perf_counter() - start, "gap": float("nan")}
+            continue
+        row = {"solve": time.perf_counter() - start,
+               "gap": (optimal - (sol * base_score).sum()) / abs(optimal)}
+        if "decomposition" in details:
+            info = details["decomposition"]
+            row.update(largest=max(info["cluster_hires"]), failed=info["failed_clusters"],
+                       moved=info["moved_hires"] + info["repaired_hires"])
+        rows[k] = row
+    return rows
+
+
+def bench_pairs(n_new, n_groups, ks, seed=0, solve=False, timeout=1000):
+    """
+    合成データで、新卒同士の相性を各新卒の上位 k 人（k = 0 なら使わない）に絞ったときの
+    組数・目的関数の項数・構築時間（組の選択を含む）と、solve=True ならローカルソルバーの求解時間を返す。
+    """
+    inputs = quantum.read_inputs(*synthetic.generate(n_new, n_groups, seed=seed))
+    components = quantum.score_components(inputs, "多様性重視", "多様性重視")
+    base_score = quantum.combine_scores(components, 50, 50, 50)
+    capacity = inputs["capacity"]
+
+    rows = {}
+    for k in ks:
+        start = time.perf_counter()
+        pairs = quantum.weighted_pairs(inputs, "多様性重視", 50, pair_k=k, seed=seed) if k else None
+        x = VariableGenerator().array("Binary", shape=(n_new, n_groups))
+        model = quantum.build_model(x, base_score, capacity, 1501, pairs)
+        row = {"pairs": 0 if pairs is None else len(pairs[0]), "terms": len(model.objective),
+               "build": time.perf_counter() - start}
+        if solve:
+            result = solvers.local_solve(model, x, timeout=timeout, num_reads=4, seed=seed)
+            row["solve"] = result.execution_time
+            best = result.best()
+            row["feasible"] = best is not None
+            if best is not None and pairs is not None:
+                row["pair_value"] = quantum.pair_value(best.argmax(axis=1), pairs)
+        rows[k] = row
+    return rows
+
+
+# app.py が起動時に読み込むプロジェクトのモジュール（streamlit を除く）と、遅延させたい重いモジュール
+APP_MODULES = ("quantum", "incremental", "sweep", "cache", "profiling", "jobs", "ingest")
+HEAVY_MODULES = ("amplify", "plotly")
+
+
+def bench_startup(repeat=5):
+    """
+    新しいプロセスで pandas/numpy の後に APP_MODULES を import する時間（最小値）と、
+    その時点で読み込まれている重いモジュールを返す。
+    """
+    code = (
+        "import json, sys, time\n"
+        "import numpy, pandas\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(APP_MODULES)}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = [json.loads(subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True,
+                                      text=True, check=True).stdout) for _ in range(repeat)]
+    return min(r["seconds"] for r in runs), runs[0]["loaded"]
+
+
+def load_records(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def previous_record(records, record):
+    """同じ条件で別のコミットに記録された直近の結果（なければ同じ条件の直近の結果）"""
+    keys = ("size", "solver", "skew", "top_k")
+    same = [old for old in records if "total" in old and all(old.get(k) == record.get(k) for k in keys)]
+    other = [old for old in same if old.get("commit") != record["commit"]]
+    return (other or same or [None])[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QUBO モデル構築時間のベンチマーク")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES,
+                        help="新卒数x部署数 (例: 1000x50)")
+    parser.add_argument("--legacy", action="store_true",
+                        help="旧実装（要素ごとの Poly 演算）も計測する")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="上位 k 部署に絞ったモデルと密モデルを比較する")
+    parser.add_argument("--solve", action="store_true",
+                        help="--top-k / --pairs 比較でローカルソルバーによる求解時間も計測する")
+    parser.add_argument("--timeout", type=int, default=1000,
+                        help="ローカルソルバーのタイムアウト [ms]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="合成データで quantum.optimize 全体を段階別に計測する")
+    parser.add_argument("--solver", default="exact", choices=["exact", *solvers.SOLVERS],
+                        help="--pipeline / --decompose で使うソルバー")
+    parser.add_argument("--skew", type=float, default=0.0, help="--pipeline / --decompose の希望部署の偏り")
+    parser.add_argument("--decompose", type=int, nargs="+", default=None,
+                        help="分割数（複数可）ごとに分割求解と全体の求解を比較する")
+    parser.add_argument("--repeat", type=int, default=1, help="--pipeline の繰り返し回数（最小値をとる）")
+    parser.add_argument("--record", default=DEFAULT_RECORD,
+                        help="--pipeline の結果を追記するファイル（空文字なら記録しない）")
+    parser.add_argument("--pairs", type=int, nargs="+", default=None,
+                        help="新卒同士の相性を各新卒の上位 k 人に絞ったときの規模を比較する（k を複数指定）")
+    parser.add_argument("--startup", action="store_true",
+                        help="app.py が読み込むモジュールの import 時間を計測する（--repeat 回の最小値）")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="前回比でこの割合以上遅くなったら REGRESSION と表示する")
+    args = parser.parse_args(argv)
+
+    if args.pipeline:
+        records = load_records(args.record) if args.record else []
+        commit = git_revision()
+        print(f"{'size':>12} " + " ".join(f"{s:>8}" for s in quantum.STAGES) + f" {'total[s]':>9} {'prev':>9}")
+        for size in args.sizes:
+            n_new, n_groups = (int(v) for v in size.lower().split("x"))
+            record = bench_pipeline(n_new, n_groups, args.solver, args.skew, args.top_k,
+                                    args.timeout, args.seed, args.repeat)
+            record.update(commit=commit, timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"))
+            if args.record:
+                os.makedirs(os.path.dirname(args.record) or ".", exist_ok=True)
+                with open(args.record, "a", encoding="utf-8") as fp:
+                    fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if "error" in record:
+                print(f"{size:>12} {record['error']}", flush=True)
+                continue
+
+            stages = " ".join(
+                f"{record['stages'][s]:>8.3f}" if s in record["stages"] else f"{'-':>8}"
+                for s in quantum.STAGES
+            )
+            prev = previous_record(records, record)
+            compare = ""
+            if prev is not None:
+                ratio = record["total"] / prev["total"]
+                compare = f"{ratio:>8.2f}x"
+                if ratio > 1 + args.tolerance:
+                    slow = [s for s, t in record["stages"].items()
+                            if t > prev["stages"].get(s, np.inf) * (1 + args.tolerance) and t > 0.01]
+                    compare += f"  REGRESSION vs {prev.get('commit')} ({', '.join(slow)})"
+            print(f"{size:>12} {stages} {record['total']:>9.3f} {compare}", flush=True)
+        return
+
+    if args.startup:
+        seconds, loaded = bench_startup(max(args.repeat, 1))
+        print(f"import {', '.join(APP_MODULES)}: {seconds * 1000:.1f} ms"
+              f"（読み込まれた重いモジュール: {', '.join(loaded) or 'なし'}）")
+        return
+
+    if args.pairs:
+        # pairs: 残した新卒同士の組数, terms: 目的関数の項数
+        print(f"{'size':>12} {'k':>5} {'pairs':>9} {'terms':>10} {'build[s]':>10} {'solve[s]':>10} {'pair_value':>11}")
+        for size in args.sizes:
+            n_new, n_groups = (int(v) for v in size.lower().split("x"))
+            rows = bench_pairs(n_new, n_groups, args.pairs, args.seed, args.solve, args.timeout)
+            for k, row in rows.items():
+                solve = f"{row['solve']:.3f}" if "solve" in row else ""
+                value = ("infeas." if not row["feasible"] else f"{row.get('pair_value', 0):.0f}") if "feasible" in row else ""
+                print(f"{size:>12} {k:>5} {row['pairs']:>9} {row['terms']:>10} {row['build']:>10.3f} "
+                      f"{solve:>10} {value:>11}", flush=True)
+        return
+
+    if args.decompose:
+        # gap: 厳密解に対するギャップ, largest: 最大の部分問題の新卒数, moved: 修復段階で動かした人数
+        print(f"{'size':>12} {'clusters':>8} {'solve[s]':>10} {'gap':>8} {'largest':>8} {'failed':>7} {'moved':>7}")
+        for size in args.sizes:
+            n_new, n_groups = (int(v) for v in size.lower().split("x"))
+            rows = bench_decompose(n_new, n_groups, args.decompose, args.solver, args.skew,
+                                   args.top_k, args.timeout, args.seed)
+            for k, row in rows.items():
+                gap = "infeas." if np.isnan(row["gap"]) else f"{row['gap']:.2%}"
+                print(f"{size:>12} {k:>8} {row['solve']:>10.3f} {gap:>8} {row.get('largest', n_new):>8} "
+                      f"{row.get('failed', ''):>7} {row.get('moved', ''):>7}", flush=True)
+        return
+
+    if args.top_k is not None:
+        # loss: 候補内の厳密最適値の低下率, gap: ローカルソルバーの解の最適性ギャップ
+        print(f"{'size':>12} {'model':>8} {'vars':>10} {'constraints':>12} {'build[s]':>10} "
+              f"{'loss':>8} {'solve[s]':>10} {'gap':>8}")
+        for size in args.sizes:
+            n_new, n_groups = (int(v) for v in size.lower().split("x"))
+            rows = bench_prune(n_new, n_groups, args.top_k, args.seed, args.solve, args.timeout)
+            for label, row in rows.items():
+                solve = f"{row['solve']:.3f}" if "solve" in row else ""
+                gap = ("infeas." if np.isnan(row["gap"]) else f"{row['gap']:.1%}") if "gap" in row else ""
+                print(f"{size:>12} {label:>8} {row['vars']:>10} {row['constraints']:>12} "
+                      f"{row['build']:>10.3f} {row['loss']:>8.2%} {solve:>10} {gap:>8}", flush=True)
+        return
+
+    print(f"{'size':>12} {'vars':>10} {'constraints':>12} {'build[s]':>10} {'legacy[s]':>10}")
+    for size in args.sizes:
+        n_new, n_groups = (int(v) for v in size.lower().split("x"))
+        elapsed, n_cons = bench_build(quantum.build_model, n_new, n_groups, args.seed)
+        legacy = ""
+        if args.legacy:
+            legacy_elapsed, _ = bench_build(build_model_legacy, n_new, n_groups, args.seed)
+            legacy = f"{legacy_elapsed:.3f}"
+        print(f"{size:>12} {n_new * n_groups:>10} {n_cons:>12} {elapsed:>10.3f} {legacy:>10}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# cache.py
+#
+# 最適化結果のキャッシュ
+#   キー : 3 つの入力 CSV の内容ハッシュ ＋ 重み・相性モード・ソルバー設定
+#   値   : quantum.optimize の戻り値 (assign_df, dept_comp_all, dept_skill, ratio_fig)
+# メモリ上の LRU と、合計サイズで古いものから消すディスク層の 2 段構成。
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# キャッシュする値（quantum.optimize の戻り値。DeptCompatibility などを含む）の形式を変えたら上げる
+# （古いビルドが書いたディスク層のエントリを使わない）
+RESULT_VERSION = 1
+
+
+def file_bytes(f):
+    """パス・アップロードファイル・StringIO などから内容をバイト列で取り出す（読み位置は戻す）"""
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as fp:
+            return fp.read()
+    if hasattr(f, "getvalue"):
+        data = f.getvalue()
+    else:
+        pos = f.tell()
+        data = f.read()
+        f.seek(pos)
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+def frame_bytes(df):
+    """DataFrame / Arrow テーブルの列名と値をバイト列にする（キャッシュキー用）"""
+    if not isinstance(df, pd.DataFrame):
+        df = df.to_pandas()
+    header = json.dumps([str(c) for c in df.columns], ensure_ascii=False).encode("utf-8")
+    return header + pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+
+
+def input_key(group_file, member_file, employee_file, **params):
+    """入力（ファイルの内容または表の値）とパラメータからキャッシュキー（16 進文字列）を作る"""
+    h = hashlib.sha256()
+    h.update(f"result/{RESULT_VERSION}".encode("utf-8"))
+    for f in (group_file, member_file, employee_file):
+        is_table = isinstance(f, pd.DataFrame) or hasattr(f, "to_pandas")
+        data = frame_bytes(f) if is_table else file_bytes(f)
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    h.update(json.dumps(params, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    メモリ LRU ＋ ディスクの 2 段キャッシュ。
+    エントリには計算にかかった時間も保存し、ヒット時に短縮できた時間を返す。
+    """
+
+    def __init__(self, directory=".cache/results", max_items=32, max_bytes=512 * 1024**2):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key):
+        """(値, 計算時間[s], 取得元 "memory"/"disk") を返す。なければ None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                value, elapsed = self._memory[key]
+                return value, elapsed, "memory"
+
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fp:
+                value, elapsed = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)  # 最終利用時刻を更新（ディスク層の LRU 用）
+        self._remember(key, value, elapsed)
+        return value, elapsed, "disk"
+
+    def put(self, key, value, elapsed):
+        self._remember(key, value, elapsed)
+        if not self.directory:
+            return
+        # 一時ファイルはプロセス・スレッドごとに分ける（同じキーを並行して書いても混ざらない）
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fp:
+            pickle.dump((value, elapsed), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self._evict_disk()
+
+    def _remember(self, key, value, elapsed):
+        with self._lock:
+            self._memory[key] = (value, elapsed)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """合計サイズが上限を超えたら最終利用時刻の古いものから削除"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def cached_call(self, key, fn, *args, **kwargs):
+        """
+        キャッシュにあればそれを、なければ fn(*args, **kwargs) を計算して保存する。
+        戻り値は (値, 情報 dict)。情報は hit / source / elapsed（元の計算時間 [s]）。
+        """
+        found = self.get(key)
+        if found is not None:
+            value, elapsed, source = found
+            return value, {"hit": True, "source": source, "elapsed": elapsed}
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        self.put(key, value, elapsed)
+        return value, {"hit": False, "source": None, "elapsed": elapsed}
@@ -0,0 +1,196 @@
+# decompose.py
+#
+# 大規模な割り当て問題の分割求解
+#   1. 部署をクラスタに分ける（同じ新卒の第一〜第三希望・最高スコア部署に並ぶ部署どうしを結合）
+#   2. 各新卒を、スコアが最も高い部署を含むクラスタへ（クラスタの定員合計を超えない範囲で）振り分ける
+#   3. クラスタごとの部分問題を並行して解く（部署はクラスタ間で重ならないので定員も自然に分かれる）
+#   4. 修復・統合：部分問題で解けなかった新卒を空きのある部署へ入れ、
+#      クラスタをまたいで空き部署へ移すと得をする新卒を移す
+#
+# 部分問題の求解は solve_part(score, capacity, prefs_raw, group_ids, rows) -> 0/1 行列 で受け取る
+# （rows は部分問題の新卒の元のインデックス）。
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 修復段階の改善ラウンドの上限
+MAX_REPAIR_ROUNDS = 20
+
+
+def _find(parent, a):
+    while parent[a] != a:
+        parent[a] = parent[parent[a]]
+        a = parent[a]
+    return a
+
+
+def cluster_groups(base_score, capacity, pref_idx, n_clusters):
+    """
+    部署を n_clusters 個のクラスタに分け、部署ごとのクラスタ番号を返す。
+    pref_idx は各新卒の希望部署のインデックス（n_new × 3、該当なしは -1）。
+    同じ新卒の候補（希望部署と最高スコア部署）に並ぶ回数が多い部署対から順に、
+    定員合計が上限（全体の 1/n_clusters）を超えない範囲で結合し、残りを定員の大きい順に詰める。
+    """
+    capacity = np.asarray(capacity)
+    n_groups = len(capacity)
+    n_clusters = max(1, min(n_clusters, n_groups))
+    choices = np.column_stack([pref_idx, np.asarray(base_score).argmax(axis=1)])
+
+    # 部署対の共起回数
+    keys = []
+    for a in range(choices.shape[1]):
+        for b in range(a + 1, choices.shape[1]):
+            u, v = choices[:, a], choices[:, b]
+            ok = (u >= 0) & (v >= 0) & (u != v)
+            keys.append(np.minimum(u, v)[ok] * n_groups + np.maximum(u, v)[ok])
+    pair_keys, weights = np.unique(np.concatenate(keys), return_counts=True) if keys else ([], [])
+
+    limit = capacity.sum() / n_clusters
+    parent = np.arange(n_groups)
+    size = capacity.astype(float).copy()
+    for k in np.argsort(-np.asarray(weights), kind="stable"):
+        u, v = divmod(int(pair_keys[k]), n_groups)
+        ru, rv = _find(parent, u), _find(parent, v)
+        if ru != rv and size[ru] + size[rv] <= limit:
+            parent[rv] = ru
+            size[ru] += size[rv]
+
+    # 連結成分を定員の大きい順に、定員合計の最も小さいクラスタへ詰める
+    roots = np.array([_find(parent, g) for g in range(n_groups)])
+    comps = np.unique(roots)
+    labels = np.empty(n_groups, dtype=int)
+    load = np.zeros(n_clusters)
+    for r in sorted(comps, key=lambda r: -size[r]):
+        c = load.argmin()
+        labels[roots == r] = c
+        load[c] += size[r]
+    return labels
+
+
+def assign_hires(base_score, capacity, labels, n_clusters):
+    """
+    各新卒をクラスタに振り分ける。クラスタ内の最高スコアが高い順に入れるが、
+    1 位と 2 位の差（後回しにしたときの損）が大きい新卒から先に決める。
+    """
+    base_score = np.asarray(base_score, dtype=float)
+    open_ = np.asarray(capacity) > 0
+    best = np.full((len(base_score), n_clusters), -np.inf)
+    for c in range(n_clusters):
+        cols = np.flatnonzero((labels == c) & open_)
+        if len(cols):
+            best[:, c] = base_score[:, cols].max(axis=1)
+    # 定員の余りは各クラスタに同じ割合で残す（どのクラスタにも修復段階で移せる空きができる）
+    room = np.bincount(labels, weights=capacity, minlength=n_clusters)
+    room = np.minimum(room, np.ceil(room * len(base_score) / room.sum()))
+
+    top2 = -np.sort(-best, axis=1)[:, :2]
+    regret = top2[:, 0] - (top2[:, 1] if n_clusters > 1 else 0)
+    regret = np.where(np.isfinite(regret), regret, np.inf)
+    out = np.empty(len(base_score), dtype=int)
+    for i in np.argsort(-regret, kind="stable"):
+        c = np.where(room > 0, best[i], -np.inf).argmax()
+        out[i] = c
+        room[c] -= 1
+    return out
+
+
+def repair(assign, base_score, capacity):
+    """
+    割り当て（部署インデックス、未割り当ては -1）を修復・改善する。
+    未割り当ての新卒を空きのある最良の部署に入れ、その後は空きのある部署へ移ると
+    スコアが上がる新卒を、上がり幅の大きい順に移す（改善がなくなるまで）。
+    戻り値は (assign, 修復した人数, 移動した人数)。
+    """
+    assign = np.array(assign)
+    base_score = np.asarray(base_score, dtype=float)
+    capacity = np.asarray(capacity)
+    load = np.bincount(assign[assign >= 0], minlength=len(capacity))
+
+    missing = np.flatnonzero(assign < 0)
+    for i in missing[np.argsort(-base_score[missing].max(axis=1), kind="stable")]:
+        g = np.where(load < capacity, base_score[i], -np.inf).argmax()
+        assign[i] = g
+        load[g] += 1
+
+    moved = 0
+    rows = np.arange(len(assign))
+    for _ in range(MAX_REPAIR_ROUNDS):
+        spare = load < capacity
+        if not spare.any():
+            break
+        cand = np.where(spare[None, :], base_score, -np.inf)
+        target = cand.argmax(axis=1)
+        gain = cand[rows, target] - base_score[rows, assign]
+        movers = np.flatnonzero(gain > 0)
+        n_moved = 0
+        for i in movers[np.argsort(-gain[movers], kind="stable")]:
+            g = target[i]
+            if load[g] < capacity[g]:
+                load[assign[i]] -= 1
+                load[g] += 1
+                assign[i] = g
+                n_moved += 1
+        moved += n_moved
+        if n_moved == 0:
+            break
+    return assign, len(missing), moved
+
+
+def solve_decomposed(base_score, capacity, prefs_raw, group_ids, n_clusters, solve_part, max_workers=None):
+    """
+    分割して解き、(割り当ての 0/1 行列, 情報 dict) を返す。
+    情報: クラスタ数・クラスタごとの新卒数と部署数・部分問題の合計時間・修復した人数・移動した人数。
+    """
+    base_score = np.asarray(base_score, dtype=float)
+    capacity = np.asarray(capacity)
+    group_ids = np.asarray(group_ids)
+    prefs = np.asarray(prefs_raw).reshape(-1, 3)
+    n_new, n_groups = base_score.shape
+
+    # 希望部署 ID → 部署インデックス
+    order = np.argsort(group_ids)
+    pos = np.clip(np.searchsorted(group_ids[order], prefs), 0, n_groups - 1)
+    pref_idx = np.where(group_ids[order][pos] == prefs, order[pos], -1)
+
+    labels = cluster_groups(base_score, capacity, pref_idx, n_clusters)
+    n_clusters = labels.max() + 1
+    hire_cluster = assign_hires(base_score, capacity, labels, n_clusters)
+
+    def solve_cluster(c):
+        rows = np.flatnonzero(hire_cluster == c)
+        cols = np.flatnonzero(labels == c)
+        if len(rows) == 0:
+            return rows, None, 0.0
+        start = time.perf_counter()
+        try:
+            sub = solve_part(base_score[np.ix_(rows, cols)], capacity[cols],
+                             prefs[rows].tolist(), group_ids[cols], rows)
+        except (RuntimeError, ValueError):  # 部分問題で実行可能解なし → 修復段階に任せる
+            return rows, None, time.perf_counter() - start
+        return rows, cols[sub.argmax(axis=1)], time.perf_counter() - start
+
+    assign = np.full(n_new, -1)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(solve_cluster, range(n_clusters)))
+    failed = 0
+    for rows, chosen, _ in results:
+        if chosen is None:
+            failed += len(rows) > 0
+        else:
+            assign[rows] = chosen
+
+    assign, repaired, moved = repair(assign, base_score, capacity)
+    sol = np.zeros((n_new, n_groups), dtype=int)
+    sol[np.arange(n_new), assign] = 1
+    info = {
+        "clusters": int(n_clusters),
+        "cluster_hires": np.bincount(hire_cluster, minlength=n_clusters).tolist(),
+        "cluster_groups": np.bincount(labels, minlength=n_clusters).tolist(),
+        "sub_seconds": float(sum(t for _, _, t in results)),
+        "failed_clusters": int(failed),
+        "repaired_hires": int(repaired),
+        "moved_hires": int(moved),
+    }
+    return sol, info
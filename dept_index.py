@@ -0,0 +1,237 @@
+# dept_index.py
+#
+# 既存社員の部署インデックス
+#   既存社員の名簿（CSV・DataFrame、またはパック形式の roster.Roster）から作り、
+#   スコア計算（部署ごとの性格パターン人数）とレポート（部署ごとの社員の行）で使い回す。
+#   パック形式の名簿はビットをそのまま使う（DataFrame を経由しない）。
+#     names, codes, dept, leader : 既存社員の行ごとの名前・パック済みビット・部署インデックス・リーダーか
+#     order, starts              : 部署 g の既存社員の行番号は order[starts[g]:starts[g + 1]]（元の順）
+#     leader_hist, member_hist   : 部署 × 性格パターン（32 通り）のリーダー・メンバーの人数
+#
+# 既存社員の入力の内容と部署ID・部署名のハッシュをキーに保存し、
+# 同じ入力なら既存社員 CSV の読み込み・検証を省く。内容が変わればキーが変わり、
+# 古いインデックスは件数・合計サイズの上限で消える。直前のインデックス（base）を渡すと、
+# 行数が同じなら変わった行の分だけ集計を差分で更新する。
+# 保存先は環境変数 DEPT_INDEX_DIR のディレクトリ。未設定ならプロセス内のメモリだけに持つ
+# （アプリと batch.py は .cache/dept_index/ を使う）。ディレクトリが作れない・読めないときもメモリだけになる。
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import roster
+from cache import ResultCache, file_bytes, frame_bytes
+from ingest import load_members, resolve_departments
+from roster import TRAIT_MASK, pack_bits
+
+INDEX_DIR_ENV = "DEPT_INDEX_DIR"
+DEFAULT_INDEX_DIR = ".cache/dept_index"
+INDEX_MAX_ITEMS = 4
+INDEX_MAX_BYTES = 256 * 1024**2
+# 形式を変えたら上げる（古いキャッシュを使わない）
+INDEX_VERSION = 1
+
+_cache = None
+
+
+def index_cache():
+    """プロセス内で共有するインデックスのキャッシュ（初回に作る）"""
+    global _cache
+    if _cache is None:
+        directory = os.environ.get(INDEX_DIR_ENV) or None
+        try:
+            _cache = ResultCache(directory, max_items=INDEX_MAX_ITEMS, max_bytes=INDEX_MAX_BYTES)
+        except OSError:  # 書き込めない・同名のファイルがあるなど。メモリだけに持つ
+            _cache = ResultCache(None, max_items=INDEX_MAX_ITEMS, max_bytes=INDEX_MAX_BYTES)
+    return _cache
+
+
+class DeptIndex:
+    """既存社員の部署インデックス（作ったあとは変更しない）"""
+
+    def __init__(self, group_ids, names, codes, dept, leader, order, starts, leader_hist, member_hist):
+        self.group_ids = group_ids
+        self.names = names
+        self.codes = codes
+        self.dept = dept
+        self.leader = leader
+        self.order = order
+        self.starts = starts
+        self.leader_hist = leader_hist
+        self.member_hist = member_hist
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def build(cls, group_ids, names, codes, dept, leader):
+        """
+        行ごとの値から作る。dept は部署インデックス（group_ids の位置）、leader は bool。
+        """
+        group_ids = np.asarray(group_ids)
+        codes = np.asarray(codes, dtype=np.uint8)
+        dept = np.asarray(dept, dtype=np.int32)
+        leader = np.asarray(leader, dtype=bool)
+        order = np.argsort(dept, kind="stable")
+        starts = np.searchsorted(dept[order], np.arange(len(group_ids) + 1))
+        leader_hist = _histogram(dept[leader], codes[leader], len(group_ids))
+        member_hist = _histogram(dept[~leader], codes[~leader], len(group_ids))
+        return cls(group_ids, list(names), codes, dept, leader, order, starts, leader_hist, member_hist)
+
+    @classmethod
+    def from_frame(cls, member_df, group_ids):
+        """ingest.load_members の戻り値（部署列は部署ID）から作る"""
+        return cls.build(group_ids, *_rows(member_df, group_ids))
+
+    @classmethod
+    def from_roster(cls, member_roster, group_df):
+        """パック形式の既存社員の名簿から作る（部署ID は検証する）"""
+        return cls.build(group_df.iloc[:, 0].to_numpy(), *_roster_rows(member_roster, group_df))
+
+    def stats(self):
+        """
+        部署ごとの性格パターン人数（quantum.personality_score に渡す形）
+            leader[g, p] : 性格パターンが p のリーダー人数
+            member[g, p] : 性格パターンが p のメンバー人数
+        """
+        return {"leader": self.leader_hist, "member": self.member_hist}
+
+    def rows(self, g):
+        """部署 g の既存社員の行番号"""
+        return self.order[self.starts[g]:self.starts[g + 1]]
+
+    def sizes(self):
+        """部署ごとの既存社員数"""
+        return np.diff(self.starts)
+
+    def leaders(self):
+        """部署ごとのリーダー数"""
+        return self.leader_hist.sum(axis=1)
+
+    def patch(self, names, codes, dept, leader):
+        """
+        行ごとの値が変わった新しいインデックスと、集計が変わった部署のインデックスを返す。
+        行数が同じなら変わった行の分だけ集計を足し引きし、所属が変わらなければ行の並びも使い回す。
+        行数が違えば作り直す。
+        """
+        codes = np.asarray(codes, dtype=np.uint8)
+        dept = np.asarray(dept, dtype=np.int32)
+        leader = np.asarray(leader, dtype=bool)
+        if len(codes) != len(self.codes):
+            new = DeptIndex.build(self.group_ids, names, codes, dept, leader)
+            return new, _changed_groups(self, new)
+
+        changed = np.flatnonzero(((codes ^ self.codes) & TRAIT_MASK != 0)
+                                 | (dept != self.dept) | (leader != self.leader))
+        leader_hist, member_hist = self.leader_hist.copy(), self.member_hist.copy()
+        for hist, old_sel, new_sel in ((leader_hist, self.leader[changed], leader[changed]),
+                                       (member_hist, ~self.leader[changed], ~leader[changed])):
+            old_rows, new_rows = changed[old_sel], changed[new_sel]
+            np.subtract.at(hist, (self.dept[old_rows], self.codes[old_rows] & TRAIT_MASK), 1)
+            np.add.at(hist, (dept[new_rows], codes[new_rows] & TRAIT_MASK), 1)
+        if (dept[changed] != self.dept[changed]).any():
+            order = np.argsort(dept, kind="stable")
+            starts = np.searchsorted(dept[order], np.arange(len(self.group_ids) + 1))
+        else:
+            order, starts = self.order, self.starts
+        new = DeptIndex(self.group_ids, list(names), codes, dept, leader, order, starts, leader_hist, member_hist)
+        return new, _changed_groups(self, new)
+
+
+def _histogram(dept, codes, n_groups):
+    n_patterns = TRAIT_MASK + 1
+    patterns = codes.astype(np.int64) & TRAIT_MASK
+    hist = np.bincount(dept.astype(np.int64) * n_patterns + patterns, minlength=n_groups * n_patterns)
+    return hist.reshape(n_groups, n_patterns)
+
+
+def _changed_groups(old, new):
+    return np.flatnonzero((old.leader_hist != new.leader_hist).any(axis=1)
+                          | (old.member_hist != new.member_hist).any(axis=1))
+
+
+def _rows(member_df, group_ids):
+    """member_df から (名前, パック済みビット, 部署インデックス, リーダーか)"""
+    return (
+        member_df.iloc[:, 1].tolist(),
+        pack_bits(member_df.iloc[:, 4:9].to_numpy(), member_df.iloc[:, 9:12].to_numpy()),
+        pd.Index(group_ids).get_indexer(member_df.iloc[:, 2].to_numpy()),
+        member_df.iloc[:, 3].to_numpy() == 1,
+    )
+
+
+def _roster_rows(member_roster, group_df):
+    """パック形式の名簿から (名前, パック済みビット, 部署インデックス, リーダーか)"""
+    member_roster.expect("member")
+    records = member_roster.records
+    group_ids = group_df.iloc[:, 0].to_numpy()
+    dept = resolve_departments(np.asarray(records["dept"], dtype=np.int64), group_ids,
+                               group_df.iloc[:, 1].tolist(), roster.LABELS["member"], member_roster.columns[2])
+    return (
+        member_roster.names,
+        np.array(records["bits"], dtype=np.uint8),
+        pd.Index(group_ids).get_indexer(dept),
+        np.asarray(records["leader"]) == 1,
+    )
+
+
+def index_key(member_source, group_df):
+    """
+    既存社員の入力の内容と部署ID・部署名からキャッシュキーを作る。
+    ハッシュを取れない入力なら None。
+    """
+    if isinstance(member_source, pd.DataFrame) or hasattr(member_source, "to_pandas"):
+        data = frame_bytes(member_source)
+    elif isinstance(member_source, roster.Roster):
+        data = member_source.digest()
+    elif isinstance(member_source, (str, os.PathLike)) or hasattr(member_source, "read") \
+            or hasattr(member_source, "getvalue"):
+        data = file_bytes(member_source)
+    else:
+        return None
+    h = hashlib.sha256()
+    h.update(f"dept_index/{INDEX_VERSION}".encode("utf-8"))
+    h.update(np.ascontiguousarray(group_df.iloc[:, 0].to_numpy(dtype=np.int64)).tobytes())
+    h.update(json.dumps(group_df.iloc[:, 1].astype(str).tolist(), ensure_ascii=False).encode("utf-8"))
+    h.update(data)
+    return h.hexdigest()
+
+
+def load_index(member_source, group_df, base=None, cache=True):
+    """
+    既存社員の入力の部署インデックスを返す。戻り値は (DeptIndex, 取得元)。
+    取得元は "memory" / "disk"（キャッシュ。既存社員の入力は読まない）、
+    "patched"（base を差分で更新）、"built"（作り直し）。
+    パック形式の名簿は roster.Roster（ディレクトリなら roster.open_source で開いたもの）で渡す。
+    入力に問題があれば ingest.InputError を送出する。
+    """
+    group_ids = group_df.iloc[:, 0].to_numpy()
+    key = index_key(member_source, group_df) if cache else None
+    if key is not None:
+        try:
+            found = index_cache().get(key)
+        except OSError:  # ディスク層が読めない。作り直す
+            found = None
+        if found is not None:
+            index, _, source = found
+            return index, source
+
+    if isinstance(member_source, roster.Roster):
+        rows = _roster_rows(member_source, group_df)
+    else:
+        rows = _rows(load_members(member_source, group_df), group_ids)
+    if base is not None and np.array_equal(base.group_ids, group_ids):
+        index, _ = base.patch(*rows)
+        source = "patched"
+    else:
+        index = DeptIndex.build(group_ids, *rows)
+        source = "built"
+    if key is not None:
+        try:
+            index_cache().put(key, index, 0.0)
+        except OSError:  # 並行して同じキーを書いた場合など。キャッシュに残らないだけ
+            pass
+    return index, source
@@ -0,0 +1,324 @@
+# incremental.py
+#
+# 少数行の編集後の差分再最適化
+#   前回の実行（入力・成分ごとのスコア・割り当て）を保持しておき、新しい入力との差分から
+#     - 変更・追加された新卒の行だけを再計算
+#     - 既存社員の編集や部署の編集で集計が変わった部署の列だけを再計算
+#   したうえで、変更された新卒と「影響を受けた部署」に今いる新卒だけを解き直す。
+#   それ以外の新卒の割り当ては前回のまま固定する。
+#
+# 重み・相性モード・ソルバー設定・部署の構成が変わった場合や、変更が大きい場合、
+# 新卒同士の相性（quantum.hire_pairs）を使う場合は全体を解き直す。
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+import quantum
+from profiling import StageProfiler
+
+# 解き直す新卒がこの割合を超えたら全体を解き直す
+MAX_FREE_FRACTION = 0.5
+
+# 変更された新卒について、希望部署に加えてスコア上位何部署を「影響を受けた部署」に含めるか
+NEIGHBOR_TOP = 3
+
+
+class IncrementalOptimizer:
+    """
+    quantum.optimize と同じ引数・戻り値で、前回の実行との差分だけを解き直す。
+    assign_df.attrs["incremental"] に、差分で解いたか（mode）と規模を記録する。
+    """
+
+    def __init__(self, max_free_fraction=MAX_FREE_FRACTION):
+        self.max_free_fraction = max_free_fraction
+        self._state = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._state = None
+
+    def run(
+        self,
+        token,
+        group_file,
+        member_file,
+        employee_file,
+        well_suited_leader,
+        well_suited_member,
+        weight_char,
+        weight_skill,
+        weight_pref,
+        solver="fixstars",
+        timeout=1000,
+        num_reads=1,
+        seed=None,
+        compare_exact=False,
+        top_k=None,
+        decompose=None,
+        pair_k=None,
+        pair_threshold=None,
+        figure=True,
+        progress=None,
+        profile=False,
+    ):
+        profiler = StageProfiler(memory=profile != "time") if profile else None
+
+        def stage(name):
+            if progress is not None:
+                progress(name)
+            if profiler is not None:
+                profiler.stage(name)
+
+        # ソルバー関数はラップされて毎回別オブジェクトになるので名前で比べる
+        solver_name = solver if isinstance(solver, str) else getattr(solver, "__name__", repr(solver))
+        settings = {
+            "modes": (well_suited_leader, well_suited_member),
+            "weights": (weight_char, weight_skill, weight_pref),
+            "solver": solver_name, "timeout": timeout, "num_reads": num_reads,
+            "seed": seed, "top_k": top_k, "decompose": decompose,
+            "pairs": (pair_k, pair_threshold),
+        }
+        solve_options = dict(solver=solver, token=token, timeout=timeout,
+                             num_reads=num_reads, seed=seed, top_k=top_k)
+        try:
+            with self._lock:
+                stage("load")
+                # 既存社員が少しだけ変わったときは前回の部署インデックスを差分で更新する
+                base_index = None if self._state is None else self._state["inputs"]["dept_index"]
+                inputs = quantum.read_inputs(group_file, member_file, employee_file, base_index=base_index)
+                if profiler is not None:
+                    profiler.record(dept_index=inputs["index_source"])
+                state, info = self._step(inputs, settings, solve_options, stage, profiler)
+                sol = np.zeros(state["components"]["pref"].shape, dtype=int)
+                sol[np.arange(len(sol)), state["assign"]] = 1
+                result = quantum.build_report(
+                    inputs, sol, state["base_score"],
+                    exact=solver == "exact" and info["mode"] == "full" and "decomposition" not in info,
+                    compare_exact=compare_exact, stage=stage, profiler=profiler, figure=figure,
+                )
+                self._state = state
+        finally:
+            if profiler is not None:
+                profiler.finish()
+        if "decomposition" in info:
+            result[0].attrs["decomposition"] = info.pop("decomposition")
+        result[0].attrs["incremental"] = info
+        if "pairs" in state:
+            pairs = state["pairs"]
+            result[0].attrs.update(hire_pairs=len(pairs[0]), pair_objective=quantum.pair_value(state["assign"], pairs))
+        if profiler is not None:
+            result[0].attrs["profile"] = profiler.to_dict()
+        return result
+
+    # ── 内部処理 ──
+
+    def _step(self, inputs, settings, solve_options, stage, profiler):
+        """前回の状態と比較して、差分または全体で解いた新しい状態を返す"""
+        prev = self._state
+        reason = _full_reason(prev, inputs, settings)
+        if reason is None:
+            stage("score")
+            diff = _diff(prev, inputs)
+            components, stats = _rescore(prev, inputs, settings, diff)
+            base_score = quantum.combine_scores(components, *settings["weights"])
+            free, cols = _neighbourhood(prev, inputs, diff, base_score)
+            if len(free) > self.max_free_fraction * len(base_score):
+                reason = f"変更が大きい（解き直す新卒 {len(free)} 人）"
+        if reason is not None:
+            return self._full(inputs, settings, solve_options, stage, profiler, reason)
+
+        if profiler is not None:
+            profiler.record(changed_hires=len(diff["changed_hires"]), free_hires=len(free),
+                            free_groups=len(cols))
+        assign = diff["carried"].copy()
+        if len(free):
+            assign[free] = _solve_part(inputs, base_score, assign, free, cols,
+                                       settings, solve_options, stage, profiler)
+        state = {"inputs": inputs, "settings": settings, "components": components,
+                 "stats": stats, "base_score": base_score, "assign": assign}
+        info = {"mode": "incremental", "changed_hires": len(diff["changed_hires"]),
+                "removed_hires": diff["removed"], "changed_groups": len(diff["changed_groups"]),
+                "free_hires": len(free), "free_groups": len(cols)}
+        return state, info
+
+    def _full(self, inputs, settings, solve_options, stage, profiler, reason):
+        """全体を解き直す（初回・設定変更時など。分割求解の指定はここだけで使う）"""
+        stage("score")
+        weight_char, weight_skill, weight_pref = settings["weights"]
+        traits = weight_char > 0 or weight_skill > 0
+        components = quantum.score_components(inputs, *settings["modes"], traits=traits)
+        stats = _member_stats(inputs) if traits else None
+        base_score = quantum.combine_scores(components, *settings["weights"])
+        pairs = quantum.weighted_pairs(inputs, settings["modes"][1], weight_char, *settings["pairs"],
+                                       seed=settings["seed"])
+        details = {}
+        sol = quantum.solve_assignment(
+            base_score, inputs["capacity"], None,
+            prefs_raw=inputs["prefs_raw"], group_ids=inputs["group_ids"],
+            stage=stage, profiler=profiler, decompose=settings["decompose"], details=details,
+            pairs=pairs, **solve_options,
+        )
+        state = {"inputs": inputs, "settings": settings, "components": components,
+                 "stats": stats, "base_score": base_score, "assign": sol.argmax(axis=1)}
+        if pairs is not None:
+            state["pairs"] = pairs
+        return state, {"mode": "full", "reason": reason, **details}
+
+
+def _member_stats(inputs):
+    return inputs["dept_index"].stats()
+
+
+def _full_reason(prev, inputs, settings):
+    """差分で解けない理由（差分で解けるなら None）"""
+    if prev is None:
+        return "初回"
+    if prev["settings"] != settings:
+        return "設定の変更"
+    if "pairs" in prev:
+        return "新卒同士の相性を使う設定（差分では解き直さない）"
+    old = prev["inputs"]
+    if not np.array_equal(old["group_ids"], inputs["group_ids"]) or old["group_names"] != inputs["group_names"]:
+        return "部署の追加・削除・名称変更"
+    if not pd.Index(inputs["new_ids"]).is_unique or not pd.Index(old["new_ids"]).is_unique:
+        return "新卒の社員番号の重複"
+    return None
+
+
+def _diff(prev, inputs):
+    """
+    前回との差分。
+        changed_hires  : 追加または内容が変わった新卒（新しい行番号）
+        kept_rows      : 変わっていない新卒の (新しい行番号, 前回の行番号)
+        carried        : 前回の割り当てを引き継いだ部署インデックス（変更された新卒は -1）
+        changed_groups : 定員・必要スキルが変わった部署
+        vacated        : 削除・変更された新卒が前回いた部署
+        removed        : 削除された新卒の人数
+    """
+    old = prev["inputs"]
+    old_rows = pd.Index(old["new_ids"]).get_indexer(inputs["new_ids"])
+    old_emp = old["employee_df"].to_numpy()
+    new_emp = inputs["employee_df"].to_numpy()
+    has_old = old_rows >= 0
+    same = np.zeros(len(new_emp), dtype=bool)
+    same[has_old] = (old_emp[old_rows[has_old]] == new_emp[has_old]).all(axis=1)
+
+    changed_hires = np.flatnonzero(~same)
+    kept_new, kept_old = np.flatnonzero(same), old_rows[same]
+    carried = np.full(len(new_emp), -1)
+    carried[kept_new] = prev["assign"][kept_old]
+
+    # 削除・変更された新卒がいた部署は席が空く
+    gone = np.ones(len(old_emp), dtype=bool)
+    gone[kept_old] = False
+    vacated = np.unique(prev["assign"][gone])
+
+    group_changed = (old["capacity"] != inputs["capacity"]) | (old["group_skill"] != inputs["group_skill"]).any(axis=1)
+    return {
+        "changed_hires": changed_hires,
+        "kept_rows": (kept_new, kept_old),
+        "carried": carried,
+        "changed_groups": np.flatnonzero(group_changed),
+        "skill_changed": np.flatnonzero((old["group_skill"] != inputs["group_skill"]).any(axis=1)),
+        "vacated": vacated,
+        "removed": int((~pd.Index(old["new_ids"]).isin(inputs["new_ids"])).sum()),
+    }
+
+
+def _rescore(prev, inputs, settings, diff):
+    """変わっていない行・列は前回の値を使い、変わった所だけスコアを計算し直す"""
+    old = prev["components"]
+    n_new, n_groups = len(inputs["new_ids"]), len(inputs["group_ids"])
+    kept_new, kept_old = diff["kept_rows"]
+    rows = diff["changed_hires"]
+    weight_char, weight_skill, _ = settings["weights"]
+    traits = weight_char > 0 or weight_skill > 0
+
+    components = {}
+    for key in ("personality", "skill", "pref"):
+        comp = np.zeros((n_new, n_groups), dtype=old[key].dtype)
+        comp[kept_new] = old[key][kept_old]
+        components[key] = comp
+    components["pref"][rows] = quantum.pref_score(np.asarray(inputs["prefs_raw"])[rows], inputs["group_ids"])
+    if not traits:
+        return components, None
+
+    # 既存社員の集計が変わった部署（編集された社員の前後の所属部署）
+    stats = _member_stats(inputs)
+    stats_changed = np.flatnonzero(
+        (stats["leader"] != prev["stats"]["leader"]).any(axis=1)
+        | (stats["member"] != prev["stats"]["member"]).any(axis=1)
+    )
+    new_codes = inputs["new_codes"]
+    if len(stats_changed):
+        sub = {k: v[stats_changed] for k, v in stats.items()}
+        components["personality"][:, stats_changed] = quantum.personality_score(sub, new_codes, *settings["modes"])
+    if len(diff["skill_changed"]):
+        cols = diff["skill_changed"]
+        components["skill"][:, cols] = quantum.skill_score(new_codes, inputs["group_skill"][cols])
+    if len(rows):
+        components["personality"][rows] = quantum.personality_score(stats, new_codes[rows], *settings["modes"])
+        components["skill"][rows] = quantum.skill_score(new_codes[rows], inputs["group_skill"])
+    diff["stats_changed"] = stats_changed
+    return components, stats
+
+
+def _neighbourhood(prev, inputs, diff, base_score):
+    """
+    解き直す新卒 free と、候補にする部署 cols を決める。
+    影響を受けた部署 = 部署自体の変更・既存社員の集計の変更・席が空いた部署、
+    および変更された新卒の希望部署とスコア上位部署。そこにいる新卒はすべて解き直す。
+    候補部署は影響を受けた部署に加え、固定した新卒を除いて空きのある部署。
+    """
+    rows = diff["changed_hires"]
+    n_groups = base_score.shape[1]
+    touched = np.zeros(n_groups, dtype=bool)
+    touched[diff["changed_groups"]] = True
+    touched[diff.get("stats_changed", [])] = True
+    touched[diff["vacated"]] = True
+    if len(rows):
+        pref_cols = np.flatnonzero(quantum.pref_score(np.asarray(inputs["prefs_raw"])[rows],
+                                                      inputs["group_ids"]).any(axis=0))
+        touched[pref_cols] = True
+        k = min(NEIGHBOR_TOP, n_groups)
+        top = np.argpartition(-base_score[rows], k - 1, axis=1)[:, :k]
+        touched[top.ravel()] = True
+
+    carried = diff["carried"]
+    free = np.flatnonzero((carried < 0) | touched[np.maximum(carried, 0)])
+    fixed = np.setdiff1d(np.arange(len(carried)), free)
+    load = np.bincount(carried[fixed], minlength=n_groups)
+    spare = inputs["capacity"] - load
+    cols = np.flatnonzero(touched | (spare > 0))
+    return free, cols
+
+
+def _solve_part(inputs, base_score, assign, free, cols, settings, solve_options, stage, profiler):
+    """free の新卒を cols の部署（固定した新卒の分を引いた定員）に割り当て直す"""
+    n_groups = base_score.shape[1]
+    fixed = np.setdiff1d(np.arange(len(assign)), free)
+    load = np.bincount(assign[fixed], minlength=n_groups)
+    sub_capacity = (inputs["capacity"] - load)[cols]
+    if sub_capacity.sum() < len(free):
+        raise RuntimeError("制約を満たす割り当てが見つかりませんでした")
+
+    sub_score = base_score[np.ix_(free, cols)]
+    sub_prefs = np.asarray(inputs["prefs_raw"])[free].tolist()
+    sub_sol = quantum.solve_assignment(
+        sub_score, sub_capacity, None,
+        prefs_raw=sub_prefs, group_ids=inputs["group_ids"][cols],
+        stage=stage, profiler=profiler, **solve_options,
+    )
+    chosen = cols[sub_sol.argmax(axis=1)]
+
+    # 前回の割り当てがそのまま使えるなら比較してよい方を採る
+    prior = assign[free]
+    if (prior >= 0).all() and np.isin(prior, cols).all():
+        prior_load = np.bincount(prior, minlength=n_groups)[cols]
+        if (prior_load <= sub_capacity).all() and \
+                base_score[free, prior].sum() > base_score[free, chosen].sum():
+            return prior
+    return chosen
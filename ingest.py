@@ -0,0 +1,186 @@
+# ingest.py
+#
+# 入力データの読み込みと検証
+#   CSV（パス・アップロードファイル・バイト列/テキストのストリーム）、pandas DataFrame、
+#   Arrow テーブルのどれでも受け付け、列の役割と型を固定した DataFrame にそろえる。
+#   パック形式の名簿（roster.py）は quantum.read_inputs・dept_index がビットのまま読む。
+#   列は位置で解釈する（列名はファイルのものをそのまま残す）。
+#
+# 部署ID の参照（既存社員の所属・新卒の希望）と定員の合計は読み込み時に検証し、
+# 問題があれば InputError を送出する。
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# (列の役割, 種類) を列の位置順に並べたもの
+#   id   : 整数（int64）
+#   count: 0 以上の整数（int64）
+#   bit  : 0/1（int8）
+#   text : 文字列（欠損不可）
+#   dept : 部署ID または部署名（部署ID に解決して int64）
+GROUP_SCHEMA = (
+    ("部署ID", "id"), ("部署", "text"),
+    ("スキル１", "bit"), ("スキル２", "bit"), ("スキル３", "bit"),
+    ("定員人数", "count"),
+)
+MEMBER_SCHEMA = (
+    ("社員番号", "id"), ("名前", "text"), ("部署", "dept"), ("リーダー", "bit"),
+    ("開放性", "bit"), ("誠実性", "bit"), ("外向性", "bit"), ("協調性", "bit"), ("神経症傾向", "bit"),
+    ("スキル１", "bit"), ("スキル２", "bit"), ("スキル３", "bit"),
+)
+EMPLOYEE_SCHEMA = (
+    ("社員番号", "id"), ("名前", "text"),
+    ("開放性", "bit"), ("誠実性", "bit"), ("外向性", "bit"), ("協調性", "bit"), ("神経症傾向", "bit"),
+    ("スキル１", "bit"), ("スキル２", "bit"), ("スキル３", "bit"),
+    ("第一希望", "id"), ("第二希望", "id"), ("第三希望", "id"),
+)
+
+DTYPES = {"id": "int64", "count": "int64", "bit": "int8", "dept": "int64"}
+
+# エラーメッセージに列挙する件数の上限
+MAX_REPORTED = 5
+
+
+class InputError(ValueError):
+    """入力データの形式・内容が不正"""
+
+
+def _listing(values):
+    values = list(values)
+    text = ", ".join(str(v) for v in values[:MAX_REPORTED])
+    if len(values) > MAX_REPORTED:
+        text += f" ほか {len(values) - MAX_REPORTED} 件"
+    return text
+
+
+def read_table(source):
+    """CSV / DataFrame / Arrow テーブルを DataFrame にする（CSV は pyarrow エンジンで読む）"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    if hasattr(source, "to_pandas"):  # pyarrow.Table / RecordBatch
+        return source.to_pandas()
+    if isinstance(source, (str, os.PathLike)) or hasattr(source, "read"):
+        return pd.read_csv(source, engine="pyarrow")
+    raise TypeError(f"読み込めない入力です: {type(source).__name__}")
+
+
+def conform(df, schema, label):
+    """
+    スキーマの列数・型にそろえた新しい DataFrame を返す（余分な列は落とす）。
+    dept 列はここでは検証せず、そのまま残す。
+    """
+    if df.shape[1] < len(schema):
+        raise InputError(
+            f"{label} の列が足りません（{len(schema)} 列必要ですが {df.shape[1]} 列です。"
+            f"列の並び: {'、'.join(role for role, _ in schema)}）"
+        )
+    columns = df.columns[:len(schema)]
+    out = {}
+    for (role, kind), col in zip(schema, columns):
+        s = df[col].reset_index(drop=True)
+        if kind == "dept":
+            out[col] = s
+            continue
+        if kind == "text":
+            bad = s.isna()
+            if bad.any():
+                raise InputError(f"{label} の列「{col}」に空欄があります（データ行 {_listing(np.flatnonzero(bad) + 1)}）")
+            out[col] = s
+            continue
+
+        v = pd.to_numeric(s, errors="coerce")
+        bad = v.isna() | (v % 1 != 0)
+        if kind == "bit":
+            bad |= ~v.isin([0, 1])
+            expected = "0 または 1"
+        elif kind == "count":
+            bad |= v < 0
+            expected = "0 以上の整数"
+        else:
+            expected = "整数"
+        if bad.any():
+            rows = np.flatnonzero(bad)
+            raise InputError(
+                f"{label} の列「{col}」は {expected} で入力してください"
+                f"（データ行 {_listing(rows + 1)}: {_listing(s.iloc[rows[:MAX_REPORTED]].tolist())}）"
+            )
+        out[col] = v.astype(DTYPES[kind])
+    return pd.DataFrame(out, columns=columns)
+
+
+def resolve_departments(values, group_ids, group_names, label, col):
+    """部署ID または部署名の列を部署ID（int64 配列）に解決する"""
+    values = pd.Series(values)
+    as_id = pd.to_numeric(values, errors="coerce")
+    if as_id.notna().all() and (as_id % 1 == 0).all():
+        ids = as_id.astype("int64").to_numpy()
+    else:
+        # 部署名で書かれている場合（部署名が重複していると決められない）
+        names = pd.Index(group_names)
+        if names.has_duplicates:
+            raise InputError(f"{label} の列「{col}」を部署名で解決できません（部署名が重複しています）")
+        pos = names.get_indexer(values.astype(str))
+        ids = np.where(pos >= 0, np.asarray(group_ids)[pos], -1)
+        missing = pos < 0
+        if missing.any():
+            raise InputError(f"{label} の列「{col}」に存在しない部署があります: {_listing(values[missing].unique())}")
+        return ids
+    unknown = ~np.isin(ids, group_ids)
+    if unknown.any():
+        raise InputError(f"{label} の列「{col}」に存在しない部署ID があります: {_listing(np.unique(ids[unknown]))}")
+    return ids
+
+
+def load_groups(group_source):
+    """部署の入力を読み込んで検証した group_df を返す"""
+    group_df = conform(read_table(group_source), GROUP_SCHEMA, "部署CSV")
+    if len(group_df) == 0:
+        raise InputError("部署CSV に部署がありません")
+    group_ids = group_df.iloc[:, 0].to_numpy()
+    dup = pd.Index(group_ids)[pd.Index(group_ids).duplicated()]
+    if len(dup):
+        raise InputError(f"部署CSV の部署ID が重複しています: {_listing(dup.unique())}")
+    return group_df
+
+
+def load_members(member_source, group_df):
+    """既存社員の入力を読み込んで検証した member_df を返す（部署列は部署ID（int64）に解決される）"""
+    member_df = conform(read_table(member_source), MEMBER_SCHEMA, "既存社員CSV")
+    # 既存社員の所属（部署ID または部署名）
+    dept_col = member_df.columns[2]
+    member_df[dept_col] = resolve_departments(member_df[dept_col], group_df.iloc[:, 0].to_numpy(),
+                                              group_df.iloc[:, 1].tolist(), "既存社員CSV", dept_col)
+    return member_df
+
+
+def load_employees(employee_source, group_df):
+    """新卒社員の入力を読み込み、希望部署と定員の合計を検証した employee_df を返す"""
+    employee_df = conform(read_table(employee_source), EMPLOYEE_SCHEMA, "新卒社員CSV")
+    group_ids = group_df.iloc[:, 0].to_numpy()
+
+    # 新卒の希望部署
+    for col in employee_df.columns[10:13]:
+        unknown = ~employee_df[col].isin(group_ids)
+        if unknown.any():
+            who = [f"社員番号 {e}（{p}）" for e, p in
+                   zip(employee_df.loc[unknown, employee_df.columns[0]], employee_df.loc[unknown, col])]
+            raise InputError(f"新卒社員CSV の列「{col}」に存在しない部署ID があります: {_listing(who)}")
+
+    # 定員
+    capacity = group_df.iloc[:, 5].to_numpy()
+    if capacity.sum() < len(employee_df):
+        raise InputError(
+            f"定員の合計 ({capacity.sum()}) が新卒数 ({len(employee_df)}) より少ないため、全員を割り当てられません"
+        )
+    return employee_df
+
+
+def load_inputs(group_source, member_source, employee_source):
+    """
+    3 つの入力を読み込み、検証済みの (group_df, member_df, employee_df) を返す。
+    既存社員の部署列は部署ID（int64）に解決される。
+    """
+    group_df = load_groups(group_source)
+    return group_df, load_members(member_source, group_df), load_employees(employee_source, group_df)
@@ -0,0 +1,137 @@
+# jobs.py
+#
+# 最適化のバックグラウンド実行
+#   submit でジョブ ID を受け取り、status をポーリングして進捗・結果を得る。
+#   ワーカー数（同時に動くジョブ）とソルバー呼び出しの同時実行数はそれぞれ上限を設定できる。
+
+import functools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from quantum import STAGES
+from solvers import get_solver
+
+
+class JobCancelled(Exception):
+    """ジョブがキャンセルされた"""
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.state = "queued"   # queued / running / done / failed / cancelled
+        self.stage = None
+        self.submitted = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+
+class JobManager:
+    """
+    スレッドプールでジョブを実行する。
+        max_workers : 同時に実行するジョブ数
+        max_solves  : 同時に実行するソルバー呼び出し数（リモートソルバーの同時接続数の制限など）
+        keep        : 保持する終了済みジョブ数
+    """
+
+    def __init__(self, max_workers=4, max_solves=2, keep=100):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="optimize")
+        self._solve_slots = threading.BoundedSemaphore(max_solves)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.keep = keep
+
+    def limit_solver(self, solver):
+        """ソルバー関数を、同時実行数の上限を守るようにラップする"""
+        solve_fn = get_solver(solver)
+
+        @functools.wraps(solve_fn)
+        def limited(*args, **kwargs):
+            with self._solve_slots:
+                return solve_fn(*args, **kwargs)
+
+        return limited
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        fn(*args, progress=..., **kwargs) をバックグラウンドで実行し、ジョブ ID を返す。
+        fn は段階ごとに progress(stage) を呼ぶこと（キャンセル時はそこで JobCancelled が送出される）。
+        """
+        job = Job(uuid.uuid4().hex)
+
+        def progress(stage):
+            if job.cancel_event.is_set():
+                raise JobCancelled(job.id)
+            job.stage = stage
+
+        def run():
+            if job.cancel_event.is_set():
+                job.state = "cancelled"
+                job.finished = time.time()
+                return
+            job.state = "running"
+            try:
+                job.result = fn(*args, progress=progress, **kwargs)
+                job.state = "done"
+            except JobCancelled:
+                job.state = "cancelled"
+            except Exception as e:
+                job.error = e
+                job.state = "failed"
+            finally:
+                job.finished = time.time()
+
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(run)
+        return job.id
+
+    def status(self, job_id):
+        """ジョブの状態のスナップショット（存在しなければ None）"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        done = STAGES.index(job.stage) if job.stage in STAGES else 0
+        if job.state == "done":
+            done = len(STAGES)
+        return {
+            "id": job.id,
+            "state": job.state,
+            "stage": job.stage,
+            "progress": done / len(STAGES),
+            "elapsed": (job.finished or time.time()) - job.submitted,
+            "result": job.result,
+            "error": job.error,
+        }
+
+    def cancel(self, job_id):
+        """
+        キャンセルを要求する。待機中ならすぐに取り消し、
+        実行中なら次の段階の区切りで中断する。
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.state in ("done", "failed", "cancelled"):
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.state = "cancelled"
+            job.finished = time.time()
+        return True
+
+    def _prune(self):
+        """古い終了済みジョブを捨てる"""
+        finished = sorted(
+            (j for j in self._jobs.values() if j.finished is not None),
+            key=lambda j: j.finished,
+        )
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[job.id]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
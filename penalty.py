@@ -0,0 +1,130 @@
+# penalty.py
+#
+# 制約ペナルティの自動決定と実行可能化
+#   1. 決定：各新卒のスコアを中心（最大と最小の中点）からの差に直すと、
+#      1 人が制約を 1 つ破って得をする量は「その新卒のスコアの幅」以下になる。
+#      ペナルティはその最大値に余裕を掛けた値とする（入力だけで決まるので同じ入力なら同じ値）。
+#   2. 修復：ソルバーのサンプル（新卒 × 部署 の 0/1 行列を重ねたもの）を、
+#      全サンプル同時の配列演算で「各新卒ちょうど 1 部署・定員以内」の割り当てに直す。
+
+import numpy as np
+
+# ペナルティ = スコアの幅の最大値 × PENALTY_MARGIN
+PENALTY_MARGIN = 1.5
+# 修復後に空きのある部署へ移す改善のラウンド数の上限
+MAX_IMPROVE_ROUNDS = 10
+
+
+def center_scores(base_score):
+    """
+    各新卒のスコアから最大と最小の中点を引く。
+    どの実行可能解でも目的関数が定数だけずれるので最適解は変わらない。
+    """
+    base_score = np.asarray(base_score, dtype=float)
+    if base_score.size == 0:
+        return base_score
+    return base_score - (base_score.max(axis=1) + base_score.min(axis=1))[:, None] / 2
+
+
+def calibrate_penalty(base_score, margin=PENALTY_MARGIN):
+    """
+    中心化したスコア（center_scores）に対する制約ペナルティ。
+    2 つ目の部署に入る・どこにも入らない・満員の部署へ移る、のどれで得られる量も
+    その新卒のスコアの幅以下なので、その最大値 × margin とする（最低 1）。
+    """
+    base_score = np.asarray(base_score, dtype=float)
+    if base_score.size == 0:
+        return 1.0
+    spread = (base_score.max(axis=1) - base_score.min(axis=1)).max()
+    return max(float(spread) * margin, 1.0)
+
+
+def violation_rate(samples, capacity):
+    """
+    サンプル全体で制約を破っている新卒の割合（0〜1）。
+    所属が 1 部署でない新卒と、定員を超えた部署に入っている新卒を数える。
+    """
+    samples = np.asarray(samples) > 0
+    if samples.size == 0:
+        return 0.0
+    over = samples.sum(axis=1) > np.asarray(capacity)
+    bad = (samples.sum(axis=2) != 1) | (samples & over[:, None, :]).any(axis=2)
+    return float(bad.mean())
+
+
+def _rank_within(keys, order):
+    """order で並べた keys の、同じ値の中での順位（0 始まり）"""
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    out = np.empty(len(order), dtype=int)
+    out[order] = rank
+    return out
+
+
+def _accept(sample_idx, group_idx, priority, spare, n_groups):
+    """各 (サンプル, 部署) への希望者を priority の高い順に空き spare の数だけ受け入れる（bool 配列）"""
+    keys = sample_idx * n_groups + group_idx
+    order = np.lexsort((-priority, keys))
+    return _rank_within(keys, order) < spare.ravel()[keys]
+
+
+def repair_samples(samples, base_score, capacity):
+    """
+    サンプルを実行可能な割り当て（部署インデックス、サンプル数 × 新卒）に直す。
+        1. 複数の部署に入っている新卒はその中でスコアが最も高い部署だけに残す
+        2. 定員を超えた部署からはスコアの低い新卒を外す
+        3. 外れた新卒・どこにも入っていない新卒を、空きのある部署のうちスコアの高い部署へ入れる
+           （同じ部署に空きより多く集まったらスコアの高い順に受け入れ、残りは次のラウンドへ）
+        4. 空きのある部署へ移るとスコアが上がる新卒を、上がり幅の大きい順に移す
+    戻り値は (assign, 直したサンプルの bool 配列)。定員の合計が新卒数より少なければ ValueError。
+    """
+    samples = np.asarray(samples) > 0
+    base_score = np.asarray(base_score, dtype=float)
+    capacity = np.asarray(capacity)
+    n_samples, n_new, n_groups = samples.shape
+    if capacity.sum() < n_new:
+        raise ValueError(f"定員の合計 ({capacity.sum()}) が新卒数 ({n_new}) より少ないため割り当てできません")
+
+    # 1. 1 部署に絞る
+    assign = np.where(samples.any(axis=2),
+                      np.where(samples, base_score[None], -np.inf).argmax(axis=2), -1)
+    broken = (samples.sum(axis=2) != 1).any(axis=1)
+
+    # 2. 定員超過の部署から外す
+    s, i = np.nonzero(assign >= 0)
+    g = assign[s, i]
+    keep = _accept(s, g, base_score[i, g], np.broadcast_to(capacity, (n_samples, n_groups)), n_groups)
+    assign[s[~keep], i[~keep]] = -1
+    broken[s[~keep]] = True
+
+    # 3. 空きのある部署へ入れる
+    def spare():
+        load = np.zeros(n_samples * n_groups, dtype=int)
+        s, i = np.nonzero(assign >= 0)
+        np.add.at(load, s * n_groups + assign[s, i], 1)
+        return capacity[None, :] - load.reshape(n_samples, n_groups)
+
+    while True:
+        s, i = np.nonzero(assign < 0)
+        if len(s) == 0:
+            break
+        room = spare()
+        g = np.where(room[s] > 0, base_score[i], -np.inf).argmax(axis=1)
+        ok = _accept(s, g, base_score[i, g], room, n_groups)
+        assign[s[ok], i[ok]] = g[ok]
+
+    # 4. 改善：空きのある部署への移動
+    for _ in range(MAX_IMPROVE_ROUNDS):
+        room = spare()
+        s, i = np.nonzero(np.ones_like(assign, dtype=bool))
+        cand = np.where(room[s] > 0, base_score[i], -np.inf)
+        g = cand.argmax(axis=1)
+        gain = cand[np.arange(len(s)), g] - base_score[i, assign[s, i]]
+        movers = gain > 0
+        if not movers.any():
+            break
+        s, i, g, gain = s[movers], i[movers], g[movers], gain[movers]
+        ok = _accept(s, g, gain, room, n_groups)
+        assign[s[ok], i[ok]] = g[ok]
+    return assign, broken
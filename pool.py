@@ -0,0 +1,117 @@
+# pool.py
+#
+# 解のプール
+#   ソルバーが返した複数のサンプル（新卒 × 部署 の 0/1 行列）をまとめて評価し、
+#   実行可能で互いに十分異なる上位の案を選ぶ。
+#   評価はサンプルを積み重ねた (サンプル数 × 新卒 × 部署) の配列に対する一括計算で行う。
+
+import numpy as np
+import pandas as pd
+
+# 「異なる案」とみなす最小の違い（割り当てが異なる新卒の割合）
+MIN_DIFF_FRACTION = 0.02
+
+RANK_LABELS = ("第一希望", "第二希望", "第三希望")
+
+
+def decode_samples(samples):
+    """
+    各サンプルの部署インデックス（サンプル数 × 新卒）。どの部署にも入っていない新卒は -1。
+    複数の部署に入っている新卒は最初の部署とする。
+    """
+    samples = np.asarray(samples)
+    return np.where(samples.any(axis=2), samples.argmax(axis=2), -1)
+
+
+def evaluate_samples(samples, base_score, capacity, prefs_raw, group_ids, pairs=None):
+    """
+    サンプルごとのスコア合計・希望一致率・制約違反数を 1 つの DataFrame で返す（行 = サンプル）。
+        スコア合計         : Σ base_score（制約違反があってもそのまま合計）
+        新卒同士の相性     : pairs を渡したときのみ
+        第一〜第三希望     : その希望の部署に入った新卒の割合
+        希望一致率         : 第一〜第三希望のいずれかに入った割合
+        所属違反           : 所属する部署が 1 つでない新卒の数
+        定員超過           : 定員を超えた人数の合計
+    """
+    samples = np.asarray(samples, dtype=np.int8)
+    n_samples, n_new, n_groups = samples.shape
+    prefs = np.asarray(prefs_raw).reshape(-1, 3)
+    group_ids = np.asarray(group_ids)
+
+    out = {"スコア合計": np.einsum("sig,ig->s", samples, np.asarray(base_score, dtype=float))}
+    assign = decode_samples(samples)
+    if pairs is not None:
+        i, j, w = pairs
+        same = (assign[:, i] == assign[:, j]) & (assign[:, i] >= 0)
+        out["新卒同士の相性"] = same.astype(float) @ np.asarray(w, dtype=float)
+
+    # 割り当てた部署 ID と希望の比較（未割り当ては一致しない）
+    assigned_id = np.where(assign >= 0, group_ids[np.clip(assign, 0, n_groups - 1)], np.nan)
+    matched = np.zeros((n_samples, n_new), dtype=bool)
+    for rank, label in enumerate(RANK_LABELS):
+        hit = (assigned_id == prefs[:, rank]) & ~matched
+        out[label] = hit.mean(axis=1)
+        matched |= hit
+    out["希望一致率"] = matched.mean(axis=1)
+
+    out["所属違反"] = (samples.sum(axis=2) != 1).sum(axis=1)
+    out["定員超過"] = np.maximum(samples.sum(axis=1) - np.asarray(capacity)[None, :], 0).sum(axis=1)
+    out["実行可能"] = (out["所属違反"] == 0) & (out["定員超過"] == 0)
+    return pd.DataFrame(out)
+
+
+def select_diverse(assign, scores, k, min_diff=None):
+    """
+    実行可能なサンプルをスコア合計（新卒同士の相性があれば加えた値）の高い順に見て、
+    選んだどの案とも min_diff 人以上割り当てが異なるものを k 個まで選び、サンプル番号のリストを返す。
+    min_diff を省くと新卒数の MIN_DIFF_FRACTION（最低 1 人）。
+    """
+    assign = np.asarray(assign)
+    if min_diff is None:
+        min_diff = max(1, int(np.ceil(assign.shape[1] * MIN_DIFF_FRACTION)))
+    total = scores["スコア合計"].to_numpy()
+    if "新卒同士の相性" in scores:
+        total = total + scores["新卒同士の相性"].to_numpy()
+    feasible = np.flatnonzero(scores["実行可能"].to_numpy())
+    order = feasible[np.argsort(-total[feasible], kind="stable")]
+    chosen = []
+    for s in order:
+        if len(chosen) >= k:
+            break
+        if not chosen or (assign[chosen] != assign[s]).sum(axis=1).min() >= min_diff:
+            chosen.append(int(s))
+    return chosen
+
+
+def build_pool(samples, k, base_score, capacity, prefs_raw, group_ids, new_names, group_names,
+               pairs=None, min_diff=None, repaired=None):
+    """
+    サンプルを評価して上位 k 案を選び、(案ごとの評価, 案ごとの割り当て) の DataFrame を返す。
+        評価    : 行 = 案（"案1" から）。evaluate_samples の列に「最良案との違い」（人数）を加える
+        割り当て : 行 = 新卒の名前、列 = 案、値 = 部署名
+    repaired（samples を修復して実行可能にしたもの。同じ形）を渡すと案は修復後のサンプルから選び、
+    所属違反・定員超過は修復前（ソルバーのサンプル）の値にして「修復」（直したか）の列を加える。
+    """
+    if repaired is None:
+        scores = evaluate_samples(samples, base_score, capacity, prefs_raw, group_ids, pairs)
+        assign = decode_samples(samples)
+    else:
+        scores = evaluate_samples(repaired, base_score, capacity, prefs_raw, group_ids, pairs)
+        raw = np.asarray(samples)
+        scores["所属違反"] = (raw.sum(axis=2) != 1).sum(axis=1)
+        scores["定員超過"] = np.maximum(raw.sum(axis=1) - np.asarray(capacity)[None, :], 0).sum(axis=1)
+        scores["修復"] = (scores["所属違反"] > 0) | (scores["定員超過"] > 0)
+        assign = decode_samples(repaired)
+    chosen = select_diverse(assign, scores, k, min_diff)
+    labels = [f"案{n + 1}" for n in range(len(chosen))]
+
+    table = scores.iloc[chosen].reset_index(drop=True)
+    table.index = labels
+    if chosen:
+        table["最良案との違い"] = (assign[chosen] != assign[chosen[0]]).sum(axis=1)
+    names = np.asarray(group_names, dtype=object)
+    assignments = pd.DataFrame(
+        {label: names[assign[s]] for label, s in zip(labels, chosen)},
+        index=pd.Index(new_names, name="名前"),
+    )
+    return table, assignments
@@ -0,0 +1,126 @@
+# profiling.py
+#
+# 最適化の段階ごとの計測（処理時間・ピークメモリ・問題サイズ）
+#   profiler = StageProfiler()
+#   profiler.stage("load"); ...; profiler.record(variables=...); profiler.finish()
+#   profiler.to_dict() / profiler.to_json()
+# 計測しない場合は StageProfiler を作らず None を渡せばよい（呼び出し側で分岐するだけで済む）。
+
+import json
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+# tracemalloc はプロセス全体で 1 つなので、同時に計測しているジョブ数を数えて
+# 最後の 1 つが終わったときだけ止める
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_external = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_external
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_external = tracemalloc.is_tracing()
+            if not _tracing_external:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and not _tracing_external:
+            tracemalloc.stop()
+
+
+class StageProfiler:
+    """
+    段階ごとの壁時計時間とピークメモリ、任意のサイズ情報を記録する。
+        memory : tracemalloc でピークメモリを計測する（Python / NumPy の確保分。
+                 同じプロセスで並行して動くジョブの確保分も含まれる）
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stages = []
+        self._current = None
+        self._start = time.perf_counter()
+        self._finished = None
+        if memory:
+            _start_tracing()
+            self._base = tracemalloc.get_traced_memory()[0]
+
+    def stage(self, name):
+        """前の段階を閉じて、新しい段階の計測を始める"""
+        self._close()
+        if self.memory:
+            tracemalloc.reset_peak()
+        self._current = {"stage": name, "_start": time.perf_counter()}
+
+    def record(self, **sizes):
+        """現在の段階にサイズなどの値を記録する（変数数・制約数・非ゼロ項数など）"""
+        if self._current is not None:
+            self._current.update(sizes)
+
+    def _close(self):
+        entry, self._current = self._current, None
+        if entry is None:
+            return
+        entry["seconds"] = time.perf_counter() - entry.pop("_start")
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            entry["peak_memory_bytes"] = max(peak - self._base, 0)
+            entry["memory_delta_bytes"] = current - self._base
+        self.stages.append(entry)
+
+    def finish(self):
+        """最後の段階を閉じて計測を終える（何度呼んでもよい）"""
+        if self._finished is not None:
+            return
+        self._close()
+        self._finished = time.perf_counter()
+        if self.memory:
+            _stop_tracing()
+
+    def to_dict(self):
+        self.finish()
+        out = {
+            "total_seconds": self._finished - self._start,
+            "stages": [dict(s) for s in self.stages],
+        }
+        if self.memory:
+            out["peak_memory_bytes"] = max((s["peak_memory_bytes"] for s in self.stages), default=0)
+        return out
+
+    def to_json(self, path=None, **kwargs):
+        return profile_json(self.to_dict(), path, **kwargs)
+
+
+def profile_json(profile, path=None, **kwargs):
+    """計測結果（to_dict() の形）を JSON 文字列にする。path を渡すとファイルにも書き出す"""
+    text = json.dumps(profile, ensure_ascii=False, default=_jsonable, **kwargs)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+    return text
+
+
+def _jsonable(value):
+    """NumPy のスカラーなど json が扱えない値を変換"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def profile_frame(profile):
+    """計測結果（to_dict() の形）を段階ごとの表（DataFrame）にする"""
+    df = pd.DataFrame(profile["stages"])
+    for col in ("peak_memory_bytes", "memory_delta_bytes"):
+        if col in df:
+            df[col.replace("_bytes", "_mb")] = df.pop(col) / 1024**2
+    return df.set_index("stage")
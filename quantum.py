@@ -1,19 +1,550 @@
 # quantum.py
+#
+# amplify（QUBO の構築）と plotly（図）は使う関数の中で読み込む。
+# 厳密解・バッチ実行・アプリの起動では読み込まれない。
+
+from collections.abc import Mapping
 
 import pandas as pd
 import numpy as np
-import plotly.express as px
-from amplify import (
-    VariableGenerator,
-    Poly,
-    Model,
-    ConstraintList,
-    equal_to,
-    less_equal,
-    sum as amplify_sum,
-    solve
-)
-from amplify.client import FixstarsClient
+
+from solvers import get_solver, min_cost_assignment
+from decompose import solve_decomposed
+from pool import build_pool, decode_samples
+from penalty import calibrate_penalty, center_scores, repair_samples, violation_rate
+from profiling import StageProfiler
+from ingest import load_employees, load_groups
+from dept_index import load_index
+from roster import POPCOUNT, SKILL_SHIFT, TRAIT_BITS, TRAIT_MASK, Roster, open_source, pack_bits
+
+# 希望順位 → 希望スコア
+PREF = {1: 3, 2: 2, 3: 1}
+
+# どの部署にも入っていない新卒の表示（制約を満たさない解を復号したとき）
+UNASSIGNED = "未割り当て"
+
+# optimize の処理段階（progress コールバックに渡される名前）
+STAGES = ("load", "score", "build", "solve", "decode", "report")
+
+
+# 性格パターン同士の OR / XOR の popcount 表（32×32）
+_PATTERNS = np.arange(TRAIT_MASK + 1)
+PAIR_COUNTS = {
+    "同一性重視": POPCOUNT[_PATTERNS[:, None] | _PATTERNS[None, :]],   # OR
+    "多様性重視": POPCOUNT[_PATTERNS[:, None] ^ _PATTERNS[None, :]],   # XOR
+}
+
+
+def _pair_score(hist, new_patterns, mode):
+    """
+    部署ごとのパターン人数 hist と新卒の性格パターンから OR/XOR の合計を一括計算する。
+        score[i, g] = Σ_p hist[g, p] * popcount(new[i] op p)
+    """
+    per_pattern = hist.dot(PAIR_COUNTS[mode])   # [g, q] = パターン q の新卒を g に入れたときの合計
+    return per_pattern[:, new_patterns].T
+
+
+def personality_score(stats, new_codes, well_suited_leader, well_suited_member):
+    """新卒 × 部署 の性格スコア（リーダー相性 ＋ メンバー相性）。new_codes はパック済みビット"""
+    new_patterns = np.asarray(new_codes, dtype=np.int64) & TRAIT_MASK
+    return (
+        _pair_score(stats["leader"], new_patterns, well_suited_leader)
+        + _pair_score(stats["member"], new_patterns, well_suited_member)
+    )
+
+
+def skill_score(new_codes, group_skill):
+    """新卒 × 部署 のスキル一致数（新卒のスキルビットと部署の必要スキルの AND の popcount）"""
+    new_skill = np.asarray(new_codes, dtype=np.int64) >> SKILL_SHIFT
+    group_mask = pack_bits(np.zeros((len(group_skill), TRAIT_BITS)), group_skill).astype(np.int64) >> SKILL_SHIFT
+    return POPCOUNT[new_skill[:, None] & group_mask[None, :]]
+
+
+def pref_score(prefs_raw, group_ids):
+    """新卒 × 部署 の希望スコア（第一希望を優先）"""
+    prefs = np.asarray(prefs_raw).reshape(-1, 3)
+    gids = np.asarray(group_ids)
+    score = np.zeros((len(prefs), len(gids)), dtype=int)
+    for rank in (3, 2, 1):
+        score[prefs[:, rank - 1][:, None] == gids[None, :]] = PREF[rank]
+    return score
+
+
+def hire_pairs(new_codes, mode, k=None, threshold=None, seed=0):
+    """
+    新卒同士の相性の組 (i, j, w) を返す（i < j。w はメンバー相性と同じ OR/XOR の popcount）。
+        k         : 各新卒について相性の高い順に k 人まで（同じ値の相手は乱数で選ぶ）
+        threshold : 相性が threshold 以上の組だけ
+    どちらも指定しなければ全ての組。w が 0 の組は含めない。
+    性格は 32 パターンしかないので、パターンごとに新卒をまとめて相手を一括で選ぶ。
+    """
+    patterns = np.asarray(new_codes, dtype=np.int64) & TRAIT_MASK
+    n = len(patterns)
+    table = PAIR_COUNTS[mode]
+    order = np.argsort(patterns, kind="stable")
+    counts = np.bincount(patterns, minlength=TRAIT_MASK + 1)
+    starts = np.concatenate([[0], np.cumsum(counts)])
+    rng = np.random.default_rng(seed)
+    min_w = max(threshold or 0, 1)
+
+    parts_i, parts_j = [], []
+    for q in np.flatnonzero(counts):
+        members = order[starts[q]:starts[q + 1]]
+        if k is None:
+            # パターン q と相性が min_w 以上のパターン r (r >= q) の全ての組
+            for r in range(q, TRAIT_MASK + 1):
+                if counts[r] == 0 or table[q, r] < min_w:
+                    continue
+                others = order[starts[r]:starts[r + 1]]
+                if r == q:
+                    a, b = np.triu_indices(len(members), 1)
+                    parts_i.append(members[a])
+                    parts_j.append(members[b])
+                else:
+                    parts_i.append(np.repeat(members, len(others)))
+                    parts_j.append(np.tile(others, len(members)))
+            continue
+
+        # 相性の高いパターンから順に相手を埋める。最後に一部だけ使うパターンは
+        # 新卒ごとにランダムな位置から巡回して選ぶ（同じ相手に集中しないように）
+        prefer = np.argsort(-table[q], kind="stable")
+        prefer = prefer[(table[q, prefer] >= min_w) & (counts[prefer] > 0)]
+        cum = np.concatenate([[0], np.cumsum(counts[prefer])])
+        slots = np.arange(min(k + 1, cum[-1]))  # 自分自身が入る分を 1 つ多くとる
+        if len(slots) == 0:
+            continue
+        bucket = np.searchsorted(cum, slots, side="right") - 1
+        offset = rng.integers(0, n, size=(len(members), 1))
+        pos = (offset + slots - cum[bucket]) % counts[prefer][bucket]
+        partners = order[starts[prefer][bucket] + pos]
+        valid = partners != members[:, None]
+        pick = np.argsort(~valid, axis=1, kind="stable")[:, :k]
+        partners = np.take_along_axis(partners, pick, axis=1)
+        valid = np.take_along_axis(valid, pick, axis=1)
+        parts_i.append(np.broadcast_to(members[:, None], partners.shape)[valid])
+        parts_j.append(partners[valid])
+
+    if not parts_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    i, j = np.concatenate(parts_i), np.concatenate(parts_j)
+    keys = np.unique(np.minimum(i, j) * n + np.maximum(i, j))
+    i, j = keys // n, keys % n
+    return i, j, table[patterns[i], patterns[j]]
+
+
+def subset_pairs(pairs, rows, n_new):
+    """rows の新卒どうしの組だけを残し、インデックスを rows 内の位置に付け替える"""
+    i, j, w = pairs
+    pos = np.full(n_new, -1)
+    pos[rows] = np.arange(len(rows))
+    keep = (pos[i] >= 0) & (pos[j] >= 0)
+    return pos[i[keep]], pos[j[keep]], w[keep]
+
+
+def weighted_pairs(inputs, well_suited_member, weight_char, pair_k=None, pair_threshold=None, seed=None):
+    """optimize の設定から新卒同士の相性の組を作り、性格スコアの重みを掛ける（使わない設定なら None）"""
+    if (pair_k is None and pair_threshold is None) or weight_char == 0:
+        return None
+    i, j, w = hire_pairs(inputs["new_codes"], well_suited_member, pair_k, pair_threshold, seed=seed or 0)
+    return i, j, w * weight_char
+
+
+def pair_value(assign, pairs):
+    """割り当て（新卒ごとの部署インデックス）で同じ部署になった組の相性の合計"""
+    i, j, w = pairs
+    return float(w[assign[i] == assign[j]].sum())
+
+
+def pair_terms(x, pairs, rows=None, cols=None, n_groups=None):
+    """
+    新卒同士の相性の 2 次項 Σ_g Σ_(i,j) w x[i,g] x[j,g] を作る。
+    x が疎（build_sparse_model の変数）なら rows / cols / n_groups も渡す。
+    """
+    from amplify import einsum
+
+    i, j, w = pairs
+    w = np.asarray(w, dtype=float)
+    if rows is None:
+        return einsum("kg,kg,k->", x.take(i.tolist(), axis=0), x.take(j.tolist(), axis=0), w)
+    # 疎なモデル：i の候補部署ごとに展開し、j にも同じ部署の変数がある組だけ残す
+    starts = np.searchsorted(rows, np.arange(i.max() + 2))
+    n_cand = starts[i + 1] - starts[i]
+    a = np.repeat(starts[i], n_cand) + np.arange(n_cand.sum()) - np.repeat(np.cumsum(n_cand) - n_cand, n_cand)
+    keys = rows.astype(np.int64) * n_groups + cols
+    want = np.repeat(j, n_cand) * n_groups + cols[a]
+    b = np.clip(np.searchsorted(keys, want), 0, len(keys) - 1)
+    hit = keys[b] == want
+    return einsum("k,k,k->", x.take(a[hit].tolist()), x.take(b[hit].tolist()), np.repeat(w, n_cand)[hit])
+
+
+def build_model(x, base_score, capacity, P, pairs=None):
+    """
+    スコア行列と定員から QUBO モデルを一括構築する。
+    目的関数はスコア行列と x の縮約 1 回、制約は行・列ごとにまとめて生成する。
+    pairs（hire_pairs の戻り値に重みを掛けたもの）を渡すと新卒同士の相性の 2 次項を加える。
+    """
+    from amplify import Model, ConstraintList, einsum, equal_to, less_equal
+
+    # 最大化 → QUBO では負号をつけ最小化
+    obj = -einsum("ij,ij->", x, np.asarray(base_score, dtype=float))
+    if pairs is not None and len(pairs[0]):
+        obj -= pair_terms(x, pairs)
+
+    # 各新卒は必ず 1 部署
+    cons = equal_to(x, 1, axis=1)
+    # 定員超過禁止
+    cons += ConstraintList([
+        less_equal(col, int(cap)) for col, cap in zip(x.sum(axis=0), capacity)
+    ])
+
+    return Model(obj, cons * P)
+
+
+def candidate_pairs(base_score, prefs_raw, group_ids, capacity, top_k):
+    """
+    変数を作る (新卒, 部署) の組を絞り込む。
+    各新卒についてスコア上位 top_k 部署と第一〜第三希望の部署を残し、定員 0 の部署は除く。
+    戻り値は新卒順に並んだ行・列インデックス。top_k が 1 未満なら ValueError
+    （希望部署がすべて定員 0 の新卒に変数が残らない）。
+    """
+    if top_k < 1:
+        raise ValueError(f"top_k は 1 以上で指定してください（{top_k}）")
+    base_score = np.asarray(base_score, dtype=float)
+    capacity = np.asarray(capacity)
+    n_new, n_groups = base_score.shape
+    open_ = capacity > 0
+
+    keep = pref_score(prefs_raw, group_ids) > 0
+    k = min(top_k, int(open_.sum()))
+    if k > 0:
+        masked = np.where(open_[None, :], base_score, -np.inf)
+        top = np.argpartition(-masked, k - 1, axis=1)[:, :k]
+        keep[np.arange(n_new)[:, None], top] = True
+    keep &= open_[None, :]
+    return np.nonzero(keep)
+
+
+def build_sparse_model(x, rows, cols, base_score, capacity, P, pairs=None):
+    """
+    候補の組 (rows[k], cols[k]) だけに変数 x[k] を持つ疎な QUBO モデルを構築する。
+    rows は昇順（新卒ごとに連続）であること。
+    """
+    from amplify import Model, ConstraintList, einsum, equal_to, less_equal
+
+    n_new, n_groups = np.shape(base_score)
+    obj = -einsum("i,i->", x, np.asarray(base_score, dtype=float)[rows, cols])
+    if pairs is not None and len(pairs[0]):
+        obj -= pair_terms(x, pairs, rows, cols, n_groups)
+
+    # 各新卒は必ず 1 部署
+    starts = np.searchsorted(rows, np.arange(n_new + 1))
+    cons = ConstraintList([
+        equal_to(x[a:b].sum(), 1) for a, b in zip(starts[:-1], starts[1:])
+    ])
+    # 定員超過禁止（部署ごとに並べ替えて連続区間の和をとる）
+    order = np.argsort(cols, kind="stable")
+    x_by_group = x.take(order.tolist())
+    gstarts = np.searchsorted(cols[order], np.arange(n_groups + 1))
+    cons += ConstraintList([
+        less_equal(x_by_group[a:b].sum(), int(cap))
+        for a, b, cap in zip(gstarts[:-1], gstarts[1:], capacity) if b > a
+    ])
+
+    return Model(obj, cons * P)
+
+
+def read_inputs(group_file, member_file, employee_file, base_index=None):
+    """
+    3 つの入力（CSV・DataFrame・Arrow テーブル）を読み込んで検証し、列を役割ごとに取り出す。
+    既存社員・新卒社員はパック形式の名簿（roster.Roster またはそのディレクトリ）でもよく、
+    その場合はパック済みのビットをそのまま使う。
+    既存社員は部署インデックス（dept_index.py）として持ち、同じ内容ならキャッシュから読む。
+    base_index（前回の部署インデックス）を渡すと、キャッシュにないときは差分で更新する。
+    入力に問題があれば ingest.InputError を送出する。
+    """
+    # 1. データ読み込み・検証（型は ingest のスキーマで固定済み）
+    group_df = load_groups(group_file)
+    member_file, employee_file = open_source(member_file), open_source(employee_file)
+    index, index_source = load_index(member_file, group_df, base=base_index)
+    if isinstance(employee_file, Roster):
+        employee_file.expect("employee")
+        employee_df = load_employees(employee_file.to_frame(), group_df)
+        new_codes = np.array(employee_file.bits, dtype=np.uint8)
+    else:
+        employee_df = load_employees(employee_file, group_df)
+        new_codes = pack_bits(employee_df.iloc[:, 2:7].to_numpy(), employee_df.iloc[:, 7:10].to_numpy())
+
+    # 2. 列抽出（順番固定）
+    # 部署CSV: 0:部署ID, 1:部署名, 2-4:スキル１-3, 5:定員人数
+    # 既存社員CSV: 0:社員番号,1:名前,2:部署ID,3:リーダーフラグ,4-8:開放性-神経症傾向,9-11:スキル１-3
+    # 新卒社員CSV: 0:社員番号,1:名前,2-6:開放性-神経症傾向,7-9:スキル１-3,10-12:第一-第三希望ID
+    group_ids = group_df.iloc[:, 0].to_numpy()
+    return {
+        "group_df":    group_df,
+        "employee_df": employee_df,
+        "group_ids":   group_ids,
+        "group_names": group_df.iloc[:, 1].tolist(),
+        "group_skill": group_df.iloc[:, 2:5].to_numpy(),
+        "capacity":    group_df.iloc[:, 5].to_numpy(),
+        "dept_index":  index,
+        "index_source": index_source,
+        "member_names": index.names,
+        "member_dept": group_ids[index.dept],
+        "leader_flag": index.leader.astype(np.int8),
+        "member_codes": index.codes,
+        "new_ids":     employee_df.iloc[:, 0].to_numpy(),
+        "new_names":   employee_df.iloc[:, 1].tolist(),
+        "new_codes":   new_codes,
+        "new_skill":   employee_df.iloc[:, 7:10].to_numpy(),
+        "prefs_raw":   employee_df.iloc[:, 10:13].to_numpy().tolist(),
+    }
+
+
+def score_components(inputs, well_suited_leader, well_suited_member, traits=True):
+    """
+    新卒 × 部署 のスコアを成分ごとに計算する（重みを掛ける前）。
+    traits=False のときは性格・スキルを計算せず 0 にする。
+    """
+    n_new, n_groups = len(inputs["new_ids"]), len(inputs["group_ids"])
+    if traits:
+        # 既存社員の性格パターンを部署ごとに集計したもの（パターンごとの人数。部署インデックスに保持）
+        stats = inputs["dept_index"].stats()
+        personality = personality_score(stats, inputs["new_codes"], well_suited_leader, well_suited_member)
+        skill_match = skill_score(inputs["new_codes"], inputs["group_skill"])
+    else:
+        personality = np.zeros((n_new, n_groups), dtype=int)
+        skill_match = np.zeros((n_new, n_groups), dtype=int)
+    return {
+        "personality": personality,
+        "skill":       skill_match,
+        "pref":        pref_score(inputs["prefs_raw"], inputs["group_ids"]),
+    }
+
+
+def combine_scores(components, weight_char, weight_skill, weight_pref):
+    """成分ごとのスコアを重み付きで足し合わせた base_score"""
+    return (
+        weight_char  * components["personality"]
+        + weight_skill * components["skill"]
+        + weight_pref  * components["pref"]
+    ).astype(float)
+
+
+def solve_assignment(base_score, capacity, P, solver="fixstars", token=None,
+                     timeout=1000, num_reads=1, seed=None, top_k=None,
+                     prefs_raw=None, group_ids=None, stage=None, profiler=None,
+                     decompose=None, details=None, pairs=None, keep_samples=False):
+    """
+    base_score を最大化する割り当て（新卒 × 部署 の 0/1 行列）を求める。
+    solver="exact" なら最小費用流、それ以外は QUBO を構築してソルバーで解く。
+    top_k・decompose を使う場合は prefs_raw と group_ids も渡すこと。
+    decompose（2 以上）を指定すると部署をその数のクラスタに分けて部分問題を並行して解く（decompose.py）。
+    profiler を渡すと各段階のサイズ（変数数・制約数・非ゼロ項数など）を記録する。
+    details（dict）を渡すと分割求解の情報を details["decomposition"] に入れる。
+    pairs（新卒同士の相性 (i, j, w)）は QUBO の 2 次項として加える（厳密解では扱えない）。
+    P=None なら制約ペナルティをスコアの幅から決める（penalty.py。入力だけで決まるので seed で再現できる）。
+    QUBO ソルバーのサンプルは制約を満たさなくても修復して実行可能にし、
+    その中でスコア合計（pairs があれば相性を加えた値）が最も高いものを返す。
+    keep_samples=True ならソルバーの全サンプル（0/1 行列を重ねた int8 配列）を details["samples"] に、
+    それを修復したものを details["repaired_samples"] に入れる
+    （厳密解・分割求解では入らない）。details には QUBO ソルバーの制約違反の情報も入れる。
+    """
+    stage = stage or (lambda name: None)
+    n_new, n_groups = base_score.shape
+
+    if decompose and decompose > 1 and n_groups > 1:
+        # 分割求解：部分問題は同じソルバー設定で解き、段階の記録は全体で 1 回
+        stage("solve")
+        def solve_part(score, cap, prefs, gids, rows):
+            return solve_assignment(score, cap, P, solver=solver, token=token, timeout=timeout,
+                                    num_reads=num_reads, seed=seed, top_k=top_k,
+                                    prefs_raw=prefs, group_ids=gids,
+                                    pairs=None if pairs is None else subset_pairs(pairs, rows, n_new))
+        sol, info = solve_decomposed(base_score, capacity, prefs_raw, group_ids, decompose, solve_part)
+        if profiler is not None:
+            profiler.record(clusters=info["clusters"], sub_seconds=info["sub_seconds"],
+                            repaired_hires=info["repaired_hires"], moved_hires=info["moved_hires"])
+        if details is not None:
+            details["decomposition"] = info
+        return sol
+
+    if solver == "exact":
+        # 5-6. 厳密解（最小費用流）：QUBO を経由しない
+        if pairs is not None and len(pairs[0]):
+            raise ValueError("厳密解（最小費用流）では新卒同士の相性を扱えません。QUBO ソルバーを選択してください")
+        stage("solve")
+        if profiler is not None:
+            profiler.record(variables=n_new * n_groups, constraints=n_new + n_groups,
+                            nonzero_terms=int(np.count_nonzero(base_score)))
+        return min_cost_assignment(base_score, capacity)
+
+    # 3. 変数生成 ＋ 5. QUBO モデル構築
+    stage("build")
+    auto = P is None
+    score = base_score
+    if auto:
+        # 中心化したスコアの幅から決める
+        P = calibrate_penalty(base_score)
+        score = center_scores(base_score)
+    if pairs is not None and len(pairs[0]):
+        # 2 部署に同時に入ると相性の分だけ得をするので、1 人分の相性の合計だけペナルティを上げる
+        i, j, w = pairs
+        P = P + float(np.bincount(np.concatenate([i, j]), np.concatenate([w, w]), minlength=n_new).max())
+    from amplify import VariableGenerator
+
+    gen = VariableGenerator()
+    if top_k is None:
+        x = gen.array("Binary", shape=(n_new, n_groups))
+        model = build_model(x, score, capacity, P, pairs)
+    else:
+        rows, cols = candidate_pairs(base_score, prefs_raw, group_ids, capacity, top_k)
+        x = gen.array("Binary", len(rows))
+        model = build_sparse_model(x, rows, cols, score, capacity, P, pairs)
+    if profiler is not None:
+        weights = base_score if top_k is None else base_score[rows, cols]
+        profiler.record(variables=int(x.size), constraints=len(model.constraints),
+                        nonzero_terms=int(np.count_nonzero(weights)),
+                        hire_pairs=0 if pairs is None else len(pairs[0]),
+                        objective_terms=len(model.objective))
+
+    # 6. Solve
+    stage("solve")
+    solve_fn = get_solver(solver)
+    result = solve_fn(model, x, token=token, timeout=timeout, num_reads=num_reads, seed=seed)
+    if profiler is not None:
+        profiler.record(solver_seconds=float(result.execution_time),
+                        samples=len(result.solutions), feasible_samples=int(sum(result.feasible)))
+    if not result.solutions:
+        raise RuntimeError("ソルバーが解を返しませんでした")
+    samples = np.zeros((len(result.solutions), n_new, n_groups), dtype=np.int8)
+    for s, sample in enumerate(result.solutions):
+        if top_k is None:
+            samples[s] = sample
+        else:
+            samples[s, rows, cols] = sample
+
+    # 制約を満たさないサンプルを修復し、最良のものを選ぶ
+    rate = violation_rate(samples, capacity)
+    assign, repaired = repair_samples(samples, base_score, capacity)
+    totals = base_score[np.arange(n_new), assign].sum(axis=1)
+    if pairs is not None and len(pairs[0]):
+        i, j, w = pairs
+        totals = totals + (assign[:, i] == assign[:, j]) @ np.asarray(w, dtype=float)
+    if profiler is not None:
+        profiler.record(penalty=float(P), violation_rate=rate, repaired_samples=int(repaired.sum()))
+    if details is not None:
+        details["penalty"] = {"penalty": float(P), "violation_rate": rate, "repaired_samples": int(repaired.sum())}
+        if keep_samples:
+            fixed = np.zeros_like(samples)
+            fixed[np.arange(len(samples))[:, None], np.arange(n_new)[None, :], assign] = 1
+            details["samples"] = samples
+            details["repaired_samples"] = fixed
+    sol = np.zeros((n_new, n_groups), dtype=int)
+    sol[np.arange(n_new), assign[totals.argmax()]] = 1
+    return sol
+
+
+class DeptCompatibility(Mapping):
+    """
+    部署名 → 部署内（既存社員＋配属された新卒）の相性行列 の読み取り専用マッピング。
+    相性は共通して 1 の性格ビットの数（性格ベクトルの内積 = AND の popcount）。
+    全社員の N×N 行列は作らず、参照された部署のブロックだけをその場で計算して保持する。
+    対角成分（自分自身）は NaN。既存社員の部署ごとの行は部署インデックス（dept_index.DeptIndex）の
+    ものを使い、新卒だけを配属先（assign、未割り当ては -1）で並べる。codes はパック済みビット。
+    """
+
+    def __init__(self, group_names, index, new_names, new_codes, assign):
+        assign = np.asarray(assign)
+        self._groups = {grp: g for g, grp in enumerate(group_names)}
+        self._index = index
+        self._names = np.asarray(list(index.names) + list(new_names), dtype=object)
+        self._patterns = np.concatenate([index.codes, np.asarray(new_codes, dtype=np.uint8)]).astype(np.int64) & TRAIT_MASK
+        # 新卒を配属先ごとに連続するよう並べた行番号（既存社員の後ろ。部署内の順序は元の順）
+        self._new_order = len(index) + np.argsort(assign, kind="stable")
+        self._new_starts = np.searchsorted(np.sort(assign), np.arange(len(group_names) + 1))
+        self._blocks = {}
+
+    def __getitem__(self, grp):
+        if grp not in self._blocks:
+            self._blocks[grp] = self._block(self._groups[grp])
+        return self._blocks[grp]
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _block(self, g):
+        rows = np.concatenate([self._index.rows(g), self._new_order[self._new_starts[g]:self._new_starts[g + 1]]])
+        if len(rows) == 0:
+            return pd.DataFrame()
+        p = self._patterns[rows]
+        comp = POPCOUNT[p[:, None] & p[None, :]].astype(float)
+        np.fill_diagonal(comp, np.nan)
+        names = self._names[rows]
+        return pd.DataFrame(comp, index=names, columns=names)
+
+    def sizes(self):
+        """部署ごとの人数（既存社員＋配属新卒）"""
+        counts = self._index.sizes() + np.diff(self._new_starts)
+        return {grp: int(counts[g]) for grp, g in self._groups.items()}
+
+    def stream(self):
+        """(部署名, 相性行列) を部署の順に 1 つずつ作って返す（作ったものは保持しない）"""
+        for grp, g in self._groups.items():
+            yield grp, self._blocks[grp] if grp in self._blocks else self._block(g)
+
+
+class DeptSkill(Mapping):
+    """
+    部署名 → 部署のスキル要件（先頭行「必要スキル」）＋ 配属された新卒のスキル表 の読み取り専用マッピング。
+    新卒は配属先（assign、未割り当ては -1）で 1 回並べ替えておき、参照された部署の表だけを作って保持する。
+    """
+
+    def __init__(self, group_names, skill_cols, group_skill, new_names, new_skill, assign):
+        assign = np.asarray(assign)
+        self._groups = {grp: g for g, grp in enumerate(group_names)}
+        self._cols = list(skill_cols)
+        self._group_skill = np.asarray(group_skill, dtype=np.int64)
+        self._names = np.asarray(new_names, dtype=object)
+        self._skill = np.asarray(new_skill, dtype=np.int64)
+        self._order = np.argsort(assign, kind="stable")
+        self._starts = np.searchsorted(assign[self._order], np.arange(len(group_names) + 1))
+        self._blocks = {}
+
+    def __getitem__(self, grp):
+        if grp not in self._blocks:
+            self._blocks[grp] = self._block(self._groups[grp])
+        return self._blocks[grp]
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _block(self, g):
+        rows = self._order[self._starts[g]:self._starts[g + 1]]
+        names = np.concatenate([np.array(["必要スキル"], dtype=object), self._names[rows]])
+        values = np.vstack([self._group_skill[g][None, :], self._skill[rows]])
+        return pd.DataFrame({"": names, **{col: values[:, k] for k, col in enumerate(self._cols)}})
+
+    def stream(self):
+        """(部署名, スキル表) を部署の順に 1 つずつ作って返す（作ったものは保持しない）"""
+        for grp, g in self._groups.items():
+            yield grp, self._blocks[grp] if grp in self._blocks else self._block(g)
+
+
+def stream_report(dept_comp_all, dept_skill):
+    """
+    部署ごとのレポートを (部署名, 相性行列, スキル表) として部署の順に 1 つずつ返すジェネレータ。
+    参照済みの部署以外は作ったものを保持しないので、部署数が多くてもメモリは 1 部署分で済む。
+    """
+    for (grp, comp), (_, skill) in zip(dept_comp_all.stream(), dept_skill.stream()):
+        yield grp, comp, skill
+
 
 def optimize(
     token,
@@ -25,212 +556,158 @@ def optimize(
     weight_char,          # 性格スコア重み (0–100)
     weight_skill,         # スキルスコア重み (0–100)
     weight_pref,          # 希望スコア重み (0–100)
+    solver="fixstars",    # "fixstars" / "local" / "exact" またはソルバー関数
+    timeout=1000,         # ソルバーのタイムアウト [ms]
+    num_reads=1,          # 取得するサンプル数
+    seed=None,            # 乱数シード（ローカルソルバーのみ有効）
+    compare_exact=False,  # 厳密解との最適性ギャップを assign_df.attrs に記録する
+    top_k=None,           # 指定すると各新卒の上位 k 部署＋希望部署だけに変数を作る
+    decompose=None,       # 2 以上なら部署をその数のクラスタに分けて並行して解く（近似。修復して統合する）
+    pair_k=None,          # 新卒同士のメンバー相性を 2 次項で加える（各新卒の相性上位 k 人まで）
+    pair_threshold=None,  # 新卒同士のメンバー相性を相性がこの値以上の組だけ加える（pair_k と併用可）
+    figure=True,          # False なら希望達成率の円グラフを作らない（戻り値の ratio_fig は None。plotly も読み込まない）
+    penalty=None,         # 制約ペナルティ（None ならスコアの幅から自動で決めて調整する。QUBO ソルバーのみ）
+    pool=None,            # 2 以上なら num_reads 個のサンプルから実行可能で互いに異なる上位 pool 案を
+                          # assign_df.attrs["pool"]（評価）と ["pool_assignments"]（割り当て）に残す
+    progress=None,        # 段階ごとに progress(stage) を呼ぶ（例外を投げると中断）
+    profile=False,        # 段階ごとの時間・メモリ・サイズを assign_df.attrs["profile"] に記録する
+                          # （"time" ならメモリを計測しない。tracemalloc の負荷がかからない）
 ):
-    # 1. データ読み込み
-    group_df    = pd.read_csv(group_file)
-    member_df   = pd.read_csv(member_file)
-    employee_df = pd.read_csv(employee_file)
+    profiler = StageProfiler(memory=profile != "time") if profile else None
 
-    # 2. 列抽出（順番固定）
-    # 部署CSV: 0:部署ID, 1:部署名, 2-4:スキル１-3, 5:定員人数
-    group_ids   = group_df.iloc[:, 0].to_numpy(int)
-    group_names = group_df.iloc[:, 1].tolist()
-    group_skill = group_df.iloc[:, 2:5].to_numpy(int)
-    capacity    = group_df.iloc[:, 5].to_numpy(int)
+    def stage(name):
+        if progress is not None:
+            progress(name)
+        if profiler is not None:
+            profiler.stage(name)
 
-    # 既存社員CSV: 0:社員番号,1:名前,2:部署名,3:リーダーフラグ,4-8:開放性-神経症傾向,9-11:スキル１-3
-    member_dept  = member_df.iloc[:, 2].tolist()
-    leader_flag  = member_df.iloc[:, 3].to_numpy(int)
-    member_pers  = member_df.iloc[:, 4:9].to_numpy(int)
+    try:
+        result = _optimize(
+            token, group_file, member_file, employee_file,
+            well_suited_leader, well_suited_member, weight_char, weight_skill, weight_pref,
+            solver, timeout, num_reads, seed, compare_exact, top_k, decompose,
+            pair_k, pair_threshold, penalty, pool, figure, stage, profiler,
+        )
+    finally:
+        if profiler is not None:
+            profiler.finish()
+    if profiler is not None:
+        result[0].attrs["profile"] = profiler.to_dict()
+    return result
 
-    # 新卒社員CSV: 0:社員番号,1:名前,2-6:開放性-神経症傾向,7-9:スキル１-3,10-12:第一-第三希望ID
-    new_ids      = employee_df.iloc[:, 0].to_numpy(int)
-    new_names    = employee_df.iloc[:, 1].tolist()
-    new_pers     = employee_df.iloc[:, 2:7].to_numpy(int)
-    new_skill    = employee_df.iloc[:, 7:10].to_numpy(int)
-    prefs_raw    = employee_df.iloc[:, 10:13].to_numpy(int).tolist()
-
-    n_new    = len(new_ids)
-    n_groups = len(group_ids)
-
-    # 既存社員の性格ベクトルを部署ごとにまとめる
-    leaders = {
-        grp: member_pers[(np.array(member_dept) == grp) & (leader_flag == 1)]
-        for grp in group_names
-    }
-    members = {
-        grp: member_pers[(np.array(member_dept) == grp) & (leader_flag == 0)]
-        for grp in group_names
-    }
 
-    # 3. 変数生成
-    gen = VariableGenerator()
-    x = gen.array("Binary", shape=(n_new, n_groups))
+def _optimize(token, group_file, member_file, employee_file,
+              well_suited_leader, well_suited_member, weight_char, weight_skill, weight_pref,
+              solver, timeout, num_reads, seed, compare_exact, top_k, decompose,
+              pair_k, pair_threshold, penalty, pool, figure, stage, profiler):
+    # 1-2. データ読み込み・列抽出
+    stage("load")
+    inputs = read_inputs(group_file, member_file, employee_file)
+    group_ids, capacity, prefs_raw = inputs["group_ids"], inputs["capacity"], inputs["prefs_raw"]
+    if profiler is not None:
+        profiler.record(groups=len(group_ids), members=len(inputs["dept_index"]),
+                        new_hires=len(inputs["new_ids"]), dept_index=inputs["index_source"])
 
     # 4. スコア計算
-    PREF = {1: 3, 2: 2, 3: 1}
-    base_score = np.zeros((n_new, n_groups))
-    for i in range(n_new):
-        pi = new_pers[i]
-        si = new_skill[i]
-        prefs = prefs_raw[i]
-        for g, (gid, grp) in enumerate(zip(group_ids, group_names)):
-            # 性格・スキルスコア (重みが 0 のときはスキップ)
-            if weight_char > 0 or weight_skill > 0:
-                # リーダー⇔新卒
-                L = leaders[grp]
-                if L.size:
-                    ls = int(np.logical_or(L, pi).sum()) if well_suited_leader == "同一性重視" else int(np.logical_xor(L, pi).sum())
-                else:
-                    ls = 0
-                # メンバー⇔新卒
-                M = members[grp]
-                if M.size:
-                    ms = int(np.logical_or(M, pi).sum()) if well_suited_member == "同一性重視" else int(np.logical_xor(M, pi).sum())
-                else:
-                    ms = 0
-                personality = ls + ms
-                # スキル
-                skill_match = int((group_skill[g] * si).sum())
-            else:
-                personality = 0
-                skill_match = 0
-
-            # 希望スコア
-            if gid == prefs[0]:
-                pf = PREF[1]
-            elif gid == prefs[1]:
-                pf = PREF[2]
-            elif gid == prefs[2]:
-                pf = PREF[3]
-            else:
-                pf = 0
-
-            base_score[i, g] = (
-                weight_char  * personality
-                + weight_skill * skill_match
-                + weight_pref   * pf
-            )
-
-    # 5. QUBO モデル構築：Poly を使い定数 0.0 からスタート
-    obj = Poly(0.0)
-    for i in range(n_new):
-        for g in range(n_groups):
-            w = base_score[i, g]
-            if w:
-                obj -= w * x[i][g]   # 最大化 → QUBO では負号をつけ最小化
-
-    # 制約ペナルティ
-    P = (weight_char + weight_skill + weight_pref) * 10 + 1
-    cons = []
-    # 各新卒は必ず 1 部署
-    for i in range(n_new):
-        cons.append(equal_to(amplify_sum(x[i, :]), 1) * P)
-    # 定員超過禁止
-    for g in range(n_groups):
-        cons.append(less_equal(amplify_sum(x[:, g]), capacity[g]) * P)
-
-    model = Model(obj, ConstraintList(cons))
+    # 性格・スキルスコア (重みが 0 のときはスキップ)
+    stage("score")
+    components = score_components(
+        inputs, well_suited_leader, well_suited_member,
+        traits=weight_char > 0 or weight_skill > 0,
+    )
+    base_score = combine_scores(components, weight_char, weight_skill, weight_pref)
+    pairs = weighted_pairs(inputs, well_suited_member, weight_char, pair_k, pair_threshold, seed)
+    if profiler is not None:
+        profiler.record(score_cells=int(base_score.size), nonzero_scores=int(np.count_nonzero(base_score)))
 
-    # 6. Solve
-    client = FixstarsClient()
-    client.token = token
-    client.parameters.timeout = 1000
-    results = solve(model, client)
-    sol = results[0]
-
-    # 7. 割当結果出力
-    assignment = []
-    assigned_idx = []
-    for i in range(n_new):
-        for g in range(n_groups):
-            if sol.values[x[i][g]] == 1:
-                assignment.append({"名前": new_names[i], "割り当て部署": group_names[g]})
-                assigned_idx.append((i, g))
-                break
-    assign_df = pd.DataFrame(assignment)
-
-    # 8. 全社員の性格ベクトル辞書
-    pers_dict = {}
-    # 既存社員を追加
-    for _, row in member_df.iterrows():
-        name = row.iloc[1]
-        pers_dict[name] = row.iloc[4:9].to_numpy(int)
-    # 新卒社員を追加
-    for i, _ in assigned_idx:
-        pers_dict[new_names[i]] = new_pers[i]
-
-    # 9. 全社員の相性行列（comp_all）
-    all_names = list(pers_dict.keys())
-    Pmat_all = np.stack([pers_dict[n] for n in all_names])
-    comp_all = pd.DataFrame(
-        Pmat_all.dot(Pmat_all.T),
-        index=all_names,
-        columns=all_names
+    # 3, 5, 6. 変数生成・QUBO モデル構築・Solve
+    details = {}
+    sol = solve_assignment(
+        base_score, capacity, penalty, solver=solver, token=token,
+        timeout=timeout, num_reads=num_reads, seed=seed, top_k=top_k,
+        prefs_raw=prefs_raw, group_ids=group_ids, stage=stage, profiler=profiler,
+        decompose=decompose, details=details, pairs=pairs, keep_samples=bool(pool and pool > 1),
     )
+    samples = details.pop("samples", None)
+    repaired = details.pop("repaired_samples", None)
+    # 分割求解は厳密解でも近似なので、ギャップは厳密解と比べて求める
+    result = build_report(inputs, sol, base_score, exact=solver == "exact" and "decomposition" not in details,
+                          compare_exact=compare_exact, stage=stage, profiler=profiler, figure=figure)
+    result[0].attrs.update(details)
+    if pairs is not None:
+        # objective は 1 次のスコアのみ（厳密解と比べられる）。新卒同士の相性は別に記録する
+        result[0].attrs.update(hire_pairs=len(pairs[0]), pair_objective=pair_value(sol.argmax(axis=1), pairs))
+    if pool and pool > 1:
+        # 解のプール（厳密解・分割求解では最良の 1 案だけ）
+        table, assignments = build_pool(
+            sol[None] if samples is None else samples, pool, base_score, capacity, prefs_raw, group_ids,
+            inputs["new_names"], inputs["group_names"], pairs, repaired=repaired,
+        )
+        result[0].attrs.update(pool=table, pool_assignments=assignments,
+                               pool_samples=1 if samples is None else len(samples))
+    return result
 
-    # 10. 各部署ごとに comp_all を切り出す
-    dept_comp_all = {}
-    for (gid, grp) in zip(group_ids, group_names):
-        # その部署の既存社員名
-        exist_names = member_df.loc[member_df.iloc[:,2] == gid, member_df.columns[1]].tolist()
-        # その部署に配属された新卒社員名
-        new_names_in_grp = assign_df.loc[assign_df["割り当て部署"] == grp, "名前"].tolist()
-        # 両方を結合
-        names_grp = exist_names + new_names_in_grp
-
-        # 切り出し
-        if names_grp:
-            df = comp_all.loc[names_grp, names_grp].copy()
-            # 対角成分（自分自身の相性）を空文字にする
-            df = df.astype(object)  # 文字列混在を許可
-            for n in df.index:
-                df.at[n, n] = ""
-            dept_comp_all[grp] = df
-        else:
-            dept_comp_all[grp] = pd.DataFrame()
 
-    # 11. 各部署ごとのスキル要件 ＋ 配属新卒のスキル表
+def build_report(inputs, sol, base_score, exact=False, compare_exact=False, stage=None, profiler=None,
+                 figure=True):
+    """
+    割り当て sol（新卒 × 部署 の 0/1 行列）から optimize と同じ戻り値
+    (assign_df, dept_comp_all, dept_skill, ratio_fig) を作る。
+    exact=True なら sol を最適解とみなしてギャップ 0 を記録する。
+    希望ごとの人数は assign_df.attrs["preference_counts"] にも入れる（figure=False なら ratio_fig は None）。
+    """
+    stage = stage or (lambda name: None)
+    group_df = inputs["group_df"]
+    group_ids, group_names = inputs["group_ids"], inputs["group_names"]
+    group_skill, capacity = inputs["group_skill"], inputs["capacity"]
+    new_names = inputs["new_names"]
+    new_skill, prefs_raw = inputs["new_skill"], inputs["prefs_raw"]
+
+    stage("decode")
+    # 最適性ギャップ（厳密解のスコア合計との差）
+    objective = float((sol * base_score).sum())
+    optimal = gap = None
+    if exact:
+        optimal, gap = objective, 0.0
+    elif compare_exact:
+        optimal = float((min_cost_assignment(base_score, capacity) * base_score).sum())
+        gap = (optimal - objective) / abs(optimal) if optimal else 0.0
+
+    # 7. 割当結果出力（どの部署にも入っていない新卒も「未割り当て」として残す）
+    assign = decode_samples(sol[None])[0]
+    assigned = np.flatnonzero(assign >= 0)
+    assign_df = pd.DataFrame({
+        "名前": list(new_names),
+        "割り当て部署": np.where(assign >= 0, np.asarray(group_names, dtype=object)[assign], UNASSIGNED),
+    })
+    assign_df.attrs.update(objective=objective, optimal_objective=optimal, optimality_gap=gap)
+
+    stage("report")
+    # 8-10. 部署ごとの相性行列（既存社員の所属は部署インデックスから。参照されたときに計算）
+    dept_comp_all = DeptCompatibility(group_names, inputs["dept_index"], new_names, inputs["new_codes"], assign)
+    if profiler is not None:
+        profiler.record(comp_block_cells=int(sum(n * n for n in dept_comp_all.sizes().values())))
+
+    # 11. 各部署ごとのスキル要件 ＋ 配属新卒のスキル表（参照されたときに作る）
     skill_cols = group_df.columns[2:5].tolist()  # e.g. ["スキルA","スキルB","スキルC"]
-    dept_skill = {}
-    for (gid, grp), req_bits in zip(zip(group_ids, group_names), group_skill):
-        rows = []
-        # 部署要件行
-        req_row = {"": "必要スキル"}
-        for idx, col in enumerate(skill_cols):
-            req_row[col] = int(req_bits[idx])
-        rows.append(req_row)
-
-        # 配属された新卒社員行
-        for i, g in assigned_idx:
-            if group_names[g] == grp:
-                emp_row = {"": new_names[i]}
-                for idx, col in enumerate(skill_cols):
-                    emp_row[col] = int(new_skill[i, idx])
-                rows.append(emp_row)
-
-        dept_skill[grp] = pd.DataFrame(rows)
-
-    # 12. 希望一致率の計算
-    count_1st = count_2nd = count_3rd = count_none = 0
-    for i, g in assigned_idx:
-        assigned_gid = group_ids[g]
-        prefs = prefs_raw[i]
-        if assigned_gid == prefs[0]:
-            count_1st += 1
-        elif assigned_gid == prefs[1]:
-            count_2nd += 1
-        elif assigned_gid == prefs[2]:
-            count_3rd += 1
-        else:
-            count_none += 1
+    dept_skill = DeptSkill(group_names, skill_cols, group_skill, new_names, new_skill, assign)
+
+    # 12. 希望一致率の計算（割り当てた部署 ID が第何希望か。未割り当ての新卒は数えない）
+    prefs = np.asarray(prefs_raw).reshape(-1, 3)
+    hit = prefs[assigned] == np.asarray(group_ids)[assign[assigned]][:, None]
+    rank = np.where(hit.any(axis=1), hit.argmax(axis=1), 3)
+    count_1st, count_2nd, count_3rd, count_none = np.bincount(rank, minlength=4).tolist()
 
     # 希望通りの割合
     ratio_info = pd.DataFrame({
         "選択": ["第一希望", "第二希望", "第三希望", "希望外"],
         "人数": [count_1st, count_2nd, count_3rd, count_none]
     })
+    assign_df.attrs["preference_counts"] = dict(zip(ratio_info["選択"], ratio_info["人数"].tolist()))
+    if not figure:
+        return assign_df, dept_comp_all, dept_skill, None
 
+    import plotly.express as px  # 図を作るときだけ読み込む
     ratio_fig = px.pie(
         ratio_info,
         names           = "選択",
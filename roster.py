@@ -0,0 +1,206 @@
+# roster.py
+#
+# 社員名簿のビットパック形式
+#   1 人分の性格 5 ビット（開放性〜神経症傾向）とスキル 3 ビットを 1 バイトに詰め、
+#   社員番号・部署ID・リーダーフラグ・希望部署は固定長の配列として保存する。
+#   ディレクトリ構成:
+#       roster.json  : 種類（"member" = 既存社員 / "employee" = 新卒社員）、元の列名、人数
+#       records.npy  : 構造化配列（np.load(mmap_mode="r") でメモリマップして読める）
+#       names.npy    : 名前（NUL 区切りで連結した UTF-8 のバイト列）
+#
+#   python roster.py pack 既存社員.csv roster/members       # CSV → パック形式
+#   python roster.py unpack roster/members 既存社員.csv     # パック形式 → CSV
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import ingest
+
+# ビット配置: bit 0-4 = 性格（列の順）, bit 5-7 = スキル１-３
+TRAIT_BITS  = 5
+SKILL_BITS  = 3
+TRAIT_MASK  = (1 << TRAIT_BITS) - 1
+SKILL_SHIFT = TRAIT_BITS
+
+# 1 バイトの値 → 立っているビット数
+POPCOUNT = np.array([bin(v).count("1") for v in range(256)], dtype=np.int64)
+
+RECORD_DTYPES = {
+    "member":   np.dtype([("id", "<i4"), ("dept", "<i4"), ("leader", "u1"), ("bits", "u1")]),
+    "employee": np.dtype([("id", "<i4"), ("bits", "u1"), ("prefs", "<i4", (3,))]),
+}
+LABELS = {"member": "既存社員CSV", "employee": "新卒社員CSV"}
+
+META_FILE, RECORDS_FILE, NAMES_FILE = "roster.json", "records.npy", "names.npy"
+
+
+def pack_bits(traits, skills=None):
+    """0/1 の性格（n×5）とスキル（n×3）を 1 人 1 バイトに詰める"""
+    bits = np.zeros((len(traits), 8), dtype=np.uint8)
+    bits[:, :TRAIT_BITS] = np.asarray(traits) != 0
+    if skills is not None:
+        bits[:, SKILL_SHIFT:] = np.asarray(skills) != 0
+    return np.packbits(bits, axis=1, bitorder="little")[:, 0]
+
+
+def unpack_bits(codes):
+    """pack_bits の逆。(性格 n×5, スキル n×3) を int8 で返す"""
+    bits = np.unpackbits(np.asarray(codes, dtype=np.uint8)[:, None], axis=1, bitorder="little")
+    bits = bits.astype(np.int8)
+    return bits[:, :TRAIT_BITS], bits[:, SKILL_SHIFT:]
+
+
+def is_roster(path):
+    """パック形式のディレクトリかどうか"""
+    return isinstance(path, (str, os.PathLike)) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+def open_source(source):
+    """パック形式のディレクトリなら Roster として開き（メモリマップ）、それ以外はそのまま返す"""
+    return Roster.open(source) if is_roster(source) else source
+
+
+def _encode_names(names):
+    return np.frombuffer("\0".join(names).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_names(blob, n):
+    if n == 0:
+        return []
+    return bytes(blob).decode("utf-8").split("\0")
+
+
+class Roster:
+    """
+    パック形式の名簿。records は np.memmap のこともある（読み取り専用）。
+        kind    : "member" / "employee"
+        columns : 元の CSV の列名（to_frame で復元する）
+        names   : 名前のリスト
+    """
+
+    def __init__(self, kind, columns, records, names):
+        if kind not in RECORD_DTYPES:
+            raise ValueError(f"未知の名簿の種類です: {kind!r}")
+        self.kind = kind
+        self.columns = list(columns)
+        self.records = records
+        self.names = names
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def bits(self):
+        return self.records["bits"]
+
+    def expect(self, kind):
+        """種類が kind でなければ ingest.InputError"""
+        if self.kind != kind:
+            raise ingest.InputError(f"{LABELS[kind]} にパック形式の{LABELS[self.kind]}の名簿が渡されました")
+
+    def digest(self):
+        """内容（レコードと名前）のバイト列（キャッシュキー用）"""
+        return (self.kind.encode("utf-8") + np.ascontiguousarray(self.records).tobytes()
+                + _encode_names(self.names).tobytes())
+
+    @classmethod
+    def from_frame(cls, df, kind):
+        """CSV と同じ列の並びの DataFrame から作る（部署は部署ID で書かれていること）"""
+        schema = ingest.MEMBER_SCHEMA if kind == "member" else ingest.EMPLOYEE_SCHEMA
+        df = ingest.conform(df, schema, LABELS[kind])
+        cols = df.columns
+        ids = df.iloc[:, 0]
+        if len(ids) and (ids.min() < np.iinfo(np.int32).min or ids.max() > np.iinfo(np.int32).max):
+            raise ingest.InputError(f"{LABELS[kind]} の列「{cols[0]}」が 32 ビット整数の範囲を超えています")
+        records = np.zeros(len(df), dtype=RECORD_DTYPES[kind])
+        records["id"] = ids
+        if kind == "member":
+            dept = pd.to_numeric(df.iloc[:, 2], errors="coerce")
+            if dept.isna().any() or (dept % 1 != 0).any():
+                raise ingest.InputError(f"{LABELS[kind]} の列「{cols[2]}」は部署ID（整数）で入力してください")
+            records["dept"] = dept
+            records["leader"] = df.iloc[:, 3]
+            records["bits"] = pack_bits(df.iloc[:, 4:9].to_numpy(), df.iloc[:, 9:12].to_numpy())
+        else:
+            records["bits"] = pack_bits(df.iloc[:, 2:7].to_numpy(), df.iloc[:, 7:10].to_numpy())
+            records["prefs"] = df.iloc[:, 10:13].to_numpy()
+        names = df.iloc[:, 1].astype(str).tolist()
+        if any("\0" in name for name in names):
+            raise ingest.InputError(f"{LABELS[kind]} の列「{cols[1]}」に使えない文字（NUL）があります")
+        return cls(kind, cols, records, names)
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """保存したディレクトリから読み込む（mmap=True ならメモリマップ）"""
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as fp:
+            meta = json.load(fp)
+        mode = "r" if mmap else None
+        records = np.load(os.path.join(path, RECORDS_FILE), mmap_mode=mode)
+        if records.dtype != RECORD_DTYPES[meta["kind"]]:
+            raise ValueError(f"{path}: 名簿の形式が一致しません（{records.dtype}）")
+        names = _decode_names(np.load(os.path.join(path, NAMES_FILE), mmap_mode=mode), len(records))
+        return cls(meta["kind"], meta["columns"], records, names)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, RECORDS_FILE), np.ascontiguousarray(self.records))
+        np.save(os.path.join(path, NAMES_FILE), _encode_names(self.names))
+        meta = {"kind": self.kind, "columns": self.columns, "size": len(self)}
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as fp:
+            json.dump(meta, fp, ensure_ascii=False, indent=2)
+
+    def to_frame(self):
+        """CSV テンプレートと同じ列の並び・型の DataFrame に戻す"""
+        traits, skills = unpack_bits(self.bits)
+        names = pd.Series(self.names, dtype=object)
+        if self.kind == "member":
+            parts = [self.records["id"].astype(np.int64), names, self.records["dept"].astype(np.int64),
+                     self.records["leader"].astype(np.int8), *traits.T, *skills.T]
+        else:
+            prefs = np.asarray(self.records["prefs"], dtype=np.int64)
+            parts = [self.records["id"].astype(np.int64), names, *traits.T, *skills.T, *prefs.T]
+        return pd.DataFrame({col: np.asarray(v) for col, v in zip(self.columns, parts)})
+
+
+def csv_to_roster(csv_file, path, kind=None):
+    """テンプレート形式の CSV をパック形式で保存する（kind を省くと列数から判定）"""
+    df = ingest.read_table(csv_file)
+    if kind is None:
+        kind = "employee" if df.shape[1] >= len(ingest.EMPLOYEE_SCHEMA) else "member"
+    roster = Roster.from_frame(df, kind)
+    roster.save(path)
+    return roster
+
+
+def roster_to_csv(path, csv_file):
+    """パック形式をテンプレート形式の CSV に書き出す"""
+    Roster.open(path).to_frame().to_csv(csv_file, index=False, encoding="utf-8-sig")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="社員名簿のビットパック形式との変換")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("pack", help="CSV → パック形式")
+    p.add_argument("csv")
+    p.add_argument("directory")
+    p.add_argument("--kind", choices=list(RECORD_DTYPES), default=None,
+                   help="member（既存社員）/ employee（新卒社員）。省略時は列数から判定")
+    p = sub.add_parser("unpack", help="パック形式 → CSV")
+    p.add_argument("directory")
+    p.add_argument("csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        roster = csv_to_roster(args.csv, args.directory, args.kind)
+        size = sum(os.path.getsize(os.path.join(args.directory, f)) for f in (RECORDS_FILE, NAMES_FILE))
+        print(f"{args.directory}: {roster.kind} {len(roster)} 人, {size / 1024:.1f} KiB")
+    else:
+        roster_to_csv(args.directory, args.csv)
+
+
+if __name__ == "__main__":
+    main()
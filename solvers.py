@@ -0,0 +1,376 @@
+# solvers.py
+#
+# ソルバーバックエンド
+#   "fixstars" : Fixstars Amplify AE（リモート、トークン必須）
+#   "local"    : NumPy ベクトル化シミュレーテッドアニーリング（オフライン）
+# amplify は QUBO を扱う関数の中で読み込む（厳密解だけなら不要）。
+#
+# 厳密解 min_cost_assignment は QUBO を経由せずスコア行列と定員から直接解く。
+#
+# どのバックエンドも solve_fn(model, x, *, token, timeout, num_reads, seed) -> SolveResult
+# の形で呼び出せ、復号段は SolveResult.solutions の 0/1 行列だけを見ればよい。
+
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+@dataclass
+class SolveResult:
+    """
+    ソルバーの出力（良い順に並んだサンプル）
+        solutions  : x と同じ形の 0/1 行列のリスト
+        objectives : 各サンプルの目的関数値（制約ペナルティを含まない）
+        feasible   : 各サンプルが全制約を満たすか
+        execution_time : ソルバーの実行時間 [s]
+    """
+    solutions: list = field(default_factory=list)
+    objectives: list = field(default_factory=list)
+    feasible: list = field(default_factory=list)
+    execution_time: float = 0.0
+
+    def best(self):
+        """実行可能な解のうち最良のもの（なければ None）"""
+        for sol, ok in zip(self.solutions, self.feasible):
+            if ok:
+                return sol
+        return None
+
+
+def fixstars_solve(model, x, *, token=None, timeout=1000, num_reads=1, seed=None):
+    """Fixstars Amplify AE で解く（seed は AE 側で指定できないため無視）"""
+    from amplify import solve
+    from amplify.client import FixstarsClient
+
+    client = FixstarsClient()
+    client.token = token
+    client.parameters.timeout = timeout
+    results = solve(model, client, num_solves=num_reads, filter_solution=False)
+
+    out = SolveResult(execution_time=results.execution_time.total_seconds())
+    for sol in results:
+        out.solutions.append(x.evaluate(sol.values).astype(int))
+        out.objectives.append(sol.objective)
+        out.feasible.append(sol.feasible)
+    return out
+
+
+# ── ローカル SA ──
+
+def _term_arrays(terms):
+    """
+    as_dict 形式の多項式を配列にする。
+    戻り値は (係数, 次数, 全項の変数 ID を順に並べた配列, 各項の先頭位置)。
+    """
+    keys = list(terms)
+    coefs = np.fromiter(terms.values(), dtype=float, count=len(keys))
+    degree = np.fromiter(map(len, keys), dtype=np.int64, count=len(keys))
+    flat = np.fromiter(itertools.chain.from_iterable(keys), dtype=np.int64, count=int(degree.sum()))
+    return coefs, degree, flat, np.cumsum(degree) - degree
+
+
+def _to_qubo(model):
+    """
+    Model を制約ペナルティ込みの QUBO（定数, 1次係数, 2次の辺リスト）に変換。
+    index は変数 ID → 列番号（変数 ID の昇順に並ぶ）。
+    """
+    from amplify import AcceptableDegrees
+
+    im, _ = model.to_intermediate_model(AcceptableDegrees(objective={"Binary": "Quadratic"}))
+    coefs, degree, flat, starts = _term_arrays(im.to_unconstrained_poly().as_dict())
+
+    var_ids, pos = np.unique(flat, return_inverse=True)
+    index = dict(zip(var_ids.tolist(), range(len(var_ids))))
+    n = len(var_ids)
+
+    const = float(coefs[degree == 0].sum())
+    one, two = degree == 1, degree == 2
+    lin = np.bincount(pos[starts[one]], weights=coefs[one], minlength=n)
+    rows, cols = pos[starts[two]], pos[starts[two] + 1]
+    return const, lin, rows, cols, coefs[two], index
+
+
+def _adjacency(n, rows, cols, ws):
+    """対称な隣接リスト（CSR 形式）"""
+    src = np.concatenate([rows, cols])
+    dst = np.concatenate([cols, rows])
+    w = np.concatenate([ws, ws])
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=int)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[order], w[order]
+
+
+def _eval_poly(terms, var_ids, s):
+    """
+    as_dict 形式の多項式を全サンプル (reads × n) で一括評価（次数ごとにまとめて計算）。
+    var_ids は s の列に対応する変数 ID（昇順）。
+    """
+    coefs, degree, flat, starts = _term_arrays(terms)
+    pos = np.searchsorted(var_ids, flat)
+    value = np.zeros(len(s))
+    for d in np.unique(degree):
+        sel = np.flatnonzero(degree == d)
+        if d == 0:
+            value += coefs[sel].sum()
+            continue
+        idx = pos[starts[sel][:, None] + np.arange(d)]
+        value += (s[:, idx].prod(axis=2) * coefs[sel]).sum(axis=1)
+    return value
+
+
+def _is_satisfied(constraint, var_ids, s, tol=1e-6):
+    poly, op, bound = constraint.conditional
+    value = _eval_poly(poly.as_dict(), var_ids, s)
+    if op == "EQ":
+        return np.abs(value - bound) <= tol
+    if op == "LE":
+        return value <= bound + tol
+    if op == "GE":
+        return value >= bound - tol
+    lo, hi = bound  # "BW"
+    return (value >= lo - tol) & (value <= hi + tol)
+
+
+def _one_hot_groups(model, index):
+    """
+    「変数の和 = 1」の制約（新卒 1 人の行）を QUBO の列番号の配列のリストにする。
+    他のグループと変数が重なる制約は使わない（その変数は単一フリップで更新する）。
+    """
+    groups, used = [], set()
+    for c in model.constraints:
+        poly, op, bound = c.conditional
+        terms = poly.as_dict()
+        if op != "EQ" or bound != 1 or any(len(k) != 1 or v != 1 for k, v in terms.items()):
+            continue
+        cols = [index.get(k[0]) for k in terms]
+        if None in cols or used.intersection(cols):
+            continue
+        used.update(cols)
+        groups.append(np.array(cols))
+    return groups
+
+
+def _csr_slices(indptr, ks):
+    """変数 ks の隣接リストの位置を連結した配列と、変数ごとの長さ"""
+    starts = indptr[ks]
+    lens = indptr[ks + 1] - starts
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum()), lens
+
+
+def _apply(f, reads, ks, change, indptr, nbrs, w):
+    """リード reads の変数 ks が change (±1) だけ変わったときの局所場の更新"""
+    pos, lens = _csr_slices(indptr, ks)
+    np.add.at(f, (np.repeat(reads, lens), nbrs[pos]), np.repeat(change, lens) * w[pos])
+
+
+def _group_couplings(group, indptr, nbrs, w, n):
+    """グループ内の変数どうしの結合係数（m × m の密行列）"""
+    local = np.full(n, -1)
+    local[group] = np.arange(len(group))
+    pos, lens = _csr_slices(indptr, group)
+    rows, cols = np.repeat(np.arange(len(group)), lens), local[nbrs[pos]]
+    inside = cols >= 0
+    Q = np.zeros((len(group), len(group)))
+    Q[rows[inside], cols[inside]] = w[pos[inside]]
+    return Q
+
+
+def anneal(lin, indptr, nbrs, w, *, groups=(), num_reads=1, num_sweeps=200, deadline=None, seed=None):
+    """
+    SA（全リードを同時に更新）。温度は幾何スケジュールで下げ、最後に貪欲降下を 2 回行う。
+    groups（互いに重ならない one-hot な変数の組）は 1 つの状態として扱い、
+    組の中の 1 を別の変数へ移す手を熱浴法で 1 組ずつまとめて選ぶ（one-hot は常に保たれる）。
+    それ以外の変数は単一フリップのメトロポリス法で更新する。
+    deadline（time.perf_counter の値）はスイープの合間だけで確かめ、過ぎたらその時点の状態を返す。
+    """
+    rng = np.random.default_rng(seed)
+    n = len(lin)
+    s = rng.integers(0, 2, size=(num_reads, n)).astype(float)
+    if n == 0:
+        return s
+    reads = np.arange(num_reads)
+    for g in groups:
+        s[:, g] = 0
+        s[reads, g[rng.integers(0, len(g), size=num_reads)]] = 1
+    couplings = [_group_couplings(g, indptr, nbrs, w, n) for g in groups]
+    grouped = np.zeros(n, dtype=bool)
+    for g in groups:
+        grouped[g] = True
+    rest = np.flatnonzero(~grouped)
+
+    # 局所場 f[r, k] = Σ_j Q_kj s_j
+    owner = np.repeat(np.arange(n), np.diff(indptr))
+    contrib = s[:, nbrs] * w
+    f = np.stack([np.bincount(owner, weights=row, minlength=n) for row in contrib])
+
+    # 温度範囲（最大/最小のエネルギー変化から決める）
+    row_abs = np.abs(lin) + np.bincount(owner, weights=np.abs(w), minlength=n)
+    max_delta = max(row_abs.max(), 1e-9)
+    coefs = np.abs(np.concatenate([lin, w]))
+    min_delta = max(coefs[coefs > 0].min() if (coefs > 0).any() else 1.0, 1e-9)
+    betas = np.geomspace(np.log(2) / max_delta, np.log(100) / min_delta, num_sweeps)
+
+    for beta in list(betas) + [np.inf, np.inf]:
+        if deadline is not None and time.perf_counter() > deadline:
+            return s
+        # one-hot な組：今の 1 の位置 a から b へ移すときの変化 Δ_b = h_b - h_a - Q_ab
+        for g, Q in zip(groups, couplings):
+            h = lin[g] + f[:, g]
+            a = s[:, g].argmax(axis=1)
+            delta = h - h[reads, a][:, None] - Q[a]
+            if np.isfinite(beta):
+                b = (beta * delta - rng.gumbel(size=delta.shape)).argmin(axis=1)
+            else:
+                b = np.where(delta.min(axis=1) < 0, delta.argmin(axis=1), a)
+            moved = np.flatnonzero(b != a)
+            if len(moved) == 0:
+                continue
+            s[moved, g[a[moved]]] = 0
+            s[moved, g[b[moved]]] = 1
+            _apply(f, np.concatenate([moved, moved]), np.concatenate([g[a[moved]], g[b[moved]]]),
+                   np.repeat([-1.0, 1.0], len(moved)), indptr, nbrs, w)
+
+        # 残りの変数（定員制約のスラック変数など）は 1 つずつ
+        u = rng.random((num_reads, len(rest)))
+        for j, k in enumerate(rest):
+            sign = 1.0 - 2.0 * s[:, k]
+            delta = sign * (lin[k] + f[:, k])
+            flip = delta <= 0
+            if np.isfinite(beta):
+                flip |= u[:, j] < np.exp(-beta * np.maximum(delta, 0))
+            if not flip.any():
+                continue
+            change = np.where(flip, sign, 0.0)
+            s[:, k] += change
+            lo, hi = indptr[k], indptr[k + 1]
+            f[:, nbrs[lo:hi]] += change[:, None] * w[lo:hi]
+    return s
+
+
+def local_solve(model, x, *, token=None, timeout=1000, num_reads=1, seed=None, num_sweeps=200):
+    """ネットワークを使わずローカルの SA で同じ Model を解く"""
+    start = time.perf_counter()
+    # QUBO への変換も含めて timeout [ms] 以内に収める
+    deadline = None if timeout is None else start + timeout / 1000
+    const, lin, rows, cols, ws, index = _to_qubo(model)
+    indptr, nbrs, w = _adjacency(len(lin), rows, cols, ws)
+    s = anneal(lin, indptr, nbrs, w, groups=_one_hot_groups(model, index), num_reads=num_reads,
+               num_sweeps=num_sweeps, deadline=deadline, seed=seed)
+
+    # 目的関数値と制約充足を評価し、amplify と同じく「実行可能 → 目的関数値」の順に並べる
+    var_ids = np.fromiter(index, dtype=np.int64, count=len(index))
+    objectives = _eval_poly(model.objective.as_dict(), var_ids, s)
+    feasible = np.ones(len(s), dtype=bool)
+    for c in model.constraints:
+        feasible &= _is_satisfied(c, var_ids, s)
+    order = np.lexsort((objectives, ~feasible))
+
+    x_cols = np.array([index.get(p.as_variable().id, -1) for p in x.ravel()])
+    x_vals = np.where(x_cols >= 0, s[:, np.maximum(x_cols, 0)], 0).astype(int)
+
+    out = SolveResult(execution_time=time.perf_counter() - start)
+    for r in order:
+        out.solutions.append(x_vals[r].reshape(x.shape))
+        out.objectives.append(float(objectives[r]))
+        out.feasible.append(bool(feasible[r]))
+    return out
+
+
+# ── 厳密解（最小費用流） ──
+
+def _move_rows(cost, members, g):
+    """
+    部署 g から他部署へ 1 人移すときの最小追加費用 D[g, :] と、その社員
+        D[g, h] = min_{j ∈ g} cost[j, h] - cost[j, g]
+    """
+    m = np.fromiter(members[g], dtype=int, count=len(members[g]))
+    if len(m) == 0:
+        return np.full(cost.shape[1], np.inf), np.full(cost.shape[1], -1)
+    diff = cost[m] - cost[m, g][:, None]
+    k = diff.argmin(axis=0)
+    return diff[k, np.arange(cost.shape[1])], m[k]
+
+
+def min_cost_assignment(score, capacity):
+    """
+    各新卒を必ず 1 部署に、部署の定員以内で割り当て、スコア合計を最大化する厳密解。
+    割当問題（輸送問題）なので、新卒を 1 人ずつ追加しながら部署間の最短増加路
+    （玉突きで他の新卒を移す経路）に沿って流すことで最適解が得られる。
+    最短路は部署ポテンシャル pi で辺長を非負にした Dijkstra で求め、
+    空きのある部署に届いた時点で打ち切る（ハンガリー法と同じ考え方）。
+    戻り値は score と同じ形の 0/1 行列。
+    """
+    cost = -np.asarray(score, dtype=float)
+    capacity = np.asarray(capacity, dtype=int)
+    n_new, n_groups = cost.shape
+    if capacity.sum() < n_new:
+        raise ValueError(f"定員の合計 ({capacity.sum()}) が新卒数 ({n_new}) より少ないため割り当てできません")
+
+    assign = np.full(n_new, -1)
+    load = np.zeros(n_groups, dtype=int)
+    members = [set() for _ in range(n_groups)]
+    D = np.full((n_groups, n_groups), np.inf)
+    D_who = np.full((n_groups, n_groups), -1)
+    pi = np.zeros(n_groups)
+
+    for i in range(n_new):
+        free = load < capacity
+        # 被約費用での距離（pi を引いた値）。シンクは空き部署から費用 0 で到達
+        dist = cost[i] - pi
+        pred = np.full(n_groups, -1)
+        done = np.zeros(n_groups, dtype=bool)
+        sink, target = np.inf, -1
+        while True:
+            g = np.where(done, np.inf, dist).argmin()
+            if done[g] or dist[g] >= sink:
+                break
+            done[g] = True
+            if free[g] and dist[g] + pi[g] < sink:
+                sink, target = dist[g] + pi[g], g
+            relaxed = dist[g] + D[g] + pi[g] - pi
+            better = ~done & (relaxed < dist)
+            dist[better] = relaxed[better]
+            pred[better] = g
+
+        # ポテンシャル更新（確定した部署だけ距離分ずらす）
+        pi += np.minimum(dist, sink) - sink
+
+        path = [target]
+        while pred[path[-1]] != -1:
+            path.append(pred[path[-1]])
+        path.reverse()
+
+        # 経路に沿って玉突き：path[k] の社員を path[k+1] へ移す
+        for g, h in zip(path[:-1], path[1:]):
+            j = D_who[g, h]
+            members[g].remove(j)
+            members[h].add(j)
+            assign[j] = h
+        members[path[0]].add(i)
+        assign[i] = path[0]
+        load[target] += 1
+
+        for g in set(path):
+            D[g], D_who[g] = _move_rows(cost, members, g)
+
+    sol = np.zeros((n_new, n_groups), dtype=int)
+    sol[np.arange(n_new), assign] = 1
+    return sol
+
+
+SOLVERS = {
+    "fixstars": fixstars_solve,
+    "local": local_solve,
+}
+
+
+def get_solver(solver):
+    """名前（"fixstars" / "local"）またはコールバックからソルバー関数を得る"""
+    if callable(solver):
+        return solver
+    try:
+        return SOLVERS[solver]
+    except KeyError:
+        raise ValueError(f"未知のソルバーです: {solver!r}（{', '.join(SOLVERS)} から選択）") from None
@@ -0,0 +1,145 @@
+# sweep.py
+#
+# 重み（性格・スキル・希望）と相性モードの組み合わせを一括で解き、パレート最適な割り当てを求める。
+# base_score は 3 つの成分行列の線形結合なので、入力の読み込みと成分の計算は
+# 相性モードごとに 1 回だけ行い、シナリオごとの求解をプロセスプールで並列に実行する。
+# ワーカーは spawn で起動する（アプリのジョブスレッドから fork すると、
+# 他のスレッドが持っていたロックや Streamlit の状態まで複製されて固まることがある）。
+
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import quantum
+
+MODES = ("多様性重視", "同一性重視")
+
+# ワーカープロセスごとに 1 回だけ受け取る共有データ
+_shared = {}
+
+
+def weight_grid(levels=(0, 50, 100)):
+    """重みの格子（すべて 0 の組は除く）"""
+    return [w for w in itertools.product(levels, repeat=3) if any(w)]
+
+
+def random_weights(n, seed=None, high=100):
+    """重みの組を一様乱数で n 個サンプリング"""
+    rng = np.random.default_rng(seed)
+    return [tuple(int(v) for v in w) for w in rng.integers(0, high + 1, size=(n, 3)) if w.any()]
+
+
+def pareto_mask(values):
+    """各行（全列を最大化）がパレート最適かどうか"""
+    values = np.asarray(values, dtype=float)
+    mask = np.ones(len(values), dtype=bool)
+    for k, v in enumerate(values):
+        dominated = (values >= v).all(axis=1) & (values > v).any(axis=1)
+        mask[k] = not dominated.any()
+    return mask
+
+
+def _init_worker(shared):
+    _shared.update(shared)
+
+
+def _solve_scenario(task):
+    """1 シナリオを解いて、成分ごとの合計と割り当て（部署インデックス）を返す"""
+    modes, (weight_char, weight_skill, weight_pref) = task
+    start = time.perf_counter()
+    components = _shared["components"][modes]
+    base_score = quantum.combine_scores(components, weight_char, weight_skill, weight_pref)
+    sol = quantum.solve_assignment(
+        base_score, _shared["capacity"], None,
+        prefs_raw=_shared["prefs_raw"], group_ids=_shared["group_ids"],
+        **_shared["solver_options"],
+    )
+    totals = {name: float((sol * comp).sum()) for name, comp in components.items()}
+    return sol.argmax(axis=1), totals, time.perf_counter() - start
+
+
+def sweep(
+    group_file,
+    member_file,
+    employee_file,
+    weights,                          # [(性格, スキル, 希望), ...]
+    modes=((MODES[0], MODES[0]),),    # [(リーダー相性, メンバー相性), ...]
+    solver="exact",
+    max_workers=None,
+    progress=None,
+    **solver_options,                 # token / timeout / num_reads / seed / top_k
+):
+    """
+    重みと相性モードの全組み合わせを解き、シナリオごとの結果表を返す。
+    パレート最適かどうかは相性モードごとに判定する（性格スコアの意味がモードで変わるため）。
+    """
+    def stage(name):
+        if progress is not None:
+            progress(name)
+
+    stage("load")
+    inputs = quantum.read_inputs(group_file, member_file, employee_file)
+
+    stage("score")
+    modes = [tuple(m) for m in modes]
+    components = {m: quantum.score_components(inputs, *m) for m in dict.fromkeys(modes)}
+
+    stage("solve")
+    shared = {
+        "components": components,
+        "capacity": inputs["capacity"],
+        "prefs_raw": inputs["prefs_raw"],
+        "group_ids": inputs["group_ids"],
+        "solver_options": {"solver": solver, **solver_options},
+    }
+    tasks = [(m, tuple(w)) for m in components for w in weights]
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(shared,)) as pool:
+        results = list(pool.map(_solve_scenario, tasks))
+
+    stage("report")
+    group_names = np.asarray(inputs["group_names"], dtype=object)
+    rows = []
+    for ((leader, member), (wc, ws, wp)), (assigned, totals, elapsed) in zip(tasks, results):
+        rows.append({
+            "リーダー相性": leader,
+            "メンバー相性": member,
+            "性格重み": wc,
+            "スキル重み": ws,
+            "希望重み": wp,
+            "性格スコア": totals["personality"],
+            "スキルスコア": totals["skill"],
+            "希望スコア": totals["pref"],
+            "時間[s]": elapsed,
+            "割り当て": group_names[assigned].tolist(),
+        })
+    df = pd.DataFrame(rows)
+
+    score_cols = ["性格スコア", "スキルスコア", "希望スコア"]
+    df["パレート最適"] = False
+    for _, idx in df.groupby(["リーダー相性", "メンバー相性"]).groups.items():
+        df.loc[idx, "パレート最適"] = pareto_mask(df.loc[idx, score_cols].to_numpy())
+    return df
+
+
+def pareto_figure(df):
+    """性格スコア × スキルスコア（色 = 希望スコア）の散布図。パレート最適なシナリオを強調する"""
+    import plotly.express as px  # 図を作るときだけ読み込む
+
+    fig = px.scatter(
+        df,
+        x="性格スコア",
+        y="スキルスコア",
+        color="希望スコア",
+        symbol="パレート最適",
+        symbol_map={True: "star", False: "circle-open"},
+        facet_col="リーダー相性" if df["リーダー相性"].nunique() > 1 else None,
+        facet_row="メンバー相性" if df["メンバー相性"].nunique() > 1 else None,
+        hover_data=["性格重み", "スキル重み", "希望重み", "時間[s]"],
+    )
+    fig.update_traces(marker_size=12)
+    return fig
@@ -0,0 +1,113 @@
+# synthetic.py
+#
+# 大規模な合成データ（部署・既存社員・新卒社員 CSV）の生成
+#   python synthetic.py out/ --new 10000 --groups 500 --skew 1.0
+# 列の並びは sample/ のテンプレートと同じ。希望部署の偏りは skew で調整する
+# （部署の人気が順位の -skew 乗に比例する Zipf 分布。0 なら一様）。
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+GROUP_COLUMNS    = ["部署ID", "部署", "スキル１", "スキル２", "スキル３", "定員人数"]
+MEMBER_COLUMNS   = ["社員番号", "名前", "部署", "リーダー",
+                    "開放性", "誠実性", "外向性", "協調性", "神経症傾向", "スキル１", "スキル２", "スキル３"]
+EMPLOYEE_COLUMNS = ["社員番号", "名前", "開放性", "誠実性", "外向性", "協調性", "神経症傾向",
+                    "スキル１", "スキル２", "スキル３", "第一希望", "第二希望", "第三希望"]
+FILE_NAMES = ("部署.csv", "既存社員.csv", "新卒社員.csv")
+
+MAX_NEW    = 100_000
+MAX_GROUPS = 1_000
+
+
+def preferences(n_new, n_groups, skew=0.0, rng=None, chunk=10_000):
+    """
+    各新卒の第一〜第三希望（部署のインデックス、重複なし）。
+    人気 p_g ∝ (g+1)^(-skew) から非復元で 3 つ引く（Gumbel-top-k、chunk 行ずつ処理）。
+    """
+    rng = np.random.default_rng(rng)
+    k = min(3, n_groups)
+    log_p = -skew * np.log(np.arange(1, n_groups + 1))
+    log_p = log_p[rng.permutation(n_groups)]  # 人気の部署を ID 順に偏らせない
+    out = np.empty((n_new, k), dtype=np.int64)
+    for a in range(0, n_new, chunk):
+        keys = log_p + rng.gumbel(size=(min(chunk, n_new - a), n_groups))
+        top = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1)
+        out[a:a + len(top)] = np.take_along_axis(top, order, axis=1)
+    if k < 3:  # 部署が 3 つ未満なら最後の希望を繰り返す
+        out = np.hstack([out, np.repeat(out[:, -1:], 3 - k, axis=1)])
+    return out
+
+
+def generate(n_new, n_groups, members_per_group=4, skew=0.0, slack=1.2, seed=0):
+    """
+    (group_df, member_df, employee_df) を返す。
+        members_per_group : 部署あたりの既存社員数（先頭の 1 人がリーダー）
+        skew              : 希望部署の偏り（0 = 一様、大きいほど一部の部署に集中）
+        slack             : 定員合計 / 新卒数（1 以上なら全員が収まる）
+    """
+    if not (1 <= n_new <= MAX_NEW and 1 <= n_groups <= MAX_GROUPS):
+        raise ValueError(f"新卒数は 1〜{MAX_NEW}、部署数は 1〜{MAX_GROUPS} で指定してください")
+    rng = np.random.default_rng(seed)
+    bits = lambda n, k: rng.integers(0, 2, size=(n, k), dtype=np.int8)
+
+    # 部署：定員は合計が ceil(n_new * slack) になるよう多項分布で配る（最低 1 人）
+    group_ids = np.arange(1, n_groups + 1)
+    total = max(int(np.ceil(n_new * slack)), n_groups)
+    capacity = 1 + rng.multinomial(total - n_groups, np.full(n_groups, 1 / n_groups))
+    group_df = pd.DataFrame(np.column_stack([group_ids, bits(n_groups, 3), capacity]),
+                            columns=[c for c in GROUP_COLUMNS if c != "部署"])
+    group_df.insert(1, "部署", [f"部署{g}" for g in group_ids])
+
+    # 既存社員
+    n_members = n_groups * members_per_group
+    dept = np.repeat(group_ids, members_per_group)
+    leader = (np.arange(n_members) % members_per_group == 0).astype(np.int8)
+    member_df = pd.DataFrame(
+        np.column_stack([np.arange(n_members), dept, leader, bits(n_members, 5), bits(n_members, 3)]),
+        columns=[c for c in MEMBER_COLUMNS if c != "名前"],
+    )
+    member_df.insert(1, "名前", [f"社員{i}" for i in range(n_members)])
+
+    # 新卒社員（社員番号は既存社員の続き）
+    prefs = group_ids[preferences(n_new, n_groups, skew, rng)]
+    employee_df = pd.DataFrame(
+        np.column_stack([n_members + np.arange(n_new), bits(n_new, 5), bits(n_new, 3), prefs]),
+        columns=[c for c in EMPLOYEE_COLUMNS if c != "名前"],
+    )
+    employee_df.insert(1, "名前", [f"新卒{i}" for i in range(n_new)])
+    return group_df, member_df, employee_df
+
+
+def write_csvs(directory, n_new, n_groups, **kwargs):
+    """合成データを directory に書き出し、3 ファイルのパスを返す"""
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, name) for name in FILE_NAMES]
+    for df, path in zip(generate(n_new, n_groups, **kwargs), paths):
+        df.to_csv(path, index=False, encoding="utf-8-sig")  # テンプレートと同じ BOM 付き UTF-8
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合成データ（部署・既存社員・新卒社員 CSV）の生成")
+    parser.add_argument("directory", help="出力先ディレクトリ")
+    parser.add_argument("--new", type=int, default=1000, help=f"新卒数（最大 {MAX_NEW}）")
+    parser.add_argument("--groups", type=int, default=50, help=f"部署数（最大 {MAX_GROUPS}）")
+    parser.add_argument("--members-per-group", type=int, default=4)
+    parser.add_argument("--skew", type=float, default=0.0, help="希望部署の偏り（0 = 一様）")
+    parser.add_argument("--slack", type=float, default=1.2, help="定員合計 / 新卒数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    paths = write_csvs(args.directory, args.new, args.groups,
+                       members_per_group=args.members_per_group,
+                       skew=args.skew, slack=args.slack, seed=args.seed)
+    for path in paths:
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# tests/conftest.py
+#
+# アプリのモジュールはリポジトリ直下に置いているので、テストから import できるようにする
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, "sample")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
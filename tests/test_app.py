@@ -0,0 +1,96 @@
+# tests/test_app.py
+#
+# app.run_opt が組み立てる引数で、全体最適化と差分再最適化の両方のランナーを通す
+
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+
+import app  # noqa: E402
+from cache import ResultCache  # noqa: E402
+from conftest import SAMPLE  # noqa: E402
+from incremental import IncrementalOptimizer  # noqa: E402
+
+
+class SyncManager:
+    """投入されたジョブをその場で実行する JobManager の代わり"""
+
+    def __init__(self):
+        self.results = []
+
+    def limit_solver(self, solver):
+        return solver
+
+    def cancel(self, job_id):
+        pass
+
+    def submit(self, fn, *args, **kwargs):
+        self.results.append(fn(*args, **kwargs))
+        return len(self.results)
+
+
+def sample_frames():
+    return [pd.read_csv(os.path.join(SAMPLE, name)) for name in
+            ("部署テンプレート.csv", "既存社員テンプレート.csv", "新卒社員テンプレート.csv")]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_run_opt_runners(monkeypatch, tmp_path, incremental):
+    frames = sample_frames()
+    monkeypatch.chdir(tmp_path)
+    manager = SyncManager()
+    monkeypatch.setattr(app, "get_job_manager", lambda: manager)
+    monkeypatch.setattr(app, "get_result_cache", lambda: ResultCache(directory=None))
+    # solver_options() と同じキー（pool は 1 以下なら None）
+    opts = dict(solver="exact", timeout=1000, num_reads=1, seed=None, compare_exact=False,
+                top_k=None, decompose=None, pair_k=None, pool=None, profile=False)
+    app.run_opt(None, *frames, "多様性重視", "多様性重視", 50, 50, 50,
+                tab="sample", incremental=IncrementalOptimizer() if incremental else None, **opts)
+
+    (assign_df, _, _, _), info = manager.results[0]
+    assert not info["hit"]
+    assert assign_df.attrs["objective"] == pytest.approx(8600)
+
+
+def test_incremental_runs_bypass_cache(monkeypatch, tmp_path):
+    frames = sample_frames()
+    monkeypatch.chdir(tmp_path)
+    manager = SyncManager()
+    cache = ResultCache(directory=None)
+    monkeypatch.setattr(app, "get_job_manager", lambda: manager)
+    monkeypatch.setattr(app, "get_result_cache", lambda: cache)
+    optimizer = IncrementalOptimizer()
+    runs = []
+    monkeypatch.setattr(optimizer, "run", lambda *args, **kwargs: runs.append(1) or IncrementalOptimizer.run(
+        optimizer, *args, **kwargs))
+    for _ in range(2):
+        app.run_opt(None, *frames, "多様性重視", "多様性重視", 50, 50, 50, solver="exact", tab="sample",
+                    incremental=optimizer)
+    # 同じ入力でも毎回差分再最適化を通す（前回の状態が更新される）
+    assert len(runs) == 2
+    assert not any(info["hit"] for _, info in manager.results)
+    assert len(cache._memory) == 0
+
+
+def test_unwritable_result_cache(monkeypatch, tmp_path):
+    frames = sample_frames()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".cache").write_text("")  # .cache がファイル
+    app.get_result_cache.clear()
+    cache = app.get_result_cache()
+    assert not cache.directory
+
+    # ディスク層に書けない（ディレクトリがファイルに置き換わった）場合もメモリには残る
+    results = tmp_path / "results"
+    broken = ResultCache(directory=str(results))
+    results.rmdir()
+    results.write_text("")
+    manager = SyncManager()
+    monkeypatch.setattr(app, "get_job_manager", lambda: manager)
+    monkeypatch.setattr(app, "get_result_cache", lambda: broken)
+    for _ in range(2):
+        app.run_opt(None, *frames, "多様性重視", "多様性重視", 50, 50, 50, solver="exact")
+    assert [info["hit"] for _, info in manager.results] == [False, True]
@@ -0,0 +1,26 @@
+# tests/test_cache.py
+#
+# 結果キャッシュ：キーに値の形式の版を含め、古いビルドのエントリを使わない
+
+import os
+
+import cache
+from conftest import SAMPLE
+
+FILES = [os.path.join(SAMPLE, name) for name in
+         ("部署テンプレート.csv", "既存社員テンプレート.csv", "新卒社員テンプレート.csv")]
+
+
+def test_key_depends_on_version(monkeypatch):
+    key = cache.input_key(*FILES, solver="exact")
+    assert cache.input_key(*FILES, solver="exact") == key
+    monkeypatch.setattr(cache, "RESULT_VERSION", cache.RESULT_VERSION + 1)
+    assert cache.input_key(*FILES, solver="exact") != key
+
+
+def test_disk_round_trip(tmp_path):
+    first = cache.ResultCache(directory=str(tmp_path))
+    first.put("k", {"a": 1}, 1.5)
+    value, elapsed, source = cache.ResultCache(directory=str(tmp_path)).get("k")
+    assert value == {"a": 1} and elapsed == 1.5 and source == "disk"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,83 @@
+# tests/test_decompose.py
+#
+# 分割求解：制約を守り、分割しない厳密解との差が小さい
+
+import numpy as np
+import pytest
+
+import quantum
+import solvers
+import synthetic
+from decompose import repair, solve_decomposed
+
+# 分割しない厳密解との差（相対）の許容値
+MAX_GAP = 0.03
+
+
+def instance(n_new, n_groups, seed=0, **kwargs):
+    inputs = quantum.read_inputs(*synthetic.generate(n_new, n_groups, seed=seed, **kwargs))
+    components = quantum.score_components(inputs, "多様性重視", "多様性重視")
+    return quantum.combine_scores(components, 50, 50, 50), inputs
+
+
+def assert_feasible(sol, capacity):
+    assert (sol.sum(axis=1) == 1).all()
+    assert (sol.sum(axis=0) <= capacity).all()
+
+
+@pytest.mark.parametrize("seed,clusters,kwargs", [
+    (0, 2, {}),
+    (1, 4, {}),
+    (2, 4, {"skew": 2.0}),
+    (3, 3, {"slack": 1.0}),
+])
+def test_decomposed_solve_is_feasible_and_close(seed, clusters, kwargs):
+    base_score, inputs = instance(400, 40, seed=seed, **kwargs)
+    capacity = inputs["capacity"]
+    details = {}
+    sol = quantum.solve_assignment(base_score, capacity, None, solver="exact", token=None,
+                                   decompose=clusters, prefs_raw=inputs["prefs_raw"],
+                                   group_ids=inputs["group_ids"], details=details)
+    assert sol.shape == base_score.shape
+    assert_feasible(sol, capacity)
+
+    info = details["decomposition"]
+    assert info["clusters"] == clusters
+    assert sum(info["cluster_hires"]) == len(base_score)
+    assert sum(info["cluster_groups"]) == len(capacity)
+
+    full = quantum.solve_assignment(base_score, capacity, None, solver="exact", token=None)
+    objective, full_objective = (sol * base_score).sum(), (full * base_score).sum()
+    assert objective <= full_objective + 1e-9
+    assert full_objective - objective <= MAX_GAP * abs(full_objective)
+
+
+def test_failed_cluster_is_repaired():
+    base_score, inputs = instance(200, 20)
+    capacity = inputs["capacity"]
+
+    def solve_part(score, cap, prefs, group_ids, rows):
+        if rows[0] == 0:  # 先頭の新卒を含むクラスタだけ解けなかったことにする
+            raise RuntimeError("制約を満たす割り当てが見つかりませんでした")
+        return solvers.min_cost_assignment(score, cap)
+
+    sol, info = solve_decomposed(base_score, capacity, inputs["prefs_raw"], inputs["group_ids"], 3, solve_part)
+    assert_feasible(sol, capacity)
+    assert info["failed_clusters"] == 1
+    assert info["repaired_hires"] > 0
+
+
+def test_repair_fills_unassigned_within_capacity():
+    rng = np.random.default_rng(0)
+    base_score = rng.integers(0, 100, (30, 4)).astype(float)
+    capacity = np.array([10, 8, 8, 6])
+    assign = np.full(30, -1)
+    assign[:10] = 0
+    fixed, repaired, moved = repair(assign, base_score, capacity)
+    assert repaired == 20
+    assert (fixed >= 0).all()
+    assert (np.bincount(fixed, minlength=4) <= capacity).all()
+    # 空きのある部署へ移っても得をする新卒は残っていない
+    load = np.bincount(fixed, minlength=4)
+    spare = np.where(load < capacity, base_score, -np.inf).max(axis=1)
+    assert (spare <= base_score[np.arange(30), fixed]).all()
@@ -0,0 +1,52 @@
+# tests/test_dept_index.py
+#
+# 部署インデックスのキャッシュ：既定ではディスクに書かず、保存先が使えなくても読み込みは失敗しない
+
+import os
+
+import pytest
+
+import dept_index
+from conftest import SAMPLE
+from ingest import load_groups
+
+GROUP_CSV = os.path.join(SAMPLE, "部署テンプレート.csv")
+MEMBER_CSV = os.path.join(SAMPLE, "既存社員テンプレート.csv")
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dept_index, "_cache", None)
+    monkeypatch.delenv(dept_index.INDEX_DIR_ENV, raising=False)
+    return tmp_path
+
+
+def test_memory_only_by_default(fresh_cache):
+    group_df = load_groups(GROUP_CSV)
+    _, source = dept_index.load_index(MEMBER_CSV, group_df)
+    assert source == "built"
+    _, source = dept_index.load_index(MEMBER_CSV, group_df)
+    assert source == "memory"
+    assert os.listdir(fresh_cache) == []
+
+
+def test_unusable_directory(fresh_cache, monkeypatch):
+    # 保存先の親がファイル（NotADirectoryError）
+    (fresh_cache / ".cache").write_text("")
+    monkeypatch.setenv(dept_index.INDEX_DIR_ENV, ".cache/dept_index")
+    group_df = load_groups(GROUP_CSV)
+    index, source = dept_index.load_index(MEMBER_CSV, group_df)
+    assert source == "built" and len(index) > 0
+    assert dept_index.load_index(MEMBER_CSV, group_df)[1] == "memory"
+
+
+def test_disk_layer(fresh_cache, monkeypatch):
+    monkeypatch.setenv(dept_index.INDEX_DIR_ENV, "index")
+    group_df = load_groups(GROUP_CSV)
+    index, _ = dept_index.load_index(MEMBER_CSV, group_df)
+    monkeypatch.setattr(dept_index, "_cache", None)  # 別プロセスの代わり
+    cached, source = dept_index.load_index(MEMBER_CSV, group_df)
+    assert source == "disk"
+    assert (cached.leader_hist == index.leader_hist).all() and (cached.member_hist == index.member_hist).all()
+    assert not [name for name in os.listdir(fresh_cache / "index") if name.endswith(".tmp")]
@@ -0,0 +1,108 @@
+# tests/test_incremental.py
+#
+# 差分再最適化：制約を守り、近傍の外の新卒は動かさず、全体の解き直しとほぼ同じ目的関数値になる
+
+import numpy as np
+import pytest
+
+import incremental
+import quantum
+import synthetic
+from incremental import IncrementalOptimizer
+
+MODES = ("多様性重視", "多様性重視", 50, 50, 50)
+
+# 全体を厳密に解き直した場合との差（相対）の許容値
+MAX_GAP = 0.01
+
+
+def run(opt, frames, **kwargs):
+    return opt.run(None, *frames, *MODES, solver="exact", figure=False, **kwargs)
+
+
+def edit_hires(employee_df, rows):
+    """rows の新卒の第一希望と性格を 1 つずつ書き換える"""
+    edited = employee_df.copy()
+    edited.loc[rows, "第一希望"] = edited.loc[rows, "第三希望"].to_numpy()
+    edited.loc[rows, "開放性"] = 1 - edited.loc[rows, "開放性"]
+    return edited
+
+
+def assert_feasible(assign, capacity):
+    assert (assign >= 0).all() and (assign < len(capacity)).all()
+    assert (np.bincount(assign, minlength=len(capacity)) <= capacity).all()
+
+
+def neighbourhood(prev, frames):
+    """次の run が解き直すはずの新卒（incremental と同じ手順で求める）"""
+    inputs = quantum.read_inputs(*frames)
+    diff = incremental._diff(prev, inputs)
+    components, _ = incremental._rescore(prev, inputs, prev["settings"], diff)
+    base_score = quantum.combine_scores(components, *prev["settings"]["weights"])
+    free, _ = incremental._neighbourhood(prev, inputs, diff, base_score)
+    return free
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_edited_hires_resolve_locally(seed):
+    group_df, member_df, employee_df = synthetic.generate(300, 60, seed=seed)
+    opt = IncrementalOptimizer()
+    run(opt, (group_df, member_df, employee_df))
+    prev = opt._state
+
+    rows = [3, 40, 111]
+    frames = (group_df, member_df, edit_hires(employee_df, rows))
+    free = neighbourhood(prev, frames)
+    assign_df = run(opt, frames)[0]
+    info = assign_df.attrs["incremental"]
+    assert info["mode"] == "incremental"
+    assert info["changed_hires"] == len(rows)
+    assert info["free_hires"] == len(free)
+    assert np.isin(rows, free).all()
+
+    state = opt._state
+    assign, capacity = state["assign"], state["inputs"]["capacity"]
+    assert len(assign) == len(employee_df)
+    assert_feasible(assign, capacity)
+
+    # 近傍の外の新卒は前回の部署のまま
+    kept = np.setdiff1d(np.arange(len(assign)), free)
+    assert (assign[kept] == prev["assign"][kept]).all()
+
+    # 全体を厳密に解き直した場合とほぼ同じ
+    base_score = state["base_score"]
+    full = quantum.solve_assignment(base_score, capacity, None, solver="exact", token=None)
+    full_objective = (full * base_score).sum()
+    objective = base_score[np.arange(len(assign)), assign].sum()
+    assert objective <= full_objective + 1e-9
+    assert full_objective - objective <= MAX_GAP * abs(full_objective)
+
+
+def test_removed_hire_frees_seat():
+    group_df, member_df, employee_df = synthetic.generate(300, 60, seed=0)
+    opt = IncrementalOptimizer()
+    run(opt, (group_df, member_df, employee_df))
+    prev = opt._state
+
+    frames = (group_df, member_df, employee_df.drop(index=[5]).reset_index(drop=True))
+    assign_df = run(opt, frames)[0]
+    info = assign_df.attrs["incremental"]
+    assert info["mode"] == "incremental"
+    assert info["removed_hires"] == 1 and info["changed_hires"] == 0
+    assign = opt._state["assign"]
+    assert len(assign) == len(employee_df) - 1
+    assert_feasible(assign, opt._state["inputs"]["capacity"])
+    # 席が空いた部署にいた新卒以外は動かない
+    old = np.delete(prev["assign"], 5)
+    moved = assign != old
+    assert np.isin(old[moved], prev["assign"][5]).all()
+
+
+def test_setting_change_resolves_everything():
+    frames = synthetic.generate(60, 6, seed=0)
+    opt = IncrementalOptimizer()
+    assert run(opt, frames)[0].attrs["incremental"]["mode"] == "full"
+    assign_df = opt.run(None, *frames, "同一性重視", "多様性重視", 50, 50, 50, solver="exact", figure=False)[0]
+    info = assign_df.attrs["incremental"]
+    assert info["mode"] == "full" and info["reason"] == "設定の変更"
+    assert_feasible(opt._state["assign"], opt._state["inputs"]["capacity"])
@@ -0,0 +1,55 @@
+# tests/test_penalty.py
+#
+# 制約ペナルティは入力だけで決まり、同じ seed なら同じ結果になる
+
+import numpy as np
+import pytest
+
+import quantum
+from penalty import calibrate_penalty, repair_samples, violation_rate
+
+
+def instance(n_new=30, n_groups=5, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 100, (n_new, n_groups)).astype(float), np.full(n_groups, n_new // n_groups + 1)
+
+
+def test_seeded_runs_are_reproducible():
+    base_score, capacity = instance(12, 3)
+    runs = []
+    for _ in range(2):
+        details = {}
+        sol = quantum.solve_assignment(base_score, capacity, None, solver="local", timeout=10**6,
+                                       num_reads=3, seed=7, details=details)
+        runs.append((sol, details["penalty"]))
+    for sol, pen in runs[1:]:
+        assert (sol == runs[0][0]).all()
+        assert pen == runs[0][1]
+    assert runs[0][1]["penalty"] == calibrate_penalty(base_score)
+
+
+def test_repair_samples_feasible():
+    base_score, capacity = instance()
+    rng = np.random.default_rng(1)
+    samples = rng.integers(0, 2, (4,) + base_score.shape)
+    assign, broken = repair_samples(samples, base_score, capacity)
+    assert broken.all()
+    for row in assign:
+        assert (row >= 0).all()
+        assert (np.bincount(row, minlength=len(capacity)) <= capacity).all()
+    with pytest.raises(ValueError):
+        repair_samples(samples, base_score, np.zeros_like(capacity))
+
+
+def test_violation_rate_is_a_fraction():
+    capacity = np.array([1, 1])
+    ok = np.array([[[1, 0], [0, 1]]])
+    assert violation_rate(ok, capacity) == 0.0
+    # 全員が 2 部署に入り、どちらの部署も定員超過
+    both = np.ones((1, 2, 2), dtype=int)
+    assert violation_rate(both, capacity) == 1.0
+    # 1 人は所属なし、もう 1 人は定員内
+    partial = np.array([[[0, 0], [1, 0]]])
+    assert violation_rate(partial, capacity) == 0.5
+    rng = np.random.default_rng(0)
+    assert 0.0 <= violation_rate(rng.integers(0, 2, (6, 10, 3)), np.ones(3)) <= 1.0
@@ -0,0 +1,33 @@
+# tests/test_pool.py
+#
+# 解のプール：修復前のサンプルの制約違反を表に残し、案は修復後の割り当てから選ぶ
+
+import numpy as np
+
+from penalty import repair_samples
+from pool import build_pool
+
+
+def test_pool_reports_raw_violations():
+    rng = np.random.default_rng(0)
+    n_new, n_groups = 20, 4
+    base_score = rng.integers(0, 100, (n_new, n_groups)).astype(float)
+    capacity = np.full(n_groups, 6)
+    group_ids = np.arange(1, n_groups + 1)
+    prefs_raw = rng.integers(1, n_groups + 1, (n_new, 3))
+    samples = rng.integers(0, 2, (5, n_new, n_groups)).astype(np.int8)
+    samples[0] = 0
+    samples[0, np.arange(n_new), np.arange(n_new) % n_groups] = 1  # 0 番目は実行可能
+    assign, _ = repair_samples(samples, base_score, capacity)
+    repaired = np.zeros_like(samples)
+    repaired[np.arange(5)[:, None], np.arange(n_new)[None, :], assign] = 1
+
+    table, assignments = build_pool(samples, 5, base_score, capacity, prefs_raw, group_ids,
+                                    [f"新卒{i}" for i in range(n_new)], list("ABCD"), min_diff=0,
+                                    repaired=repaired)
+    assert table["実行可能"].all()
+    assert table["修復"].sum() >= 1
+    broken = table[table["修復"]]
+    assert ((broken["所属違反"] > 0) | (broken["定員超過"] > 0)).all()
+    assert (table.loc[~table["修復"], ["所属違反", "定員超過"]] == 0).all().all()
+    assert assignments.shape == (n_new, len(table))
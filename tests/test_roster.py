@@ -0,0 +1,77 @@
+# tests/test_roster.py
+#
+# パック形式の名簿：ビットのまま部署インデックス・スコア計算に使い、CSV と同じ結果になる
+
+import os
+
+import numpy as np
+import pytest
+
+import dept_index
+import quantum
+import roster
+from conftest import SAMPLE
+from ingest import InputError, load_groups
+
+GROUP_CSV = os.path.join(SAMPLE, "部署テンプレート.csv")
+MEMBER_CSV = os.path.join(SAMPLE, "既存社員テンプレート.csv")
+EMPLOYEE_CSV = os.path.join(SAMPLE, "新卒社員テンプレート.csv")
+
+
+@pytest.fixture
+def packed(tmp_path, monkeypatch):
+    monkeypatch.setattr(dept_index, "_cache", None)
+    monkeypatch.delenv(dept_index.INDEX_DIR_ENV, raising=False)
+    members, employees = str(tmp_path / "members"), str(tmp_path / "employees")
+    roster.csv_to_roster(MEMBER_CSV, members, "member")
+    roster.csv_to_roster(EMPLOYEE_CSV, employees, "employee")
+    return members, employees
+
+
+def test_read_inputs_matches_csv(packed):
+    from_csv = quantum.read_inputs(GROUP_CSV, MEMBER_CSV, EMPLOYEE_CSV)
+    from_roster = quantum.read_inputs(GROUP_CSV, *packed)
+    assert (from_roster["new_codes"] == from_csv["new_codes"]).all()
+    for key in ("member_codes", "member_dept", "leader_flag"):
+        assert (from_roster[key] == from_csv[key]).all()
+    a, b = from_csv["dept_index"], from_roster["dept_index"]
+    assert (a.leader_hist == b.leader_hist).all() and (a.member_hist == b.member_hist).all()
+    assert a.names == b.names
+
+
+def test_roster_index_is_cached(packed):
+    group_df = load_groups(GROUP_CSV)
+    members = roster.Roster.open(packed[0])
+    assert dept_index.load_index(members, group_df)[1] == "built"
+    assert dept_index.load_index(roster.Roster.open(packed[0]), group_df)[1] == "memory"
+
+
+def test_optimize_from_roster(packed):
+    args = ("多様性重視", "多様性重視", 50, 50, 50)
+    a = quantum.optimize(None, GROUP_CSV, MEMBER_CSV, EMPLOYEE_CSV, *args, solver="exact", figure=False)[0]
+    b = quantum.optimize(None, GROUP_CSV, *packed, *args, solver="exact", figure=False)[0]
+    assert a.attrs["objective"] == b.attrs["objective"]
+    assert (a.to_numpy() == b.to_numpy()).all()
+
+
+def test_wrong_kind(packed):
+    with pytest.raises(InputError):
+        quantum.read_inputs(GROUP_CSV, packed[1], EMPLOYEE_CSV)
+    with pytest.raises(InputError):
+        quantum.read_inputs(GROUP_CSV, MEMBER_CSV, packed[0])
+
+
+def test_unknown_department(packed):
+    members = roster.Roster.open(packed[0], mmap=False)
+    records = members.records.copy()
+    records["dept"][0] = 999
+    bad = roster.Roster("member", members.columns, records, members.names)
+    with pytest.raises(InputError):
+        quantum.read_inputs(GROUP_CSV, bad, EMPLOYEE_CSV)
+
+
+def test_bits_round_trip():
+    rng = np.random.default_rng(0)
+    traits, skills = rng.integers(0, 2, (50, 5)), rng.integers(0, 2, (50, 3))
+    t, s = roster.unpack_bits(roster.pack_bits(traits, skills))
+    assert (t == traits).all() and (s == skills).all()
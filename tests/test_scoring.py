@@ -0,0 +1,71 @@
+# tests/test_scoring.py
+#
+# スコア計算：部署ごとの性格パターン集計による一括計算が、1 人ずつ比べるループと一致する
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import quantum
+import synthetic
+from conftest import SAMPLE
+
+MODES = ("多様性重視", "同一性重視")
+PREF = {1: 3, 2: 2, 3: 1}
+
+
+def loop_scores(group_df, member_df, employee_df, leader_mode, member_mode, w_char, w_skill, w_pref):
+    """新卒 × 部署 ごとに既存社員と 1 人ずつ比べる参照実装（部署列は部署ID）"""
+    group_ids = group_df.iloc[:, 0].to_numpy()
+    group_skill = group_df.iloc[:, 2:5].to_numpy(int)
+    member_dept = member_df.iloc[:, 2].to_numpy()
+    leader_flag = member_df.iloc[:, 3].to_numpy(int)
+    member_pers = member_df.iloc[:, 4:9].to_numpy(int)
+    new_pers = employee_df.iloc[:, 2:7].to_numpy(int)
+    new_skill = employee_df.iloc[:, 7:10].to_numpy(int)
+    prefs_raw = employee_df.iloc[:, 10:13].to_numpy(int)
+
+    def pair(people, p, mode):
+        op = np.logical_or if mode == "同一性重視" else np.logical_xor
+        return int(op(people, p).sum()) if people.size else 0
+
+    score = np.zeros((len(employee_df), len(group_ids)))
+    for i in range(len(employee_df)):
+        for g, gid in enumerate(group_ids):
+            in_dept = member_dept == gid
+            personality = (pair(member_pers[in_dept & (leader_flag == 1)], new_pers[i], leader_mode)
+                           + pair(member_pers[in_dept & (leader_flag == 0)], new_pers[i], member_mode))
+            skill = int((group_skill[g] * new_skill[i]).sum())
+            pf = next((PREF[r + 1] for r in range(3) if prefs_raw[i][r] == gid), 0)
+            score[i, g] = w_char * personality + w_skill * skill + w_pref * pf
+    return score
+
+
+def instances():
+    group_df, member_df, employee_df = synthetic.generate(40, 6, members_per_group=5, seed=3)
+    # リーダーのいない部署・複数いる部署も作る
+    rng = np.random.default_rng(0)
+    member_df.iloc[:, 3] = rng.integers(0, 2, len(member_df))
+    yield group_df, member_df, employee_df
+    group_df, member_df, employee_df = (pd.read_csv(os.path.join(SAMPLE, name)) for name in
+                                        ("部署テンプレート.csv", "既存社員テンプレート.csv", "新卒社員テンプレート.csv"))
+    # 所属を部署名で書いた場合
+    names = dict(zip(group_df.iloc[:, 0], group_df.iloc[:, 1]))
+    member_df[member_df.columns[2]] = member_df.iloc[:, 2].map(names)
+    yield group_df, member_df, employee_df
+
+
+@pytest.mark.parametrize("leader_mode", MODES)
+@pytest.mark.parametrize("member_mode", MODES)
+def test_scores_match_loop(leader_mode, member_mode):
+    weights = (30, 20, 50)
+    for frames in instances():
+        inputs = quantum.read_inputs(*frames)
+        components = quantum.score_components(inputs, leader_mode, member_mode)
+        score = quantum.combine_scores(components, *weights)
+        member_df = frames[1].copy()
+        member_df.iloc[:, 2] = inputs["member_dept"]  # 部署名で書かれていても部署ID にそろえる
+        expected = loop_scores(frames[0], member_df, inputs["employee_df"], leader_mode, member_mode, *weights)
+        np.testing.assert_array_equal(score, expected)
@@ -0,0 +1,121 @@
+# tests/test_solvers.py
+#
+# ソルバーバックエンド：厳密解（最小費用流）・ローカル SA の QUBO 変換・one-hot 更新・時間制限
+
+import itertools
+import time
+
+import numpy as np
+import pytest
+
+import quantum
+import solvers
+
+
+def brute_force(score, capacity):
+    """全ての割り当てを調べたスコア合計の最大値"""
+    n_new, n_groups = score.shape
+    best = -np.inf
+    for assign in itertools.product(range(n_groups), repeat=n_new):
+        if (np.bincount(assign, minlength=n_groups) <= capacity).all():
+            best = max(best, score[np.arange(n_new), assign].sum())
+    return best
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_min_cost_assignment_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    n_new, n_groups = rng.integers(1, 7), rng.integers(1, 4)
+    score = rng.integers(-5, 20, (n_new, n_groups)).astype(float)
+    capacity = rng.integers(0, n_new + 1, n_groups)
+    capacity[rng.integers(n_groups)] += max(n_new - capacity.sum(), 0)  # 全員入れる定員にする
+    sol = solvers.min_cost_assignment(score, capacity)
+    assert sol.shape == score.shape
+    assert (sol.sum(axis=1) == 1).all()
+    assert (sol.sum(axis=0) <= capacity).all()
+    assert (sol * score).sum() == pytest.approx(brute_force(score, capacity))
+
+
+def test_min_cost_assignment_capacity_too_small():
+    with pytest.raises(ValueError):
+        solvers.min_cost_assignment(np.ones((4, 2)), np.array([1, 2]))
+
+
+def small_model(n_new=12, n_groups=3, seed=0):
+    from amplify import VariableGenerator
+
+    rng = np.random.default_rng(seed)
+    base_score = rng.integers(0, 100, (n_new, n_groups)).astype(float)
+    capacity = np.full(n_groups, n_new // n_groups + 1)
+    x = VariableGenerator().array("Binary", (n_new, n_groups))
+    return quantum.build_model(x, base_score, capacity, 150.0), x
+
+
+def test_to_qubo_matches_terms():
+    from amplify import AcceptableDegrees
+
+    model, _ = small_model()
+    const, lin, rows, cols, ws, index = solvers._to_qubo(model)
+    im, _ = model.to_intermediate_model(AcceptableDegrees(objective={"Binary": "Quadratic"}))
+    terms = im.to_unconstrained_poly().as_dict()
+    assert list(index) == sorted(index)
+    # 項ごとの辞書と同じエネルギーになる
+    s = np.random.default_rng(1).integers(0, 2, (5, len(lin))).astype(float)
+    expected = np.zeros(len(s))
+    for key, coef in terms.items():
+        expected += coef * np.prod([s[:, index[v]] for v in key], axis=0)
+    energy = const + s @ lin + (s[:, rows] * s[:, cols]) @ ws
+    np.testing.assert_allclose(energy, expected)
+    np.testing.assert_allclose(solvers._eval_poly(terms, np.fromiter(index, dtype=np.int64), s), expected)
+
+
+def test_anneal_stops_at_deadline():
+    model, x = small_model()
+    _, lin, rows, cols, ws, index = solvers._to_qubo(model)
+    indptr, nbrs, w = solvers._adjacency(len(lin), rows, cols, ws)
+    groups = solvers._one_hot_groups(model, index)
+    assert len(groups) == x.shape[0]
+    # 期限切れなら 1 スイープも行わず初期状態（各新卒の行は one-hot）を返す
+    s = solvers.anneal(lin, indptr, nbrs, w, groups=groups, num_reads=2,
+                       deadline=time.perf_counter() - 1, seed=3)
+    for g in groups:
+        assert (s[:, g].sum(axis=1) == 1).all()
+
+
+@pytest.mark.parametrize("timeout", [1, 20, 100])
+def test_local_solve_keeps_rows_one_hot(timeout):
+    # 時間切れで打ち切っても、各新卒はちょうど 1 部署に入っている
+    model, x = small_model(60, 6)
+    result = solvers.local_solve(model, x, timeout=timeout, num_reads=4, seed=0)
+    for sol in result.solutions:
+        assert (sol.sum(axis=1) == 1).all()
+
+
+def test_local_solve_finds_optimum():
+    rng = np.random.default_rng(0)
+    base_score = rng.integers(0, 100, (12, 3)).astype(float)
+    capacity = np.full(3, 5)
+    details = {}
+    sol = quantum.solve_assignment(base_score, capacity, None, solver="local", token=None,
+                                   timeout=10**6, num_reads=4, seed=0, details=details)
+    assert details["penalty"]["repaired_samples"] == 0
+    assert (sol * base_score).sum() == (solvers.min_cost_assignment(base_score, capacity) * base_score).sum()
+
+
+def test_local_solve_returns_samples():
+    model, x = small_model()
+    result = solvers.local_solve(model, x, timeout=10**6, num_reads=2, seed=0)
+    assert len(result.solutions) == 2
+    assert result.solutions[0].shape == x.shape
+
+
+def test_candidate_pairs_keep_every_hire():
+    rng = np.random.default_rng(0)
+    base_score = rng.random((10, 4))
+    capacity = np.array([0, 5, 5, 0])
+    prefs_raw = [[1, 4, 1]] * 10  # 希望はすべて定員 0 の部署
+    rows, cols = quantum.candidate_pairs(base_score, prefs_raw, np.arange(1, 5), capacity, 1)
+    assert (np.bincount(rows, minlength=10) == 1).all()
+    assert capacity[cols].min() > 0
+    with pytest.raises(ValueError):
+        quantum.candidate_pairs(base_score, prefs_raw, np.arange(1, 5), capacity, 0)
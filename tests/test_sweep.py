@@ -0,0 +1,31 @@
+# tests/test_sweep.py
+#
+# 重みスイープ：spawn で起動したワーカーで全シナリオを解く
+
+import os
+import threading
+
+import pandas as pd
+
+import sweep
+from conftest import SAMPLE
+
+
+def sample_frames():
+    return [pd.read_csv(os.path.join(SAMPLE, name)) for name in
+            ("部署テンプレート.csv", "既存社員テンプレート.csv", "新卒社員テンプレート.csv")]
+
+
+def test_sweep_from_worker_thread():
+    # アプリと同じくジョブスレッドから呼んでも、ワーカーは spawn で起動して最後まで解ける
+    weights = [(100, 0, 0), (0, 0, 100), (50, 50, 50)]
+    out = {}
+    thread = threading.Thread(target=lambda: out.update(df=sweep.sweep(*sample_frames(), weights, max_workers=2)))
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive()
+    df = out["df"]
+    assert len(df) == len(weights)
+    assert df["パレート最適"].any()
+    n_new = len(sample_frames()[2])
+    assert all(len(a) == n_new for a in df["割り当て"])